@@ -1,36 +1,50 @@
 from flask import Blueprint, request, jsonify
 from core.database import db, ADMIN_USERS_FILE
+from core.static_files import save_upload
+from core.activity import admin_activity
+from core.auth import (hash_password, verify_password, public_admin, admin_directory,
+                       session_store, request_token, current_admin)
+import os
 import uuid
-import hashlib
 from datetime import datetime
 
 admins_api = Blueprint('admins_api', __name__)
 
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+def forbidden_unless(admin_id=None):
+    """Error response unless the session's admin is admin_id or an owner, else None"""
+    admin = current_admin()
+    if admin is None:
+        return jsonify({'error': 'Not logged in'}), 401
+    if admin.get('role') != 'owner' and (admin_id is None or admin['id'] != admin_id):
+        return jsonify({'error': 'Forbidden'}), 403
+    return None
 
 def ensure_super_admin():
-    admins = db.load(ADMIN_USERS_FILE)
-    if not admins:
+    """Admins table (shared, don't modify), with a default owner if it's empty"""
+    admins = db.load(ADMIN_USERS_FILE, copy_data=False)
+    if admins:
+        return admins
+
+    password = hash_password("admin")   # slow, not under the table lock
+
+    def create(tx):
+        if tx.table(ADMIN_USERS_FILE):
+            return  # created by another request or process meanwhile
         admin_id = str(uuid.uuid4())
-        admins[admin_id] = {
+        tx.put(ADMIN_USERS_FILE, admin_id, {
             "id": admin_id,
             "username": "admin",
-            "password": hash_password("admin"),
+            "password": password,
             "full_name": "Администратор",
             "role": "owner",
             "avatar_url": None,
             "bio": "Главный администратор системы",
-            "stats": {
-                "total_processed_requests": 0,
-                "total_processed_kyc": 0,
-                "daily_actions": {} # Format: "YYYY-MM-DD": count
-            },
             "permissions": ["all"],
             "created_at": datetime.now().isoformat()
-        }
-        db.save(ADMIN_USERS_FILE, admins)
-    return admins
+        })
+
+    db.run_transaction(create, ADMIN_USERS_FILE)
+    return db.load(ADMIN_USERS_FILE, copy_data=False)
 
 @admins_api.route('/api/admins', methods=['GET', 'POST', 'PUT', 'DELETE'])
 def manage_admins():
@@ -39,15 +53,20 @@ def manage_admins():
     if request.method == 'GET':
         res = []
         for x in admins.values():
-            a = x.copy()
-            if 'password' in a: del a['password']
+            a = public_admin(x)
+            a['stats'] = admin_activity.stats_for(a['id'])
             res.append(a)
         return jsonify(res)
 
+    # Creating, changing and deleting accounts is for owners
+    denied = forbidden_unless()
+    if denied:
+        return denied
+
     if request.method == 'POST':
         data = request.json
         # Check if username exists
-        if any(a['username'] == data.get('username') for a in admins.values()):
+        if admin_directory.username_taken(data.get('username')):
             return jsonify({'error': 'Username already exists'}), 400
             
         admin_id = str(uuid.uuid4())
@@ -59,41 +78,48 @@ def manage_admins():
             'role': data.get('role', 'staff'),
             'avatar_url': None,
             'bio': '',
-            'stats': {
-                'total_processed_requests': 0,
-                'total_processed_kyc': 0,
-                'daily_actions': {}
-            },
             'permissions': data.get('permissions', []),
             'created_at': datetime.now().isoformat()
         }
-        admins[admin_id] = new_admin
-        db.save(ADMIN_USERS_FILE, admins)
+        db.put(ADMIN_USERS_FILE, admin_id, new_admin)
         return jsonify({'success': True, 'id': admin_id})
 
     if request.method == 'PUT':
         data = request.json
         admin_id = data.get('id')
-        if admin_id in admins:
-            a = admins[admin_id]
-            a['full_name'] = data.get('full_name', a['full_name'])
-            a['role'] = data.get('role', a['role'])
-            a['permissions'] = data.get('permissions', a['permissions'])
+        a = admins.get(admin_id)
+        if a is not None:
+            fields = {
+                'full_name': data.get('full_name', a['full_name']),
+                'role': data.get('role', a['role']),
+                'permissions': data.get('permissions', a['permissions'])
+            }
             if data.get('password'):
-                a['password'] = hash_password(data.get('password'))
-            db.save(ADMIN_USERS_FILE, admins)
-            return jsonify({'success': True})
+                fields['password'] = hash_password(data.get('password'))
+            if db.update(ADMIN_USERS_FILE, admin_id, fields) is not None:
+                if 'password' in fields:
+                    session_store.revoke_admin(admin_id)
+                return jsonify({'success': True})
         return jsonify({'error': 'Admin not found'}), 404
 
     if request.method == 'DELETE':
         admin_id = request.args.get('id')
-        if admin_id in admins:
+
+        def delete(tx):
+            admins = tx.table(ADMIN_USERS_FILE)
+            if admin_id not in admins:
+                return 'missing'
             # Prevent deleting the last owner
             if admins[admin_id]['role'] == 'owner' and len([x for x in admins.values() if x['role'] == 'owner']) <= 1:
-                return jsonify({'error': 'Cannot delete the last owner account'}), 400
-                
-            del admins[admin_id]
-            db.save(ADMIN_USERS_FILE, admins)
+                return 'last_owner'
+            tx.delete(ADMIN_USERS_FILE, admin_id)
+            return 'deleted'
+
+        outcome = db.run_transaction(delete, ADMIN_USERS_FILE)
+        if outcome == 'last_owner':
+            return jsonify({'error': 'Cannot delete the last owner account'}), 400
+        if outcome == 'deleted':
+            session_store.revoke_admin(admin_id)
             return jsonify({'success': True})
         return jsonify({'error': 'Admin not found'}), 404
 
@@ -106,32 +132,54 @@ def login():
     if not username or not password:
         return jsonify({'error': 'Missing credentials'}), 400
         
-    admins = ensure_super_admin()
-    target_pwd = hash_password(password)
-    
-    admin = next((a for a in admins.values() if a['username'] == username), None)
-    
-    if not admin or admin['password'] != target_pwd:
+    admin = admin_directory.find(username)
+    if admin is None and not admin_directory.count():
+        ensure_super_admin()
+        admin = admin_directory.find(username)
+
+    if admin is None:
+        # Same cost as a real check, so unknown usernames don't answer faster
+        hash_password(password)
         return jsonify({'error': 'Invalid username or password'}), 401
-        
-    res = admin.copy()
-    if 'password' in res: del res['password']
+
+    ok, needs_rehash = verify_password(password, admin.get('password'))
+    if not ok:
+        return jsonify({'error': 'Invalid username or password'}), 401
+    if needs_rehash:
+        db.update(ADMIN_USERS_FILE, admin['id'], {'password': hash_password(password)})
+
+    token, expires_at = session_store.create(admin['id'])
+    res = public_admin(admin)
+    res['token'] = token
+    res['expires_at'] = expires_at
     return jsonify(res)
 
+@admins_api.route('/api/admins/logout', methods=['POST'])
+def logout():
+    session_store.revoke(request_token())
+    return jsonify({'success': True})
+
 @admins_api.route('/api/admins/profile', methods=['POST'])
 def update_profile():
     data = request.json
     admin_id = data.get('id')
-    admins = db.load(ADMIN_USERS_FILE)
+    denied = forbidden_unless(admin_id)
+    if denied:
+        return denied
+    a = db.get(ADMIN_USERS_FILE, admin_id)
     
-    if admin_id in admins:
-        a = admins[admin_id]
-        a['full_name'] = data.get('full_name', a['full_name'])
-        a['bio'] = data.get('bio', a.get('bio', ''))
+    if a is not None:
+        fields = {
+            'full_name': data.get('full_name', a['full_name']),
+            'bio': data.get('bio', a.get('bio', ''))
+        }
         if data.get('password'):
-            a['password'] = hash_password(data.get('password'))
-        db.save(ADMIN_USERS_FILE, admins)
-        return jsonify({'success': True})
+            fields['password'] = hash_password(data.get('password'))
+        if db.update(ADMIN_USERS_FILE, admin_id, fields) is not None:
+            if 'password' in fields:
+                # Other devices have to log in again, this one stays signed in
+                session_store.revoke_admin(admin_id, keep=request_token())
+            return jsonify({'success': True})
     return jsonify({'error': 'Admin not found'}), 404
 
 @admins_api.route('/api/admins/avatar', methods=['POST'])
@@ -141,54 +189,49 @@ def upload_avatar():
     
     file = request.files['avatar']
     admin_id = request.form.get('id')
+    denied = forbidden_unless(admin_id)
+    if denied:
+        return denied
     
     if file and admin_id:
-        import os
-        ext = file.filename.split('.')[-1]
-        filename = f"{admin_id}.{ext}"
-        save_dir = os.path.join('static', 'img', 'avatars')
-        if not os.path.exists(save_dir): os.makedirs(save_dir)
-        
-        save_path = os.path.join(save_dir, filename)
-        file.save(save_path)
+        if db.get(ADMIN_USERS_FILE, admin_id) is None:
+            return jsonify({'error': 'Admin not found'}), 404
+
+        # Content-hashed name, so the URL can be cached forever
+        url = save_upload(file, os.path.join('img', 'avatars'))
+        if not url:
+            return jsonify({'error': 'Unsupported file type'}), 400
         
         # Update DB
-        admins = db.load(ADMIN_USERS_FILE)
-        if admin_id in admins:
-            admins[admin_id]['avatar_url'] = f"/static/img/avatars/{filename}"
-            db.save(ADMIN_USERS_FILE, admins)
-            return jsonify({'success': True, 'url': admins[admin_id]['avatar_url']})
+        if db.update(ADMIN_USERS_FILE, admin_id, {'avatar_url': url}) is None:
+            return jsonify({'error': 'Admin not found'}), 404
+        return jsonify({'success': True, 'url': url})
             
     return jsonify({'error': 'Invalid request'}), 400
 
 @admins_api.route('/api/admins/reports/daily', methods=['GET'])
 def get_daily_reports():
-    admins = db.load(ADMIN_USERS_FILE)
-    today = datetime.now().strftime('%Y-%m-%d')
+    day = request.args.get('date') or datetime.now().strftime('%Y-%m-%d')
+    daily = admin_activity.daily(day)
+    totals = admin_activity.totals()
     
     report = []
-    for a in admins.values():
-        daily_count = a.get('stats', {}).get('daily_actions', {}).get(today, 0)
+    for a in db.load(ADMIN_USERS_FILE, copy_data=False).values():
+        total = totals.get(a['id'], {})
         report.append({
             'id': a['id'],
             'full_name': a['full_name'],
             'avatar_url': a.get('avatar_url'),
             'role': a['role'],
-            'today_actions': daily_count,
-            'total_requests': a.get('stats', {}).get('total_processed_requests', 0),
-            'total_kyc': a.get('stats', {}).get('total_processed_kyc', 0)
+            'today_actions': daily.get(a['id'], {}).get('actions', 0),
+            'total_requests': total.get('requests', 0),
+            'total_kyc': total.get('kyc', 0)
         })
     return jsonify(report)
 
 @admins_api.route('/api/admins/current', methods=['GET'])
 def get_current_admin():
-    # In this implementation, we simulate session by allowing the frontend to pass an ID or fallback
-    admin_id = request.args.get('id', '31a58d38-ec27-4946-9fd0-371b6fa98ae3') # Fallback to default owner for demo
-    admins = db.load(ADMIN_USERS_FILE)
-    admin = admins.get(admin_id)
-    
+    admin = current_admin()
     if admin:
-        res = admin.copy()
-        if 'password' in res: del res['password']
-        return jsonify(res)
+        return jsonify({**admin, 'stats': admin_activity.stats_for(admin['id'])})
     return jsonify({'error': 'Not logged in'}), 401
@@ -0,0 +1,49 @@
+from flask import Blueprint, jsonify, request
+from core.database import db, BROADCASTS_FILE
+from bot.broadcasts import broadcasts, parse_segment, iter_recipients, report
+
+broadcasts_api = Blueprint('broadcasts_api', __name__)
+
+@broadcasts_api.route('/api/broadcasts', methods=['GET'])
+def get_broadcasts():
+    rows = db.load(BROADCASTS_FILE, copy_data=False).values()
+    return jsonify(sorted((report(r) for r in rows), key=lambda r: r['created_at'], reverse=True))
+
+@broadcasts_api.route('/api/broadcasts', methods=['POST'])
+def create_broadcast():
+    data = request.json or {}
+    text = (data.get('text') or '').strip()
+    if not text:
+        return jsonify({'error': 'Text is required'}), 400
+    if len(text) > 4096:
+        return jsonify({'error': 'Text is longer than 4096 characters'}), 400
+    try:
+        segment = parse_segment(data.get('segment'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    row = broadcasts.create(text, segment, parse_mode=data.get('parse_mode'), created_by=data.get('admin_id'))
+    return jsonify({'success': True, 'broadcast': report(row)})
+
+@broadcasts_api.route('/api/broadcasts/preview', methods=['POST'])
+def preview_broadcast():
+    """Number of users a segment would reach"""
+    try:
+        segment = parse_segment((request.json or {}).get('segment'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'segment': segment, 'recipients': sum(1 for _ in iter_recipients(segment))})
+
+@broadcasts_api.route('/api/broadcasts/<broadcast_id>', methods=['GET'])
+def get_broadcast(broadcast_id):
+    row = db.get(BROADCASTS_FILE, broadcast_id)
+    if not row:
+        return jsonify({'error': 'Broadcast not found'}), 404
+    return jsonify(report(row))
+
+@broadcasts_api.route('/api/broadcasts/<broadcast_id>/cancel', methods=['POST'])
+def cancel_broadcast(broadcast_id):
+    row = broadcasts.cancel(broadcast_id)
+    if not row:
+        return jsonify({'error': 'Broadcast not found or already finished'}), 404
+    return jsonify({'success': True, 'broadcast': report(row)})
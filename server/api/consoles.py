@@ -1,80 +1,189 @@
 from flask import Blueprint, request, jsonify
-from core.database import db, CONSOLES_FILE
+from core.database import db, CONSOLES_FILE, USERS_FILE, RENTALS_FILE, ARCHIVE_INDEX_FILE
+from core.response_cache import response_cache
+from core.archive import archive
+from core.indexes import rental_index
+from core.events import event_hub
+from core.static_files import save_upload
 import uuid
 from datetime import datetime
 import os
 
 consoles_api = Blueprint('consoles_api', __name__)
 
+MAX_BULK_ITEMS = 500
+BULK_EVENTS = {'create': 'console.created', 'update': 'console.updated', 'delete': 'console.deleted'}
+
+def parse_games(data):
+    games = data.get('games')
+    if isinstance(games, str):
+        return [g.strip() for g in games.split(',')]
+    return data.get('games', [])
+
+def new_console_row(data):
+    return {
+        'id': str(uuid.uuid4()),
+        'name': data.get('name'),
+        'model': data.get('model', 'PS5'),
+        'rental_price': int(data.get('rental_price', 0)),
+        'sale_price': int(data.get('sale_price', 0)),
+        'show_photo_in_bot': data.get('show_photo_in_bot', True),
+        'games': parse_games(data),
+        'status': 'available',
+        'created_at': datetime.now().isoformat()
+    }
+
+def updated_console_row(console, data):
+    return {
+        **console,
+        'name': data.get('name', console['name']),
+        'model': data.get('model', console['model']),
+        'rental_price': int(data.get('rental_price', console['rental_price'])),
+        'sale_price': int(data.get('sale_price', console.get('sale_price', 0))),
+        'show_photo_in_bot': data.get('show_photo_in_bot', console.get('show_photo_in_bot', True)),
+        'games': parse_games(data),
+        'updated_at': datetime.now().isoformat()
+    }
+
 @consoles_api.route('/api/consoles', methods=['GET', 'POST', 'PUT', 'DELETE'])
+@response_cache.cached(CONSOLES_FILE, RENTALS_FILE, USERS_FILE, ARCHIVE_INDEX_FILE)
 def manage_consoles():
-    consoles = db.load(CONSOLES_FILE)
-    from core.database import USERS_FILE, RENTALS_FILE
-    rentals = db.load(RENTALS_FILE)
-    users = db.load(USERS_FILE)
+    # Shared with other requests: writes go through put/delete/transactions
+    consoles = db.load(CONSOLES_FILE, copy_data=False)
     
     if request.method == 'GET':
+        users = db.load(USERS_FILE)
+        archived = archive.totals(RENTALS_FILE).get('by_console', {})
         result = []
         for cid, console in consoles.items():
             enriched = console.copy()
             
-            # Calculate total earnings
-            console_rentals = [r for r in rentals.values() if r.get('console_id') == cid]
-            enriched['total_earnings'] = round(sum(r.get('total_cost', 0) for r in console_rentals), 2)
+            # Calculate total earnings (archived rentals only as a running total)
+            console_rentals = rental_index.for_console(cid)
+            earnings = sum(r.get('total_cost', 0) for r in console_rentals) + archived.get(cid, [0, 0])[1]
+            enriched['total_earnings'] = round(earnings, 2)
             
             # Find active rental
-            active = next((r for r in console_rentals if r.get('status') == 'active'), None)
+            active = rental_index.active_for_console(cid)
             if active:
                 user = users.get(str(active.get('user_id')), {})
                 enriched['active_rental'] = {
                     'user_name': user.get('first_name', 'Admin Manual' if active.get('user_id') == 'admin_manual' else 'Неизвестный'),
                     'start_time': active.get('start_time'),
-                    'expected_end_time': active.get('expected_end_time')
+                    'expected_end_time': active.get('expected_end_time'),
+                    'overdue': active.get('overdue', False)
                 }
             
             result.append(enriched)
         return jsonify(result)
 
     if request.method == 'POST':
-        data = request.json
-        console_id = str(uuid.uuid4())
-        new_console = {
-            'id': console_id,
-            'name': data.get('name'),
-            'model': data.get('model', 'PS5'),
-            'rental_price': int(data.get('rental_price', 0)),
-            'sale_price': int(data.get('sale_price', 0)),
-            'show_photo_in_bot': data.get('show_photo_in_bot', True),
-            'games': [g.strip() for g in data.get('games', '').split(',')] if isinstance(data.get('games'), str) else data.get('games', []),
-            'status': 'available',
-            'created_at': datetime.now().isoformat()
-        }
-        consoles[console_id] = new_console
-        db.save(CONSOLES_FILE, consoles)
+        new_console = new_console_row(request.json)
+        db.put(CONSOLES_FILE, new_console['id'], new_console)
+        event_hub.publish('console.created', {'id': new_console['id']})
         return jsonify(new_console)
 
     if request.method == 'PUT':
         data = request.json
         console_id = data.get('id')
-        if console_id in consoles:
-            console = consoles[console_id]
-            console.update({
-                'name': data.get('name', console['name']),
-                'model': data.get('model', console['model']),
-                'rental_price': int(data.get('rental_price', console['rental_price'])),
-                'sale_price': int(data.get('sale_price', console.get('sale_price', 0))),
-                'show_photo_in_bot': data.get('show_photo_in_bot', console.get('show_photo_in_bot', True)),
-                'games': [g.strip() for g in data.get('games', '').split(',')] if isinstance(data.get('games'), str) else data.get('games', []),
-                'updated_at': datetime.now().isoformat()
-            })
-            db.save(CONSOLES_FILE, consoles)
+
+        # The bot process changes consoles too (status on rental start/end)
+        def update(tx):
+            console = tx.get(CONSOLES_FILE, console_id)
+            if console is None:
+                return None
+            console = updated_console_row(console, data)
+            tx.put(CONSOLES_FILE, console_id, console)
+            return console
+
+        console = db.run_transaction(update, CONSOLES_FILE)
+        if console is not None:
+            event_hub.publish('console.updated', {'id': console_id})
             return jsonify(console)
         return jsonify({'error': 'Not found'}), 404
 
     if request.method == 'DELETE':
         console_id = request.args.get('id')
         if console_id in consoles:
-            del consoles[console_id]
-            db.save(CONSOLES_FILE, consoles)
+            db.delete(CONSOLES_FILE, console_id)
+            event_hub.publish('console.deleted', {'id': console_id})
             return jsonify({'success': True})
         return jsonify({'error': 'Not found'}), 404
+
+@consoles_api.route('/api/consoles/bulk', methods=['POST'])
+def bulk_consoles():
+    """{"create": [{...}], "update": [{"id", ...}], "delete": ["id", ...]} -> per-item results.
+
+    Items are validated together against the stored consoles; the valid
+    ones are written in one transaction.
+    """
+    data = request.json or {}
+    ops = [(op, item) for op in ('create', 'update', 'delete') for item in (data.get(op) or [])]
+    if not ops:
+        return jsonify({'error': 'Nothing to do'}), 400
+    if len(ops) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'At most {MAX_BULK_ITEMS} items per call'}), 400
+
+    def apply(tx):
+        results = []
+        changes = set()
+        for op, item in ops:
+            console_id = item.get('id') if isinstance(item, dict) else item
+            result = {'op': op, 'id': console_id if op != 'create' else None, 'success': False}
+            results.append(result)
+
+            if op == 'create' and not (isinstance(item, dict) and item.get('name')):
+                result['error'] = 'Name is required'
+                continue
+            if op != 'create':
+                if console_id in changes:
+                    result['error'] = 'Console is listed twice'
+                    continue
+                console = tx.get(CONSOLES_FILE, console_id)
+                if console is None:
+                    result['error'] = 'Not found'
+                    continue
+            try:
+                if op == 'create':
+                    row = new_console_row(item)
+                    console_id = result['id'] = row['id']
+                elif op == 'update':
+                    row = updated_console_row(console, item if isinstance(item, dict) else {})
+                else:
+                    row = None
+            except (TypeError, ValueError):
+                result['error'] = 'Invalid price'
+                continue
+            tx.put(CONSOLES_FILE, console_id, row)
+            changes.add(console_id)
+            result['success'] = True
+        return results
+
+    results = db.run_transaction(apply, CONSOLES_FILE)
+
+    for result in results:
+        if result['success']:
+            event_hub.publish(BULK_EVENTS[result['op']], {'id': result['id']})
+
+    failed = sum(1 for r in results if not r['success'])
+    return jsonify({'success': failed == 0, 'processed': len(results) - failed, 'failed': failed, 'results': results})
+
+@consoles_api.route('/api/consoles/upload', methods=['POST'])
+def upload_console_photo():
+    file = request.files.get('file')
+    console_id = request.form.get('id')
+    if not file or not console_id:
+        return jsonify({'error': 'Invalid request'}), 400
+
+    if db.get(CONSOLES_FILE, console_id) is None:
+        return jsonify({'error': 'Not found'}), 404
+
+    # Content-hashed name, so the URL can be cached forever
+    url = save_upload(file, os.path.join('img', 'console'))
+    if not url:
+        return jsonify({'error': 'Unsupported file type'}), 400
+
+    if db.update(CONSOLES_FILE, console_id, {'photo_path': url, 'updated_at': datetime.now().isoformat()}) is None:
+        return jsonify({'error': 'Not found'}), 404
+    event_hub.publish('console.updated', {'id': console_id})
+    return jsonify({'success': True, 'photo_path': url})
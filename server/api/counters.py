@@ -0,0 +1,33 @@
+from flask import Blueprint, Response, jsonify, request
+from core.counters import counters
+
+counters_api = Blueprint('counters_api', __name__)
+
+# The dashboard gets the counts on /api/events; a long-poll here holds a
+# worker thread, so keep it short
+MAX_WAIT_SECONDS = 5
+
+@counters_api.route('/api/counters', methods=['GET'])
+def get_counters():
+    """Sidebar badge counts. Send If-None-Match with ?wait=<seconds> to long-poll."""
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), MAX_WAIT_SECONDS)
+    except ValueError:
+        wait = 0
+    known = request.if_none_match
+
+    counts, etag = counters.snapshot()
+    if wait and known.contains(etag):
+        counts, etag = counters.wait(etag, wait)
+
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'no-cache',
+        # Cross-origin fetch() only sees headers listed here
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if known.contains(etag):
+        return Response(status=304, headers=headers)
+    response = jsonify(counts)
+    response.headers.update(headers)
+    return response
@@ -1,10 +1,12 @@
 from flask import Blueprint, jsonify, request
 from core.database import db, DISCOUNTS_FILE
+from core.response_cache import response_cache
 from datetime import datetime
 
 discounts_api = Blueprint('discounts_api', __name__)
 
 @discounts_api.route('/api/discounts', methods=['GET'])
+@response_cache.cached(DISCOUNTS_FILE)
 def get_discounts():
     discounts = db.load(DISCOUNTS_FILE)
     return jsonify(discounts)
@@ -20,20 +22,17 @@ def save_discount():
     if not date:
         return jsonify({'error': 'Date is required'}), 400
 
-    discounts = db.load(DISCOUNTS_FILE)
-    
+    # One row per date; the cached table is shared with readers
     if data.get('delete'):
-        if date in discounts:
-            del discounts[date]
+        db.delete(DISCOUNTS_FILE, date)
     else:
-        discounts[date] = {
+        db.put(DISCOUNTS_FILE, date, {
             'type': discount_type,
             'value': value,
             'description': description,
             'updated_at': datetime.now().isoformat()
-        }
+        })
 
-    db.save(DISCOUNTS_FILE, discounts)
     return jsonify({'success': True})
 
 @discounts_api.route('/api/discounts/check', methods=['GET'])
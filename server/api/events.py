@@ -0,0 +1,54 @@
+import json
+import time
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from core.events import event_hub, format_sse
+from core.counters import counters
+
+events_api = Blueprint('events_api', __name__)
+
+KEEPALIVE_SECONDS = 15
+COUNTERS_CHECK_SECONDS = 2  # sidebar badges ride on the stream (see core/counters.py)
+BUSY_RETRY_MS = 30000   # when this worker has no stream slot left
+
+@events_api.route('/api/events')
+def stream_events():
+    # EventSource sends Last-Event-ID on reconnect; allow a query param too
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    sub = event_hub.subscribe(last_event_id)
+    if sub is None:
+        # The browser reconnects (with its Last-Event-ID) after the retry delay
+        return Response(f'retry: {BUSY_RETRY_MS}\nevent: busy\ndata: {{}}\n\n', mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            sent_etag, quiet_since = None, time.monotonic()
+            while True:
+                if sub.overflowed:
+                    # Too far behind: the client should refetch everything
+                    yield 'event: resync\ndata: {}\n\n'
+                    return
+                # No id: badge updates don't move the client's Last-Event-ID
+                counts, etag = counters.snapshot()
+                if etag != sent_etag:
+                    sent_etag = etag
+                    yield f"event: counters\ndata: {json.dumps(counts)}\n\n"
+                event = sub.get(timeout=COUNTERS_CHECK_SECONDS)
+                if event is not None:
+                    yield format_sse(event)
+                    quiet_since = time.monotonic()
+                elif time.monotonic() - quiet_since >= KEEPALIVE_SECONDS:
+                    yield ': keep-alive\n\n'
+                    quiet_since = time.monotonic()
+        finally:
+            event_hub.unsubscribe(sub)
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@events_api.route('/api/events/stats')
+def events_stats():
+    return jsonify(event_hub.stats())
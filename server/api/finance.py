@@ -0,0 +1,30 @@
+from flask import Blueprint, jsonify, request
+from core.rollups import revenue_rollups
+
+finance_api = Blueprint('finance_api', __name__)
+
+@finance_api.route('/api/finance/rollups', methods=['GET'])
+def get_rollups():
+    granularity = request.args.get('granularity', 'day')
+    group = request.args.get('group', 'all')
+    try:
+        series = revenue_rollups.query(
+            granularity, group,
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to')
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'granularity': granularity,
+        'group': group,
+        'ready': revenue_rollups.ready,
+        'series': series
+    })
+
+@finance_api.route('/api/finance/rollups/backfill', methods=['POST'])
+def backfill_rollups():
+    # The bot process rebuilds the buckets; poll GET until 'ready' is true
+    revenue_rollups.request_backfill()
+    return jsonify({'success': True})
@@ -2,6 +2,10 @@ from flask import Blueprint, jsonify
 import psutil
 import os
 from bot.bot_core import get_bot
+from bot.runner import bot_process_pid
+from bot.notifier import notifier
+from core.database import db
+from core.response_cache import response_cache
 
 health_api = Blueprint('health_api', __name__)
 
@@ -17,8 +21,12 @@ def get_health():
         storage_status = "Safe" if storage_percent < 90 else "Warning"
         
         # Bot status
+        # Bot status (the poller may live in a separate process, see bot/runner.py)
         bot = get_bot()
-        bot_status = "Active" if bot else "Offline"
+        if not bot:
+            bot_status = "Offline"
+        else:
+            bot_status = "Active" if bot_process_pid() else "Stopped"
         
         # Database check
         data_files = ['consoles.json', 'users.json', 'rentals.json', 'rental_requests.json', 'admin_settings.json']
@@ -36,6 +44,9 @@ def get_health():
             'storage_percent': storage_percent,
             'memory_usage': f"{int(memory_mb)}MB",
             'db_status': db_status,
+            'db_cache': db.cache_stats(),
+            'response_cache': response_cache.stats(),
+            'notifications': notifier.stats(),
             'uptime': "Online" # Simple indicator
         })
     except Exception as e:
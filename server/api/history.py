@@ -1,23 +1,53 @@
-from flask import Blueprint, jsonify
-from core.database import db, RENTALS_FILE, USERS_FILE, CONSOLES_FILE
+from flask import Blueprint, jsonify, request
+from core.database import db, RENTALS_FILE, USERS_FILE, CONSOLES_FILE, ARCHIVE_INDEX_FILE
+from core.response_cache import response_cache
+from core.archive import archive, MergedRows
+from core.indexes import rental_index, rentals_by_start
+from core.pagination import paginate, parse_limit, parse_fields, project
 
 history_api = Blueprint('history_api', __name__)
 
 @history_api.route('/api/history')
+@response_cache.cached(RENTALS_FILE, USERS_FILE, CONSOLES_FILE, ARCHIVE_INDEX_FILE)
 def get_history():
-    rentals = db.load(RENTALS_FILE)
+    args = request.args
+    try:
+        limit = parse_limit(args.get('limit'))
+        fields = parse_fields(args.get('fields'))
+        filters = {f: args.get(f) for f in ('status', 'console_id', 'user_id') if args.get(f)}
+
+        rentals = db.load(RENTALS_FILE)
+        index = rentals_by_start
+        # Sort only the matching subset when a secondary index narrows it down enough
+        candidates = rental_index.candidate_keys(filters) if filters else None
+        if candidates is not None and len(candidates) * 4 > len(rentals):
+            candidates = None
+        if filters.get('status', 'completed') == 'completed' and archive.months(RENTALS_FILE):
+            # Older pages come from cold storage (completed rentals only),
+            # partitions are opened only when a page reaches them
+            rentals = MergedRows(rentals)
+            index = archive.merged_index(rentals_by_start, RENTALS_FILE, rentals)
+            candidates = None
+
+        # Newest first, straight from the presorted start_time index
+        keys, next_cursor = paginate(
+            index, rentals, limit=limit, cursor=args.get('cursor'),
+            date_from=args.get('from'), date_to=args.get('to'),
+            filters=filters, candidates=candidates
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     users = db.load(USERS_FILE)
     consoles = db.load(CONSOLES_FILE)
     
     result = []
-    # Sort by start time descending
-    sorted_rentals = sorted(rentals.values(), key=lambda x: x.get('start_time', ''), reverse=True)
-    
-    for r in sorted_rentals:
+    for key in keys:
+        r = rentals[key]
         user = users.get(str(r.get('user_id')), {})
         console = consoles.get(r.get('console_id'), {})
         
-        result.append({
+        result.append(project({
             'id': r.get('id'),
             'user_name': user.get('first_name', 'Неизвестный'),
             'user_handle': user.get('username', 'user'),
@@ -26,6 +56,9 @@ def get_history():
             'end_time': r.get('expected_end_time'),
             'status': r.get('status'),
             'total_cost': r.get('total_cost', 0)
-        })
-        
-    return jsonify(result)
+        }, fields))
+
+    # Without limit/cursor keep returning the plain list older clients expect
+    if limit is None and not args.get('cursor'):
+        return jsonify(result)
+    return jsonify({'items': result, 'next_cursor': next_cursor})
@@ -1,5 +1,9 @@
 from flask import Blueprint, jsonify, request
-from core.database import db, KYC_REQUESTS_FILE, USERS_FILE, ADMIN_USERS_FILE
+from core.database import db, KYC_REQUESTS_FILE, USERS_FILE
+from core.response_cache import response_cache
+from core.events import event_hub
+from core.auth import admin_directory
+from core.activity import admin_activity
 from datetime import datetime
 import os
 import uuid
@@ -9,10 +13,8 @@ kyc_api = Blueprint('kyc_api', __name__)
 def get_kyc_requests():
     return db.load(KYC_REQUESTS_FILE)
 
-def save_kyc_requests(requests):
-    db.save(KYC_REQUESTS_FILE, requests)
-
 @kyc_api.route('/api/kyc', methods=['GET'])
+@response_cache.cached(KYC_REQUESTS_FILE, USERS_FILE)
 def get_all_kyc():
     requests = get_kyc_requests()
     users = db.load(USERS_FILE)
@@ -36,75 +38,76 @@ def kyc_action():
     action = data.get('action') # 'approve' or 'reject'
     admin_note = data.get('note', '')
 
-    requests = get_kyc_requests()
-    if req_id not in requests:
+    req = db.get(KYC_REQUESTS_FILE, req_id)
+    if req is None:
         return jsonify({'error': 'Request not found'}), 404
 
-    req = requests[req_id]
     user_id = str(req['user_id'])
     
-    users = db.load(USERS_FILE)
-    if user_id not in users:
+    if db.get(USERS_FILE, user_id) is None:
         return jsonify({'error': 'User not found'}), 404
 
+    req_fields = {'admin_note': admin_note, 'processed_at': datetime.now().isoformat()}
+    user_fields = {'kyc_note': admin_note}
     if action == 'approve':
-        req['status'] = 'approved'
-        users[user_id]['kyc_status'] = 'verified'
+        req_fields['status'] = 'approved'
+        user_fields['kyc_status'] = 'verified'
     elif action == 'reject':
-        req['status'] = 'rejected'
-        users[user_id]['kyc_status'] = 'rejected'
-    
-    req['admin_note'] = admin_note
-    users[user_id]['kyc_note'] = admin_note
-    req['processed_at'] = datetime.now().isoformat()
+        req_fields['status'] = 'rejected'
+        user_fields['kyc_status'] = 'rejected'
     
-    # Track Admin Activity
     admin_id = data.get('admin_id')
     if admin_id:
-        req['processed_by'] = admin_id
-        admins = db.load(ADMIN_USERS_FILE)
-        if admin_id in admins:
-            stats = admins[admin_id].get('stats', {
-                'total_processed_requests': 0,
-                'total_processed_kyc': 0,
-                'daily_actions': {}
-            })
-            stats['total_processed_kyc'] = stats.get('total_processed_kyc', 0) + 1
-            
-            today = datetime.now().strftime('%Y-%m-%d')
-            daily = stats.get('daily_actions', {})
-            daily[today] = daily.get(today, 0) + 1
-            stats['daily_actions'] = daily
-            
-            admins[admin_id]['stats'] = stats
-            db.save(ADMIN_USERS_FILE, admins)
+        req_fields['processed_by'] = admin_id
+
+    # The bot process writes these tables too: change only our fields of
+    # the rows as they are stored now
+    def decide(tx):
+        req = tx.get(KYC_REQUESTS_FILE, req_id)
+        user = tx.get(USERS_FILE, user_id)
+        if req is None or user is None:
+            return None
+        req = {**req, **req_fields}
+        tx.put(KYC_REQUESTS_FILE, req_id, req)
+        tx.put(USERS_FILE, user_id, {**user, **user_fields})
+        return req
+
+    req = db.run_transaction(decide, KYC_REQUESTS_FILE, USERS_FILE)
+    if req is None:
+        return jsonify({'error': 'Request not found'}), 404
+
+    # Track Admin Activity
+    if admin_id and admin_directory.get(admin_id):
+        admin_activity.record(admin_id, 'kyc', req_id, action)
     
-    save_kyc_requests(requests)
-    db.save(USERS_FILE, users)
+    # The bot's cached session must not keep the old status (a separate
+    # bot process picks the change up from the users table on its own)
+    from bot.sessions import sessions
+    sessions.invalidate(user_id)
     
-    # Send Bot notification
+    event_hub.publish('kyc.processed', {'id': req_id, 'user_id': user_id, 'status': req['status']})
+    
+    # Send Bot notification (delivered in the background)
     try:
-        from bot.bot_core import get_bot
+        from bot.notifier import notifier
         from bot.keyboards import get_main_keyboard
-        from core.database import SETTINGS_FILE
+        from core.settings import settings_service
         
-        bot = get_bot()
-        settings = db.load(SETTINGS_FILE)
-        help_btn_text = settings.get('help_button_text', 'ℹ️ Помощь')
+        help_btn_text = settings_service.get('help_button_text')
         
         if action == 'approve':
             msg = "✅ *Поздравляем!*\n\nВаш профиль успешно верифицирован. Теперь вам доступны все функции аренды консолей."
-            bot.send_message(user_id, msg, parse_mode='Markdown', 
-                           reply_markup=get_main_keyboard(False, help_btn_text, 'verified'))
+            notifier.send(user_id, msg, parse_mode='Markdown', 
+                          reply_markup=get_main_keyboard(False, help_btn_text, 'verified'))
         elif action == 'reject':
             msg = f"❌ *Верификация отклонена*\n\nК сожалению, мы не смогли подтвердить ваш профиль."
             if admin_note:
                 msg += f"\n\n💬 Причина: {admin_note}"
             msg += "\n\nВы можете попробовать отправить документы еще раз через меню «🛡️ Верификация»."
-            bot.send_message(user_id, msg, parse_mode='Markdown',
-                           reply_markup=get_main_keyboard(False, help_btn_text, 'rejected'))
+            notifier.send(user_id, msg, parse_mode='Markdown',
+                          reply_markup=get_main_keyboard(False, help_btn_text, 'rejected'))
     except Exception as e:
-        print(f"Failed to send KYC notification: {e}")
+        print(f"Failed to queue KYC notification: {e}")
         
     return jsonify({'success': True})
 
@@ -118,22 +121,16 @@ def submit_kyc():
     if not user_id or not photo_url:
         return jsonify({'error': 'Missing data'}), 400
         
-    requests = get_kyc_requests()
-    
     req_id = str(uuid.uuid4())
-    requests[req_id] = {
+    db.put(KYC_REQUESTS_FILE, req_id, {
         'user_id': user_id,
         'photo_url': photo_url,
         'status': 'pending',
         'timestamp': datetime.now().isoformat()
-    }
-    
-    save_kyc_requests(requests)
+    })
     
     # Update user state
-    users = db.load(USERS_FILE)
-    if str(user_id) in users:
-        users[str(user_id)]['kyc_status'] = 'pending'
-        db.save(USERS_FILE, users)
+    db.update(USERS_FILE, str(user_id), {'kyc_status': 'pending'})
         
+    event_hub.publish('kyc.submitted', {'id': req_id, 'user_id': str(user_id)})
     return jsonify({'success': True, 'request_id': req_id})
@@ -1,12 +1,19 @@
 from flask import Blueprint, request, jsonify
-from core.database import db, RENTAL_REQUESTS_FILE, RENTALS_FILE, CONSOLES_FILE, USERS_FILE, DISCOUNTS_FILE, ADMIN_USERS_FILE
-from bot.bot_core import get_bot
+from core.database import db, RENTAL_REQUESTS_FILE, RENTALS_FILE, CONSOLES_FILE, USERS_FILE, DISCOUNTS_FILE
+from core.response_cache import response_cache
+from core.indexes import rental_index
+from core.events import event_hub
+from core.auth import admin_directory
+from core.activity import admin_activity
+from core.billing import complete_rental
+from bot.notifier import notifier
 import uuid
 from datetime import datetime, timedelta
 
 rentals_api = Blueprint('rentals_api', __name__)
 
 @rentals_api.route('/api/requests', methods=['GET'])
+@response_cache.cached(RENTAL_REQUESTS_FILE, USERS_FILE, CONSOLES_FILE)
 def get_requests():
     requests = db.load(RENTAL_REQUESTS_FILE)
     users = db.load(USERS_FILE)
@@ -21,129 +28,134 @@ def get_requests():
         
     return jsonify(result)
 
+MAX_BULK_ITEMS = 500
+
+def current_discount():
+    """Discount percent set for today in discounts.json"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    day_rule = db.load(DISCOUNTS_FILE, copy_data=False).get(today, {})
+    return day_rule.get('value', 0) if day_rule.get('type') == 'discount' else 0
+
+def apply_request_actions(actions, admin_id=None):
+    """Approve/reject rental requests: [{'id', 'action'}] -> per-item results.
+
+    Each item is checked against the state left by the items before it (two
+    requests for one console: the first wins). The valid ones are committed
+    in one transaction, with one write per table; users are notified in one go.
+    """
+    now = datetime.now()
+
+    def decide(tx):
+        results = []
+        req_rows, console_rows = {}, {}
+        discount_pct = current_discount()
+
+        for item in actions:
+            request_id = item.get('id')
+            action = item.get('action') # 'approve' or 'reject'
+            result = {'id': request_id, 'success': False}
+            results.append(result)
+
+            req = tx.get(RENTAL_REQUESTS_FILE, request_id)
+            if req is None:
+                result.update(error='Request not found', code=404)
+                continue
+            if action not in ('approve', 'reject'):
+                result.update(error='Invalid action', code=400)
+                continue
+            if request_id in req_rows:
+                result.update(error='Request is listed twice', code=400)
+                continue
+            if req.get('status', 'pending') != 'pending':
+                result.update(error='Request is already processed', code=409)
+                continue
+
+            if action == 'approve':
+                console_id = req.get('console_id')
+                console = tx.get(CONSOLES_FILE, console_id)
+                # Check if console is available
+                if (console or {}).get('status') != 'available':
+                    result.update(error='Console is not available', code=400)
+                    continue
+
+                rental_id = str(uuid.uuid4())
+                hours = req.get('selected_hours', 24)
+                tx.put(RENTALS_FILE, rental_id, {
+                    'id': rental_id,
+                    'user_id': req.get('user_id'),
+                    'console_id': console_id,
+                    'start_time': now.isoformat(),
+                    'expected_end_time': (now + timedelta(hours=hours)).isoformat(),
+                    'status': 'active',
+                    'discount_percent': discount_pct,
+                    'total_cost': 0
+                })
+                console_rows[console_id] = {**console, 'status': 'rented'}
+                tx.put(CONSOLES_FILE, console_id, console_rows[console_id])
+                result['rental_id'] = rental_id
+
+            req = {**req, 'status': 'approved' if action == 'approve' else 'rejected', 'updated_at': now.isoformat()}
+            if admin_id:
+                req['processed_by'] = admin_id
+            req_rows[request_id] = req
+            tx.put(RENTAL_REQUESTS_FILE, request_id, req)
+            result['success'] = True
+        return results, req_rows, console_rows
+
+    results, req_rows, console_rows = db.run_transaction(decide, RENTAL_REQUESTS_FILE, CONSOLES_FILE, RENTALS_FILE)
+
+    # Track Admin Activity
+    track = bool(admin_id and admin_directory.get(admin_id))
+    messages = []
+    for result in results:
+        if not result['success']:
+            continue
+        request_id = result['id']
+        req = req_rows[request_id]
+        user_id, console_id = req.get('user_id'), req.get('console_id')
+        if req['status'] == 'approved':
+            if track:
+                admin_activity.record(admin_id, 'requests', request_id, 'approve')
+            event_hub.publish('rental_request.approved', {'id': request_id, 'console_id': console_id, 'rental_id': result['rental_id']})
+            event_hub.publish('rental.started', {'id': result['rental_id'], 'console_id': console_id, 'user_id': user_id})
+            messages.append((user_id, f"✅ Ваша заявка на {console_rows[console_id]['name']} одобрена!\nАренда успешно начата."))
+        else:
+            if track:
+                admin_activity.record(admin_id, 'requests', request_id, 'reject')
+            event_hub.publish('rental_request.rejected', {'id': request_id, 'console_id': console_id})
+            messages.append((user_id, "❌ К сожалению, ваша заявка на аренду была отклонена администратором."))
+
+    # Notify users (delivered in the background)
+    if messages:
+        notifier.send_many(messages)
+    return results
+
 @rentals_api.route('/api/requests/action', methods=['POST'])
 def request_action():
     data = request.json
-    request_id = data.get('id')
-    action = data.get('action') # 'approve' or 'reject'
-    
-    requests = db.load(RENTAL_REQUESTS_FILE)
-    if request_id not in requests:
-        return jsonify({'error': 'Request not found'}), 404
-        
-    req = requests[request_id]
-    user_id = req.get('user_id')
-    console_id = req.get('console_id')
-    
-    bot = get_bot()
-    
-    if action == 'approve':
-        consoles = db.load(CONSOLES_FILE)
-        rentals = db.load(RENTALS_FILE)
-        
-        # Check if console is available
-        if consoles.get(console_id, {}).get('status') != 'available':
-            return jsonify({'error': 'Console is not available'}), 400
-            
-        # Update request status
-        req['status'] = 'approved'
-        req['updated_at'] = datetime.now().isoformat()
-        
-        # Get current discount
-        today = datetime.now().strftime('%Y-%m-%d')
-        discounts = db.load(DISCOUNTS_FILE)
-        day_rule = discounts.get(today, {})
-        discount_pct = day_rule.get('value', 0) if day_rule.get('type') == 'discount' else 0
-        
-        # Create rental
-        rental_id = str(uuid.uuid4())
-        hours = req.get('selected_hours', 24)
-        rental = {
-            'id': rental_id,
-            'user_id': user_id,
-            'console_id': console_id,
-            'start_time': datetime.now().isoformat(),
-            'expected_end_time': (datetime.now() + timedelta(hours=hours)).isoformat(),
-            'status': 'active',
-            'discount_percent': discount_pct,
-            'total_cost': 0
-        }
-        rentals[rental_id] = rental
-        consoles[console_id]['status'] = 'rented'
-        
-        db.save(RENTALS_FILE, rentals)
-        db.save(CONSOLES_FILE, consoles)
-        
-        # Track Admin Activity
-        admin_id = data.get('admin_id')
-        if admin_id:
-            req['processed_by'] = admin_id
-            admins = db.load(ADMIN_USERS_FILE)
-            if admin_id in admins:
-                stats = admins[admin_id].get('stats', {
-                    'total_processed_requests': 0,
-                    'total_processed_kyc': 0,
-                    'daily_actions': {}
-                })
-                stats['total_processed_requests'] = stats.get('total_processed_requests', 0) + 1
-                
-                today = datetime.now().strftime('%Y-%m-%d')
-                daily = stats.get('daily_actions', {})
-                daily[today] = daily.get(today, 0) + 1
-                stats['daily_actions'] = daily
-                
-                admins[admin_id]['stats'] = stats
-                db.save(ADMIN_USERS_FILE, admins)
-
-        db.save(RENTAL_REQUESTS_FILE, requests)
-        
-        # Notify user
-        if bot:
-            try:
-                msg = f"✅ Ваша заявка на {consoles[console_id]['name']} одобрена!\nАренда успешно начата."
-                bot.send_message(user_id, msg)
-            except Exception as e:
-                print(f"Failed to notify user: {e}")
-                
-        return jsonify({'success': True, 'rental_id': rental_id})
-        
-    elif action == 'reject':
-        req['status'] = 'rejected'
-        req['updated_at'] = datetime.now().isoformat()
-        
-        # Track Admin Activity
-        admin_id = data.get('admin_id')
-        if admin_id:
-            req['processed_by'] = admin_id
-            admins = db.load(ADMIN_USERS_FILE)
-            if admin_id in admins:
-                stats = admins[admin_id].get('stats', {
-                    'total_processed_requests': 0,
-                    'total_processed_kyc': 0,
-                    'daily_actions': {}
-                })
-                stats['total_processed_requests'] = stats.get('total_processed_requests', 0) + 1
-                
-                today = datetime.now().strftime('%Y-%m-%d')
-                daily = stats.get('daily_actions', {})
-                daily[today] = daily.get(today, 0) + 1
-                stats['daily_actions'] = daily
-                
-                admins[admin_id]['stats'] = stats
-                db.save(ADMIN_USERS_FILE, admins)
-
-        db.save(RENTAL_REQUESTS_FILE, requests)
-        
-        # Notify user
-        if bot:
-            try:
-                bot.send_message(user_id, "❌ К сожалению, ваша заявка на аренду была отклонена администратором.")
-            except Exception as e:
-                print(f"Failed to notify user: {e}")
-                
-        return jsonify({'success': True})
-
-    return jsonify({'error': 'Invalid action'}), 400
+    result = apply_request_actions([{'id': data.get('id'), 'action': data.get('action')}], data.get('admin_id'))[0]
+    if not result['success']:
+        return jsonify({'error': result['error']}), result['code']
+    if 'rental_id' in result:
+        return jsonify({'success': True, 'rental_id': result['rental_id']})
+    return jsonify({'success': True})
+
+@rentals_api.route('/api/requests/bulk-action', methods=['POST'])
+def bulk_request_action():
+    """{"actions": [{"id", "action"}, ...]} or {"ids": [...], "action": "reject"}"""
+    data = request.json or {}
+    actions = data.get('actions')
+    if actions is None and isinstance(data.get('ids'), list):
+        actions = [{'id': rid, 'action': data.get('action')} for rid in data['ids']]
+    if not isinstance(actions, list) or not actions or not all(isinstance(a, dict) for a in actions):
+        return jsonify({'error': 'Expected a list of actions'}), 400
+    if len(actions) > MAX_BULK_ITEMS:
+        return jsonify({'error': f'At most {MAX_BULK_ITEMS} actions per call'}), 400
+
+    results = apply_request_actions(actions, data.get('admin_id'))
+    failed = sum(1 for r in results if not r['success'])
+    return jsonify({'success': failed == 0, 'processed': len(results) - failed, 'failed': failed, 'results': results})
+
 @rentals_api.route('/api/rentals/manual', methods=['POST'])
 def manual_rental():
     data = request.json
@@ -153,39 +165,33 @@ def manual_rental():
     if not console_id:
         return jsonify({'error': 'Console ID is required'}), 400
         
-    consoles = db.load(CONSOLES_FILE)
-    if console_id not in consoles:
-        return jsonify({'error': 'Console not found'}), 404
-        
-    if consoles[console_id].get('status') != 'available':
-        return jsonify({'error': 'Console is not available'}), 400
-        
-    # Get current discount
-    today = datetime.now().strftime('%Y-%m-%d')
-    discounts = db.load(DISCOUNTS_FILE)
-    day_rule = discounts.get(today, {})
-    discount_pct = day_rule.get('value', 0) if day_rule.get('type') == 'discount' else 0
-    
-    rentals = db.load(RENTALS_FILE)
-    rental_id = str(uuid.uuid4())
-    
-    rental = {
-        'id': rental_id,
-        'user_id': 'admin_manual',
-        'console_id': console_id,
-        'start_time': datetime.now().isoformat(),
-        'expected_end_time': (datetime.now() + timedelta(hours=int(hours))).isoformat(),
-        'status': 'active',
-        'discount_percent': discount_pct,
-        'total_cost': 0
-    }
-    
-    rentals[rental_id] = rental
-    consoles[console_id]['status'] = 'rented'
-    
-    db.save(RENTALS_FILE, rentals)
-    db.save(CONSOLES_FILE, consoles)
-    
+    def start(tx):
+        console = tx.get(CONSOLES_FILE, console_id)
+        if console is None:
+            return None, (jsonify({'error': 'Console not found'}), 404)
+        if console.get('status') != 'available':
+            return None, (jsonify({'error': 'Console is not available'}), 400)
+
+        discount_pct = current_discount()
+        rental_id = str(uuid.uuid4())
+        tx.put(RENTALS_FILE, rental_id, {
+            'id': rental_id,
+            'user_id': 'admin_manual',
+            'console_id': console_id,
+            'start_time': datetime.now().isoformat(),
+            'expected_end_time': (datetime.now() + timedelta(hours=int(hours))).isoformat(),
+            'status': 'active',
+            'discount_percent': discount_pct,
+            'total_cost': 0
+        })
+        tx.put(CONSOLES_FILE, console_id, {**console, 'status': 'rented'})
+        return rental_id, None
+
+    rental_id, error = db.run_transaction(start, CONSOLES_FILE, RENTALS_FILE)
+    if error:
+        return error
+
+    event_hub.publish('rental.started', {'id': rental_id, 'console_id': console_id, 'user_id': 'admin_manual'})
     return jsonify({'success': True, 'rental_id': rental_id})
 @rentals_api.route('/api/rentals/terminate', methods=['POST'])
 def terminate_rental():
@@ -195,48 +201,18 @@ def terminate_rental():
     if not console_id:
         return jsonify({'error': 'Console ID is required'}), 400
         
-    rentals = db.load(RENTALS_FILE)
-    consoles = db.load(CONSOLES_FILE)
-    
-    # Find active rental for this console
-    active_rental = None
-    rental_key = None
-    for rid, r in rentals.items():
-        if r.get('console_id') == console_id and r.get('status') == 'active':
-            active_rental = r
-            rental_key = rid
-            break
-            
-    if not active_rental:
+    def terminate(tx):
+        # Find active rental for this console
+        rental_key = rental_index.active_key(console_id)
+        done = complete_rental(tx, rental_key) if rental_key else None
+        return (rental_key, *done) if done else None
+
+    done = db.run_transaction(terminate, CONSOLES_FILE, RENTALS_FILE)
+    if not done:
         return jsonify({'error': 'No active rental found for this console'}), 404
-        
-    # Calculate costs
-    start_time = datetime.fromisoformat(active_rental['start_time'])
-    now = datetime.now()
-    duration = now - start_time
-    hours = max(1, round(duration.total_seconds() / 3600, 2)) # Min 1 hour charge or exact
-    
-    hourly_price = consoles.get(console_id, {}).get('rental_price', 0)
-    total_cost = hours * hourly_price
-    
-    # Apply discount if recorded in rental
-    discount_pct = active_rental.get('discount_percent', 0)
-    if discount_pct > 0:
-        total_cost = total_cost * (1 - discount_pct / 100)
-    
-    total_cost = round(total_cost, 2)
-    
-    # Update rental
-    active_rental['status'] = 'completed'
-    active_rental['end_time'] = now.isoformat()
-    active_rental['total_cost'] = total_cost
-    
-    # Update console
-    if console_id in consoles:
-        consoles[console_id]['status'] = 'available'
-        
-    db.save(RENTALS_FILE, rentals)
-    db.save(CONSOLES_FILE, consoles)
+    rental_key, total_cost, hours = done
+
+    event_hub.publish('rental.terminated', {'id': rental_key, 'console_id': console_id, 'total_cost': total_cost})
     
     return jsonify({
         'success': True,
@@ -1,21 +1,17 @@
 from flask import Blueprint, request, jsonify
 from core.database import db, SETTINGS_FILE
+from core.settings import settings_service
 
 settings_api = Blueprint('settings_api', __name__)
 
 @settings_api.route('/api/settings', methods=['GET', 'POST'])
 def manage_settings():
-    settings = db.load(SETTINGS_FILE)
-    
     if request.method == 'GET':
-        return jsonify(settings)
+        return jsonify(db.load(SETTINGS_FILE))
 
     if request.method == 'POST':
         data = request.json
         updatable_fields = ['bot_token', 'admin_chat_id', 'require_approval', 'notifications_enabled', 'help_text', 'help_button_text']
-        for field in updatable_fields:
-            if field in data:
-                settings[field] = data[field]
-        
-        db.save(SETTINGS_FILE, settings)
+        # Saving notifies settings subscribers (the bot swaps its token right away)
+        settings = settings_service.update({f: data[f] for f in updatable_fields if f in data})
         return jsonify({'success': True, 'settings': settings})
@@ -1,34 +1,25 @@
 from flask import Blueprint, jsonify
 from core.database import db, CONSOLES_FILE, USERS_FILE, RENTALS_FILE
+from core.stats import stats_model
+from core.archive import archive
 
 stats_api = Blueprint('stats_api', __name__)
 
 @stats_api.route('/api/stats')
 def get_stats():
+    # Totals are maintained incrementally by core.stats, nothing is scanned here
+    stats = stats_model.snapshot()
+    archived = archive.totals(RENTALS_FILE)
     consoles = db.load(CONSOLES_FILE)
     users = db.load(USERS_FILE)
     rentals = db.load(RENTALS_FILE)
     
-    total_revenue = sum(r.get('total_cost', 0) for r in rentals.values())
-    active_rentals_list = [r for r in rentals.values() if r.get('status') == 'active']
-    active_rentals_count = len(active_rentals_list)
-    
-    # Calculate revenue per minute from active rentals
-    revenue_per_minute = 0
-    for r in active_rentals_list:
-        console_id = r.get('console_id')
-        if console_id in consoles:
-            hourly_price = consoles[console_id].get('rental_price', 0)
-            revenue_per_minute += hourly_price / 60
-    
     # Generate Activity Stream
     activity = []
-    
-    # Sort all rentals by time
-    all_rentals = list(rentals.values())
-    sorted_rentals = sorted(all_rentals, key=lambda x: x.get('start_time', ''), reverse=True)[:10]
-    
-    for r in sorted_rentals:
+    for rid in stats['activity']:
+        r = rentals.get(rid)
+        if not r:
+            continue
         user = users.get(str(r.get('user_id')), {})
         console = consoles.get(r.get('console_id'), {})
         is_active = r.get('status') == 'active'
@@ -43,11 +34,12 @@ def get_stats():
         })
         
     return jsonify({
-        'total_revenue': total_revenue,
-        'revenue_per_minute': round(revenue_per_minute, 2),
-        'active_rentals': active_rentals_count,
+        'total_revenue': round(stats['total_revenue'] + archived.get('total_cost', 0), 2),
+        'total_rentals': len(rentals) + archived['count'],
+        'revenue_per_minute': stats['revenue_per_minute'],
+        'active_rentals': stats['active_rentals'],
         'total_users': len(users),
-        'total_consoles': len(consoles),
-        'available_consoles': len([c for c in consoles.values() if c.get('status') == 'available']),
+        'total_consoles': stats['total_consoles'],
+        'available_consoles': stats['available_consoles'],
         'activity': activity
     })
@@ -1,27 +1,51 @@
-from flask import Blueprint, jsonify
-from core.database import db, USERS_FILE, RENTALS_FILE, CONSOLES_FILE
+from flask import Blueprint, jsonify, request
+from core.database import db, USERS_FILE, CONSOLES_FILE, RENTALS_FILE, ARCHIVE_INDEX_FILE
+from core.response_cache import response_cache
+from core.archive import archive
+from core.indexes import rental_index, users_by_joined
+from core.pagination import paginate, parse_limit, parse_fields, project
 
 users_api = Blueprint('users_api', __name__)
 
 @users_api.route('/api/users')
+@response_cache.cached(USERS_FILE, CONSOLES_FILE, RENTALS_FILE, ARCHIVE_INDEX_FILE)
 def get_users():
-    users = db.load(USERS_FILE)
-    rentals = db.load(RENTALS_FILE)
+    args = request.args
+    try:
+        limit = parse_limit(args.get('limit'))
+        fields = parse_fields(args.get('fields'))
+        filters = {f: args.get(f) for f in ('kyc_status',) if args.get(f)}
+
+        users = db.load(USERS_FILE)
+        # Newest users first, date range applies to joined_at
+        keys, next_cursor = paginate(
+            users_by_joined, users, limit=limit, cursor=args.get('cursor'),
+            date_from=args.get('from'), date_to=args.get('to'), filters=filters
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     consoles = db.load(CONSOLES_FILE)
+    with_rentals = not fields or 'rentals' in fields or 'rental_count' in fields
+    archived = archive.totals(RENTALS_FILE).get('by_user', {}) if with_rentals else {}
     
     result = []
-    for uid, user in users.items():
-        user_data = user.copy()
-        # Find and enrich rentals for this user
-        user_rentals = []
-        for r in rentals.values():
-            if str(r.get('user_id')) == str(uid):
+    for uid in keys:
+        user_data = users[uid].copy()
+        if with_rentals:
+            # Find and enrich rentals for this user
+            user_rentals = []
+            for r in rental_index.for_user(uid):
                 r_enriched = r.copy()
                 r_enriched['console_name'] = consoles.get(r.get('console_id'), {}).get('name', 'Неизвестная консоль')
                 user_rentals.append(r_enriched)
-        
-        user_data['rentals'] = user_rentals
-        user_data['rental_count'] = len(user_rentals)
-        result.append(user_data)
-        
-    return jsonify(result)
+            
+            # Archived rentals are counted but not listed
+            user_data['rentals'] = user_rentals
+            user_data['rental_count'] = len(user_rentals) + archived.get(str(uid), 0)
+        result.append(project(user_data, fields))
+
+    # Without limit/cursor keep returning the plain list older clients expect
+    if limit is None and not args.get('cursor'):
+        return jsonify(result)
+    return jsonify({'items': result, 'next_cursor': next_cursor})
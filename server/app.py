@@ -1,4 +1,4 @@
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
 from api.consoles import consoles_api
 from api.stats import stats_api
@@ -10,11 +10,15 @@ from api.health import health_api
 from api.admins import admins_api
 from api.kyc import kyc_api
 from api.discounts import discounts_api
-from bot.bot_core import get_bot
-from bot.handlers import register_handlers
+from api.finance import finance_api
+from api.events import events_api
+from api.broadcasts import broadcasts_api
+from api.counters import counters_api
+from core.static_files import serve_static
+from bot.runner import run_bot
+from bot.bot_core import BOT_MODE
 import os
 import threading
-import time
 
 app = Flask(__name__)
 CORS(app)
@@ -30,41 +34,26 @@ app.register_blueprint(health_api)
 app.register_blueprint(admins_api)
 app.register_blueprint(kyc_api)
 app.register_blueprint(discounts_api)
+app.register_blueprint(finance_api)
+app.register_blueprint(events_api)
+app.register_blueprint(broadcasts_api)
+app.register_blueprint(counters_api)
 
-# Static files serving for KYC photos
+# Static files serving for KYC photos, avatars and console images (see core/static_files.py)
 @app.route('/static/<path:path>')
 def send_static(path):
-    return send_from_directory('static', path)
-
-def run_bot():
-    print("🤖 Bot thread waiting for server to stabilize...")
-    time.sleep(2) # Give Flask a moment to start/restart
-    last_token = None
-    while True:
-        try:
-            bot = get_bot()
-            if bot:
-                if not last_token or bot.token != last_token:
-                    print(f"🤖 Telegram Bot initializing with token {bot.token[:10]}...")
-                    register_handlers(bot)
-                    last_token = bot.token
-                
-                print("🤖 Telegram Bot starting polling...")
-                bot.polling(none_stop=True, interval=0, timeout=20)
-            else:
-                time.sleep(10)
-        except Exception as e:
-            if "Conflict" in str(e):
-                print("❌ Conflict: Another bot instance is running. Retrying in 5s...")
-                time.sleep(5)
-            else:
-                print(f"❌ Bot error: {e}")
-                time.sleep(5)
+    return serve_static(path)
 
+# Development server. For production use wsgi.py (web) + bot/runner.py (bot).
 if __name__ == '__main__':
     # Ensure static directories exist
     os.makedirs('static/img/console', exist_ok=True)
     
+    # Single dev process: it can receive Telegram updates itself
+    if BOT_MODE == 'webhook':
+        from bot.webhook import webhook_api
+        app.register_blueprint(webhook_api)
+
     # Set debug mode explicitly so the check below works correctly
     app.debug = True
     
@@ -1,27 +1,46 @@
-from core.database import db, SETTINGS_FILE
+from core.settings import settings_service
 import telebot
+from telebot import apihelper
 import os
+import threading
+
+# polling (default) or webhook, see bot/webhook.py
+BOT_MODE = os.environ.get('BOT_MODE', 'polling')
+
+# Point the bot at another Bot API server, e.g. python -m bot.fake_api
+if os.environ.get('TELEGRAM_API_URL'):
+    apihelper.API_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/bot{0}/{1}'
+    apihelper.FILE_URL = os.environ['TELEGRAM_API_URL'].rstrip('/') + '/file/bot{0}/{1}'
+
+def _create_bot(token):
+    # In webhook mode our own dispatcher runs handlers in order per chat,
+    # so telebot must not hand them to its internal thread pool
+    return telebot.TeleBot(token, threaded=BOT_MODE != 'webhook')
 
 # Initialize bot from database settings
-settings = db.load(SETTINGS_FILE)
-token = settings.get('bot_token')
+token = settings_service.get('bot_token')
+bot = _create_bot(token) if token else None
+_bot_lock = threading.Lock()
 
-if token:
-    bot = telebot.TeleBot(token)
-else:
-    bot = None
+def _on_settings_change(settings, changed):
+    """Swap the TeleBot instance as soon as the token changes"""
+    global bot
+    if 'bot_token' not in changed:
+        return
+    with _bot_lock:
+        old, token = bot, settings['bot_token']
+        if token:
+            print(f"🔄 Bot re-initializing with new token: {token[:10]}...")
+            bot = _create_bot(token)
+        else:
+            bot = None
+    if old:
+        # Let the runner's polling loop move on to the new instance
+        old.stop_polling()
+
+settings_service.subscribe(_on_settings_change)
 
 def get_bot():
-    """Helper to get bot instance, checking for updates if needed"""
-    global bot
-    current_settings = db.load(SETTINGS_FILE)
-    current_token = current_settings.get('bot_token')
-    
-    if not current_token:
-        return None
-        
-    if not bot or bot.token != current_token:
-        print(f"🔄 Bot re-initializing with new token: {current_token[:10]}...")
-        bot = telebot.TeleBot(current_token)
-    
+    """Current bot instance, None when no token is configured"""
+    settings_service.all()  # notices token changes made by other processes
     return bot
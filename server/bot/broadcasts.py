@@ -0,0 +1,285 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from datetime import datetime
+from core.database import db, USERS_FILE, RENTALS_FILE, BROADCASTS_FILE
+from core.indexes import rental_index
+from core.archive import archive
+from bot.bot_core import get_bot
+from bot.notifier import telegram_bucket
+
+# Mass messages to a segment of users.json.
+#
+# The API only stores a 'queued' broadcast. The engine (bot process, started
+# by bot/runner.py) streams the users table once into a recipients file
+# (data/broadcasts/<id>.txt, one chat id per line) and sends through a worker
+# pool throttled by the shared Telegram token bucket. The line number of the
+# first unsent recipient is checkpointed in BROADCASTS_FILE, so a restart
+# resumes from there (a few messages around the checkpoint may go out twice).
+
+KYC_STATUSES = ('none', 'pending', 'verified', 'rejected')
+CHECKPOINT_EVERY = 50
+MAX_ATTEMPTS = 3
+WATCH_INTERVAL = 2
+
+def parse_segment(segment):
+    """Validated segment: kyc_status, has_rented, active_after, active_before"""
+    segment = segment or {}
+    if not isinstance(segment, dict):
+        raise ValueError('segment must be an object')
+    result = {}
+    kyc = segment.get('kyc_status')
+    if kyc:
+        kyc = [kyc] if isinstance(kyc, str) else kyc
+        if not isinstance(kyc, list) or any(k not in KYC_STATUSES for k in kyc):
+            raise ValueError(f"kyc_status must be one of {', '.join(KYC_STATUSES)}")
+        result['kyc_status'] = kyc
+    if segment.get('has_rented') is not None:
+        result['has_rented'] = bool(segment['has_rented'])
+    for field in ('active_after', 'active_before'):
+        if segment.get(field):
+            value = segment[field]
+            try:
+                datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"{field} must be an ISO date")
+            result[field] = value
+    return result
+
+def matches(user_id, user, segment, archived_rentals=None):
+    """archived_rentals: user id -> rentals moved to the archive (see core.archive)"""
+    if not isinstance(user, dict) or user.get('is_banned'):
+        return False
+    if 'kyc_status' in segment and user.get('kyc_status', 'none') not in segment['kyc_status']:
+        return False
+    if 'has_rented' in segment:
+        if archived_rentals is None:
+            archived_rentals = archive.totals(RENTALS_FILE).get('by_user', {})
+        rented = bool(rental_index.for_user(user_id)) or archived_rentals.get(str(user_id), 0) > 0
+        if rented != segment['has_rented']:
+            return False
+    # Users from before last_active_at was tracked count as active when they joined
+    active = user.get('last_active_at') or user.get('joined_at') or ''
+    if 'active_after' in segment and active < segment['active_after']:
+        return False
+    if 'active_before' in segment and active >= segment['active_before']:
+        return False
+    return True
+
+def iter_recipients(segment):
+    archived_rentals = archive.totals(RENTALS_FILE).get('by_user', {})
+    for user_id, user in db.iter_rows(USERS_FILE):
+        if matches(user_id, user, segment, archived_rentals):
+            yield user_id
+
+def report(row):
+    """Broadcast row plus progress and throughput"""
+    result = dict(row)
+    done = row.get('sent', 0) + row.get('failed', 0)
+    total = row.get('total')
+    result['progress'] = round(100 * row.get('checkpoint', 0) / total, 1) if total else (100.0 if total == 0 else 0)
+    elapsed = None
+    if row.get('started_at'):
+        end = datetime.fromisoformat(row['finished_at']) if row.get('finished_at') else datetime.now()
+        elapsed = (end - datetime.fromisoformat(row['started_at'])).total_seconds()
+    result['elapsed_seconds'] = round(elapsed, 1) if elapsed is not None else None
+    result['per_second'] = round(done / elapsed, 2) if elapsed else None
+    remaining = (total or 0) - row.get('checkpoint', 0)
+    result['eta_seconds'] = round(remaining / result['per_second']) if result['per_second'] and row.get('status') == 'running' else None
+    return result
+
+
+class BroadcastEngine:
+    def __init__(self, database, workers=4):
+        self.db = database
+        self.workers = workers
+        self.dir = os.path.join(database.data_dir, 'broadcasts')
+        self._lock = threading.Lock()
+        self._running = set()
+        self._started = False
+
+    def create(self, text, segment, parse_mode=None, created_by=None):
+        broadcast_id = str(uuid.uuid4())
+        row = {
+            'id': broadcast_id,
+            'text': text,
+            'parse_mode': parse_mode,
+            'segment': segment,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat(),
+            'created_by': created_by,
+            'started_at': None,
+            'finished_at': None,
+            'total': None,
+            'checkpoint': 0,
+            'sent': 0,
+            'failed': 0,
+            'errors': {}
+        }
+        self.db.put(BROADCASTS_FILE, broadcast_id, row)
+        return row
+
+    def cancel(self, broadcast_id):
+        def cancel(tx):
+            row = tx.get(BROADCASTS_FILE, broadcast_id)
+            if not row or row['status'] not in ('queued', 'running'):
+                return None
+            row = {**row, 'status': 'cancelled', 'finished_at': datetime.now().isoformat()}
+            tx.put(BROADCASTS_FILE, broadcast_id, row)
+            return row
+        return self.db.run_transaction(cancel, BROADCASTS_FILE)
+
+    def _update(self, broadcast_id, only_if=None, **fields):
+        """Apply fields to the current row (the API and the bot process both
+        write it); with only_if, only while its status is one of those.
+        Returns the row as stored, or None if there is none."""
+        def update(tx):
+            row = tx.get(BROADCASTS_FILE, broadcast_id)
+            if row is None or (only_if and row['status'] not in only_if):
+                return row
+            # A cancel from the API always wins over the engine's progress
+            if row['status'] == 'cancelled':
+                fields.pop('status', None)
+            row = {**row, **fields}
+            tx.put(BROADCASTS_FILE, broadcast_id, row)
+            return row
+        return self.db.run_transaction(update, BROADCASTS_FILE)
+
+    # --- engine (bot process) ---
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        os.makedirs(self.dir, exist_ok=True)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def _watch(self):
+        while True:
+            try:
+                for broadcast_id, row in list(self.db.load(BROADCASTS_FILE, copy_data=False).items()):
+                    if row.get('status') in ('queued', 'running'):
+                        with self._lock:
+                            if broadcast_id in self._running:
+                                continue
+                            self._running.add(broadcast_id)
+                        threading.Thread(target=self._run, args=(broadcast_id,), daemon=True).start()
+            except Exception as e:
+                print(f"❌ Broadcast watcher error: {e}")
+            time.sleep(WATCH_INTERVAL)
+
+    def _recipients_path(self, broadcast_id):
+        return os.path.join(self.dir, f"{broadcast_id}.txt")
+
+    def _prepare(self, row):
+        path = self._recipients_path(row['id'])
+        if row['status'] == 'running' and os.path.exists(path):
+            return row  # resuming after a restart
+        tmp_path = path + '.tmp'
+        total = 0
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for user_id in iter_recipients(row['segment']):
+                f.write(f"{user_id}\n")
+                total += 1
+        os.replace(tmp_path, path)
+        return self._update(row['id'], only_if=('queued', 'running'), status='running', total=total,
+                            checkpoint=0, started_at=datetime.now().isoformat())
+
+    def _run(self, broadcast_id):
+        try:
+            row = self.db.get(BROADCASTS_FILE, broadcast_id)
+            if not row or row['status'] not in ('queued', 'running'):
+                return
+            row = self._prepare(row)
+            if not row or row['status'] != 'running':
+                return
+            print(f"📣 Broadcast {broadcast_id[:8]}: {row['total']} recipients, resuming at {row['checkpoint']}")
+            self._send_all(row)
+        except Exception as e:
+            print(f"❌ Broadcast {broadcast_id[:8]} failed: {e}")
+        finally:
+            with self._lock:
+                self._running.discard(broadcast_id)
+
+    def _send_all(self, row):
+        broadcast_id = row['id']
+        start = row['checkpoint']
+        state = {'checkpoint': start, 'sent': row['sent'], 'failed': row['failed'], 'errors': dict(row['errors'])}
+        done = set()
+        lock = threading.Lock()
+        jobs = queue.Queue(maxsize=self.workers * 2)
+
+        def worker():
+            while True:
+                item = jobs.get()
+                if item is None:
+                    return
+                index, chat_id = item
+                error = self._send(chat_id, row['text'], row.get('parse_mode'))
+                with lock:
+                    if error is None:
+                        state['sent'] += 1
+                    else:
+                        state['failed'] += 1
+                        state['errors'][error] = state['errors'].get(error, 0) + 1
+                    # The checkpoint only moves past recipients that are all done
+                    done.add(index)
+                    while state['checkpoint'] in done:
+                        done.remove(state['checkpoint'])
+                        state['checkpoint'] += 1
+
+        def checkpoint():
+            with lock:
+                fields = dict(state, errors=dict(state['errors']))
+            current = self._update(broadcast_id, **fields)
+            return current is not None and current['status'] == 'running'
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+
+        stopped = False
+        with open(self._recipients_path(broadcast_id), encoding='utf-8') as f:
+            for index, line in enumerate(f):
+                if index < start:
+                    continue
+                if index > start and index % CHECKPOINT_EVERY == 0 and not checkpoint():
+                    stopped = True  # cancelled
+                    break
+                while not get_bot():
+                    time.sleep(10)
+                jobs.put((index, line.strip()))
+
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+
+        if checkpoint() and not stopped:
+            self._update(broadcast_id, only_if=('running',), status='completed', finished_at=datetime.now().isoformat())
+            print(f"📣 Broadcast {broadcast_id[:8]} done: {state['sent']} sent, {state['failed']} failed")
+
+    def _send(self, chat_id, text, parse_mode):
+        """None on success, otherwise an error code for the report"""
+        error = 'error'
+        for attempt in range(MAX_ATTEMPTS):
+            telegram_bucket.take()
+            try:
+                bot = get_bot()
+                if not bot:
+                    raise RuntimeError('Bot is not configured')
+                bot.send_message(chat_id, text, parse_mode=parse_mode)
+                return None
+            except Exception as e:
+                code = getattr(e, 'error_code', None)
+                error = str(code or 'error')
+                if code in (400, 403):
+                    return error  # blocked the bot / chat not found
+                retry_after = ((getattr(e, 'result_json', None) or {}).get('parameters') or {}).get('retry_after')
+                time.sleep(retry_after or 2 ** attempt)
+        return error
+
+broadcasts = BroadcastEngine(db, workers=int(os.environ.get('BROADCAST_WORKERS', 4)))
@@ -0,0 +1,235 @@
+import os
+import time
+import heapq
+import threading
+from datetime import datetime
+from core.database import db, RENTALS_FILE, CONSOLES_FILE
+from core.billing import complete_rental
+from core.events import event_hub
+from core.settings import settings_service
+from bot.notifier import notifier
+
+# Deadlines of active rentals (expected_end_time).
+#
+# A min-heap holds the reminder and expiry time of every active rental. It is
+# fed by a db listener on RENTALS_FILE and rebuilt from the table on start,
+# so nothing is lost across restarts. The scheduler thread sleeps until the
+# earliest entry is due; entries of rentals that ended or got a new end time
+# meanwhile are skipped when they come up. It runs in the bot process next to
+# the notifier (started by bot/runner.py).
+#
+# Rentals started or ended by the web workers show up as rental.* events (the
+# shared event log); only then, and right before an entry is acted on, the
+# table's signature is checked, which runs the listener if it changed.
+#
+# REMINDER_MINUTES before the end the client gets a reminder. OVERDUE_GRACE_MINUTES
+# after it the rental is either completed and charged up to expected_end_time
+# (RENTAL_OVERDUE_ACTION=complete) or marked overdue for the staff (flag, the
+# default: the console may still be with the client).
+
+REMINDER_MINUTES = float(os.environ.get('REMINDER_MINUTES', 15))
+OVERDUE_GRACE_MINUTES = float(os.environ.get('OVERDUE_GRACE_MINUTES', 15))
+OVERDUE_ACTION = os.environ.get('RENTAL_OVERDUE_ACTION', 'flag')
+
+def _is_chat(user_id):
+    # Manual rentals have user_id 'admin_manual', nobody to message
+    return str(user_id).lstrip('-').isdigit()
+
+
+class RentalDeadlines:
+    def __init__(self, database, reminder_minutes=REMINDER_MINUTES, grace_minutes=OVERDUE_GRACE_MINUTES,
+                 overdue_action=OVERDUE_ACTION):
+        if overdue_action not in ('flag', 'complete'):
+            raise ValueError("overdue_action must be flag or complete")
+        self.db = database
+        self.reminder = reminder_minutes * 60
+        self.grace = grace_minutes * 60
+        self.overdue_action = overdue_action
+        self._cond = threading.Condition()
+        self._heap = []             # (due, seq, rental id, 'remind' | 'expire', expected_end_time)
+        self._seq = 0
+        self._deadlines = {}        # active rental id -> expected_end_time its entries were made for
+        self._stale = False         # a rental event came in: check the table for changes
+        self._thread = None
+        self.reminded = 0
+        self.expired = 0
+
+    # --- heap ---
+
+    def _on_change(self, data, rows):
+        with self._cond:
+            if rows is None:
+                for rental_id in [k for k in self._deadlines if k not in data]:
+                    del self._deadlines[rental_id]
+                rows = data
+            for rental_id, row in rows.items():
+                self._schedule(rental_id, row)
+            self._cond.notify()
+
+    def _schedule(self, rental_id, row):
+        if not isinstance(row, dict) or row.get('status') != 'active' or not row.get('expected_end_time'):
+            self._deadlines.pop(rental_id, None)
+            return
+        deadline = row['expected_end_time']
+        if self._deadlines.get(rental_id) == deadline:
+            return
+        try:
+            end = datetime.fromisoformat(deadline).timestamp()
+        except ValueError:
+            return
+        self._deadlines[rental_id] = deadline
+        if row.get('reminded_for') != deadline and _is_chat(row.get('user_id')):
+            self._push(end - self.reminder, rental_id, 'remind', deadline)
+        if not row.get('overdue'):
+            self._push(end + self.grace, rental_id, 'expire', deadline)
+
+    def _push(self, due, rental_id, kind, deadline):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, rental_id, kind, deadline))
+
+    def _on_event(self, event):
+        if event['type'].startswith('rental.'):
+            with self._cond:
+                self._stale = True
+                self._cond.notify()
+
+    def _next(self):
+        # No db calls while holding _cond: the listener takes it under the table lock
+        check = False
+        while True:
+            if check:
+                # A stat; re-reads (and runs _on_change) only if the table changed
+                self.db.refresh(RENTALS_FILE)
+            with self._cond:
+                if self._stale:
+                    self._stale = False
+                    check = True
+                    continue
+                if not self._heap:
+                    self._cond.wait()
+                    check = False
+                    continue
+                due, _, rental_id, kind, deadline = self._heap[0]
+                now = time.time()
+                if due > now:
+                    self._cond.wait(due - now)
+                    check = False
+                    continue
+                if not check:
+                    check = True    # see the table as it is right now first
+                    continue
+                check = False
+                heapq.heappop(self._heap)
+                if self._deadlines.get(rental_id) != deadline:
+                    continue    # ended or moved since it was scheduled
+                return rental_id, kind, deadline
+
+    # --- actions ---
+
+    def _current(self, tx, rental_id, deadline):
+        row = tx.get(RENTALS_FILE, rental_id)
+        if not row or row.get('status') != 'active' or row.get('expected_end_time') != deadline:
+            return None
+        return row
+
+    def _console_name(self, console_id):
+        return (self.db.get(CONSOLES_FILE, console_id) or {}).get('name', 'Консоль')
+
+    def _remind(self, rental_id, deadline):
+        end = datetime.fromisoformat(deadline)
+        if end <= datetime.now():
+            return  # too late for a reminder, expiry comes next
+
+        def mark(tx):
+            row = self._current(tx, rental_id, deadline)
+            if row is None or row.get('reminded_for') == deadline:
+                return None
+            tx.put(RENTALS_FILE, rental_id, {**row, 'reminded_for': deadline})
+            return row
+
+        row = self.db.run_transaction(mark, RENTALS_FILE)
+        if row is None:
+            return
+        self.reminded += 1
+        notifier.send(row.get('user_id'),
+                      f"⏰ Аренда {self._console_name(row.get('console_id'))} заканчивается в {end.strftime('%H:%M')}.\n"
+                      f"Чтобы продлить, свяжитесь с администратором.")
+
+    def _expire(self, rental_id, deadline):
+        now = datetime.now()
+        if self.overdue_action == 'complete':
+            def finish(tx):
+                row = self._current(tx, rental_id, deadline)
+                if row is None:
+                    return None
+                # Charged up to the booked end, not for the grace period
+                return row, complete_rental(tx, rental_id, end=datetime.fromisoformat(deadline), auto_completed=True)
+        else:
+            def finish(tx):
+                row = self._current(tx, rental_id, deadline)
+                if row is None or row.get('overdue'):
+                    return None
+                tx.put(RENTALS_FILE, rental_id, {**row, 'overdue': True, 'overdue_at': now.isoformat()})
+                return row, None
+
+        done = self.db.run_transaction(finish, CONSOLES_FILE, RENTALS_FILE)
+        if done is None:
+            return
+        row, charged = done
+        self.expired += 1
+        console_id, user_id = row.get('console_id'), row.get('user_id')
+        name = self._console_name(console_id)
+        admin_chat = settings_service.get('admin_chat_id')
+
+        if charged:
+            total_cost = charged[0]
+            event_hub.publish('rental.terminated', {'id': rental_id, 'console_id': console_id, 'total_cost': total_cost, 'auto': True})
+            if _is_chat(user_id):
+                notifier.send(user_id, f"⌛ Время аренды {name} истекло, аренда завершена.\nК оплате: {total_cost} MDL")
+            if admin_chat:
+                notifier.send(admin_chat, f"⌛ Аренда {name} завершена автоматически по истечении времени ({total_cost} MDL)")
+        else:
+            event_hub.publish('rental.overdue', {'id': rental_id, 'console_id': console_id, 'user_id': user_id})
+            if _is_chat(user_id):
+                notifier.send(user_id, f"⌛ Время аренды {name} истекло. Пожалуйста, верните консоль или продлите аренду у администратора.")
+            if admin_chat:
+                notifier.send(admin_chat, f"⚠️ Аренда {name} просрочена (до {deadline[:16].replace('T', ' ')})")
+
+    # --- thread ---
+
+    def start(self):
+        with self._cond:
+            if self._thread:
+                return
+            self.db.add_listener(RENTALS_FILE, self._on_change)
+            event_hub.add_listener(self._on_event)
+            self._thread = threading.Thread(target=self._work, name='rental-deadlines', daemon=True)
+            self._thread.start()
+        # Rebuild the heap from the rentals that are active right now
+        self._on_change(self.db.load(RENTALS_FILE, copy_data=False), None)
+        print(f"⏰ Rental deadline scheduler started ({len(self._deadlines)} active rentals, overdue: {self.overdue_action})")
+
+    def _work(self):
+        while True:
+            rental_id, kind, deadline = self._next()
+            try:
+                if kind == 'remind':
+                    self._remind(rental_id, deadline)
+                else:
+                    self._expire(rental_id, deadline)
+            except Exception as e:
+                print(f"❌ Rental deadline error for {rental_id}: {e}")
+
+    def stats(self):
+        with self._cond:
+            upcoming = min((due for due, _, rid, _, deadline in self._heap
+                            if self._deadlines.get(rid) == deadline), default=None)
+            return {
+                'running': bool(self._thread),
+                'active_rentals': len(self._deadlines),
+                'next_due_in': round(upcoming - time.time(), 1) if upcoming else None,
+                'reminded': self.reminded,
+                'expired': self.expired
+            }
+
+rental_deadlines = RentalDeadlines(db)
@@ -0,0 +1,102 @@
+import json
+import time
+import queue
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+# Minimal stand-in for the Telegram Bot API, for trying the bot locally.
+#
+#   python -m bot.fake_api [port]
+#   TELEGRAM_API_URL=http://localhost:8081 python -m bot.runner
+#
+# Every API call is recorded and listed at GET /_calls. Updates POSTed to
+# /_updates are handed out through getUpdates (polling mode); in webhook mode
+# POST them to /telegram/webhook yourself with the secret token header.
+
+_calls = []
+_updates = queue.Queue()
+_lock = threading.Lock()
+_message_id = [0]
+
+def _message(params):
+    with _lock:
+        _message_id[0] += 1
+        message_id = _message_id[0]
+    chat_id = params.get('chat_id')
+    return {
+        'message_id': message_id,
+        'date': int(time.time()),
+        'chat': {'id': int(chat_id) if str(chat_id).lstrip('-').isdigit() else chat_id, 'type': 'private'},
+        'from': {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'},
+        'text': params.get('text') or params.get('caption')
+    }
+
+def _result(method, params):
+    if method == 'getMe':
+        return {'id': 1, 'is_bot': True, 'first_name': 'FakeBot', 'username': 'fake_bot'}
+    if method == 'getUpdates':
+        try:
+            update = _updates.get(timeout=min(float(params.get('timeout') or 0), 5))
+        except queue.Empty:
+            return []
+        return [update]
+    if method == 'getFile':
+        return {'file_id': params.get('file_id'), 'file_unique_id': params.get('file_id'),
+                'file_size': 3, 'file_path': f"photos/{params.get('file_id')}.jpg"}
+    if method.startswith('send') or method.startswith('edit'):
+        return _message(params)
+    return True
+
+
+class FakeTelegramHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, body, content_type='application/json'):
+        raw = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _params(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        content_type = self.headers.get('Content-Type', '')
+        if 'application/json' in content_type:
+            return json.loads(raw or b'{}')
+        if 'multipart/form-data' in content_type:
+            return {}  # uploads: only the fact of the call matters here
+        params = parse_qs(raw.decode('utf-8')) if raw else parse_qs(self.path.partition('?')[2])
+        return {k: v[0] for k, v in params.items()}
+
+    def do_GET(self):
+        if self.path == '/_calls':
+            with _lock:
+                return self._reply(200, list(_calls))
+        if self.path.startswith('/file/'):
+            return self._reply(200, b'\xff\xd8\xff', 'image/jpeg')
+        return self.do_POST()
+
+    def do_POST(self):
+        path = self.path.partition('?')[0]
+        if path == '/_updates':
+            _updates.put(self._params())
+            return self._reply(200, {'ok': True})
+        parts = path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return self._reply(404, {'ok': False, 'error_code': 404, 'description': 'Not Found'})
+        method = parts[1]
+        params = self._params()
+        with _lock:
+            _calls.append({'method': method, 'params': params, 'time': time.time()})
+        self._reply(200, {'ok': True, 'result': _result(method, params)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+if __name__ == '__main__':
+    import sys
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8081
+    print(f"🧪 Fake Telegram API on http://localhost:{port} (calls at /_calls)")
+    ThreadingHTTPServer(('0.0.0.0', port), FakeTelegramHandler).serve_forever()
@@ -1,8 +1,14 @@
 import os
 import uuid
 from bot.bot_core import get_bot
-from bot.keyboards import get_main_keyboard, create_console_keyboard, create_hours_keyboard
-from core.database import db, CONSOLES_FILE, SETTINGS_FILE, USERS_FILE, DISCOUNTS_FILE, RENTALS_FILE, RENTAL_REQUESTS_FILE, KYC_REQUESTS_FILE
+from bot.keyboards import get_main_keyboard, console_keyboards
+from core.database import db, CONSOLES_FILE, USERS_FILE, DISCOUNTS_FILE, RENTAL_REQUESTS_FILE, KYC_REQUESTS_FILE
+from core.indexes import rental_index
+from core.events import event_hub
+from core.settings import settings_service
+from bot.notifier import notifier
+from bot.sessions import sessions
+from bot.media import kyc_media, download, MediaError, MAX_BYTES, KYC_DIR
 from datetime import datetime
 from telebot import types
 
@@ -10,27 +16,30 @@ def register_handlers(bot):
     @bot.message_handler(commands=['start'])
     def start_command(message):
         user_id = str(message.from_user.id)
-        users = db.load(USERS_FILE)
-        settings = db.load(SETTINGS_FILE)
+        session = sessions.get(user_id)
+        settings = settings_service.all()
         
         print(f"👤 User {user_id} (@{message.from_user.username}) started the bot")
         
         # Simple admin check
-        is_admin = str(user_id) == str(settings.get('admin_chat_id'))
+        is_admin = session['role'] == 'admin'
         help_btn_text = settings.get('help_button_text', 'ℹ️ Помощь')
         
-        if user_id not in users:
-            users[user_id] = {
+        if not session['exists']:
+            db.put(USERS_FILE, user_id, {
                 'id': user_id,
                 'username': message.from_user.username,
                 'first_name': message.from_user.first_name,
                 'joined_at': datetime.now().isoformat(),
                 'is_banned': False,
-                'kyc_status': 'none'
-            }
-            db.save(USERS_FILE, users)
+                'kyc_status': 'none',
+                'last_active_at': datetime.now().isoformat()
+            })
+        else:
+            sessions.touch(user_id)
+        sessions.set_menu(user_id, 'main')
         
-        user_status = users.get(user_id, {}).get('kyc_status', 'none')
+        user_status = session['kyc_status']
         welcome_text = f"👋 Привет, {message.from_user.first_name}!\n\nДобро пожаловать в PlayStation Rental. Используйте меню ниже для навигации."
         if is_admin:
             welcome_text += "\n\n🛠 Вы вошли как администратор."
@@ -41,10 +50,10 @@ def register_handlers(bot):
     def my_cabinet(message):
         user_id = str(message.from_user.id)
         print(f"📊 User {user_id} requested cabinet")
-        users = db.load(USERS_FILE)
-        user = users.get(user_id, {})
+        user = db.get(USERS_FILE, user_id, {})
+        sessions.set_menu(user_id, 'cabinet')
         
-        kyc_status = user.get('kyc_status', 'none')
+        kyc_status = sessions.get(user_id)['kyc_status']
         kyc_label = "✅ Верифицирован" if kyc_status == 'verified' else "⏳ Ожидает" if kyc_status == 'pending' else "❌ Не верифицирован"
         
         stats_text = f"👤 **Ваш кабинет**\n\n"
@@ -57,10 +66,10 @@ def register_handlers(bot):
     @bot.message_handler(func=lambda m: True)
     def handle_all_messages(message):
         user_id = str(message.from_user.id)
-        settings = db.load(SETTINGS_FILE)
-        users = db.load(USERS_FILE)
-        user = users.get(user_id, {})
-        user_status = user.get('kyc_status', 'none')
+        sessions.touch(user_id)
+        session = sessions.get(user_id)
+        settings = settings_service.all()
+        user_status = session['kyc_status']
 
         help_btn_text = settings.get('help_button_text', 'ℹ️ Помощь')
         help_text = settings.get('help_text', 'Текст помощи еще не настроен администратором.')
@@ -100,6 +109,7 @@ def register_handlers(bot):
                 return
 
             print(f"📝 User {user_id} started rental flow")
+            sessions.set_menu(user_id, 'rent')
             
             # Check for Blackout
             today = datetime.now().strftime('%Y-%m-%d')
@@ -113,18 +123,12 @@ def register_handlers(bot):
                 return
 
             # Continue with rental...
-            consoles = db.load(CONSOLES_FILE)
-            
-            if not consoles:
+            if not db.load(CONSOLES_FILE, copy_data=False):
                 bot.reply_to(message, "❌ Список консолей пуст.")
                 return
                 
-            from bot.keyboards import create_console_keyboard
-            bot.reply_to(message, "🎮 Выберите консоль для аренды:", reply_markup=create_console_keyboard(consoles))
+            bot.reply_to(message, "🎮 Выберите консоль для аренды:", reply_markup=console_keyboards.console_keyboard())
         elif message.text == '🛡️ Верификация':
-            users = db.load(USERS_FILE)
-            user_status = users.get(user_id, {}).get('kyc_status', 'none')
-            
             if user_status == 'verified':
                 bot.reply_to(message, "✅ Вы уже верифицированы!")
                 return
@@ -132,17 +136,17 @@ def register_handlers(bot):
                 bot.reply_to(message, "⏳ Ваша заявка уже на проверке. Ожидайте.")
                 return
                 
+            sessions.set_menu(user_id, 'kyc')
             msg = bot.reply_to(message, "🛡️ *Верификация профиля*\n\nПожалуйста, отправьте ОДНО фото вашего документа (паспорт или права) для подтверждения личности.\n\n*Важно:* Фото должно быть четким, все данные должны быть читаемы.", parse_mode='Markdown')
             bot.register_next_step_handler(msg, process_kyc_photo)
 
         elif message.text == '⚙️ Админ панель':
-            if str(user_id) == str(settings.get('admin_chat_id')):
+            if session['role'] == 'admin':
                 bot.reply_to(message, "🛠 *Админ панель управления*\n\nВы можете управлять системой через веб-интерфейс:\n🔗 [Открыть панель](http://localhost:3000)", parse_mode='Markdown')
         elif message.text == '📈 Статистика':
-            if str(user_id) == str(settings.get('admin_chat_id')):
-                rentals = db.load(RENTALS_FILE)
+            if session['role'] == 'admin':
                 consoles = db.load(CONSOLES_FILE)
-                active = len([r for r in rentals.values() if r.get('status') == 'active'])
+                active = rental_index.count_status('active')
                 stats = f"📈 *Статистика системы*\n\n✅ Активных аренд: {active}\n🎮 Всего консолей: {len(consoles)}\n👥 Всего пользователей: {len(db.load(USERS_FILE))}"
                 bot.reply_to(message, stats, parse_mode='Markdown')
 
@@ -152,52 +156,47 @@ def register_handlers(bot):
             return
 
         user_id = str(message.from_user.id)
+        photo = message.photo[-1]
         print(f"📸 Received KYC photo from {user_id}")
-        
+        if photo.file_size and photo.file_size > MAX_BYTES:
+            bot.reply_to(message, f"❌ Фото слишком большое (максимум {MAX_BYTES // (1024 * 1024)} МБ).")
+            return
+
+        # Download and register off the update thread
+        kyc_media.submit(save_kyc_photo, message, photo.file_id)
+
+    def save_kyc_photo(message, file_id):
+        user_id = str(message.from_user.id)
         try:
-            # Create KYC folder if not exists
-            kyc_dir = os.path.join('static', 'img', 'kyc')
-            if not os.path.exists(kyc_dir): os.makedirs(kyc_dir)
-            
-            # Download photo
-            file_info = bot.get_file(message.photo[-1].file_id)
-            downloaded_file = bot.download_file(file_info.file_path)
-            
-            filename = f"{user_id}_{uuid.uuid4().hex[:8]}.jpg"
-            save_path = os.path.join(kyc_dir, filename)
-            
-            with open(save_path, 'wb') as f:
-                f.write(downloaded_file)
-                
-            photo_url = f"/static/img/kyc/{filename}"
+            path = download(bot, file_id, KYC_DIR, f"{user_id}_{uuid.uuid4().hex[:8]}")
+            photo_url = f"/static/img/kyc/{os.path.basename(path)}"
             
             # Create request in DB
-            from core.database import KYC_REQUESTS_FILE
-            requests = db.load(KYC_REQUESTS_FILE)
+            with db.batch():
+                req_id = str(uuid.uuid4())
+                db.put(KYC_REQUESTS_FILE, req_id, {
+                    'user_id': user_id,
+                    'photo_url': photo_url,
+                    'status': 'pending',
+                    'timestamp': datetime.now().isoformat()
+                })
             
-            req_id = str(uuid.uuid4())
-            requests[req_id] = {
-                'user_id': user_id,
-                'photo_url': photo_url,
-                'status': 'pending',
-                'timestamp': datetime.now().isoformat()
-            }
-            db.save(KYC_REQUESTS_FILE, requests)
+                # Update user status
+                sessions.set_kyc_status(user_id, 'pending')
             
-            # Update user status
-            users = db.load(USERS_FILE)
-            if user_id in users:
-                users[user_id]['kyc_status'] = 'pending'
-                db.save(USERS_FILE, users)
+            event_hub.publish('kyc.submitted', {'id': req_id, 'user_id': user_id})
+            kyc_media.queue_thumbnails(req_id)
                 
             bot.reply_to(message, "✅ Фото получено! Администрация проверит ваши данные в течение 24 часов.")
             
             # Notify Admin
-            settings = db.load(SETTINGS_FILE)
+            settings = settings_service.all()
             admin_id = settings.get('admin_chat_id')
             if admin_id:
-                bot.send_message(admin_id, f"🔔 *Новая заявка на верификацию!*\n\n👤 От: {message.from_user.first_name} (@{message.from_user.username})", parse_mode='Markdown')
+                notifier.send(admin_id, f"🔔 *Новая заявка на верификацию!*\n\n👤 От: {message.from_user.first_name} (@{message.from_user.username})", parse_mode='Markdown')
                 
+        except MediaError as e:
+            bot.reply_to(message, f"❌ {e}")
         except Exception as e:
             print(f"Error processing KYC photo: {e}")
             bot.reply_to(message, "❌ Произошла ошибка при сохранении фото. Попробуйте позже.")
@@ -213,12 +212,7 @@ def register_handlers(bot):
             return
 
         if console.get('status') == 'rented':
-            rentals = db.load(RENTALS_FILE)
-            active_rental = None
-            for rid, r in rentals.items():
-                if r.get('console_id') == console_id and r.get('status') == 'active':
-                    active_rental = r
-                    break
+            active_rental = rental_index.active_for_console(console_id)
             
             msg = f"🔴 *{console['name']}* сейчас занята.\n\n"
             if active_rental and active_rental.get('expected_end_time'):
@@ -245,7 +239,6 @@ def register_handlers(bot):
             final_price = round(base_price * (1 - discount_val / 100))
             price_text = f"💰 Цена: ~~{base_price}~~ *{final_price} MDL/ч* (Скидка {discount_val}%! 🔥)"
 
-        from bot.keyboards import create_hours_keyboard
         text = f"🎮 *{console['name']}*\n{price_text}\n\nВыберите время аренды:"
         
         # Send/Edit with photo if exists
@@ -255,21 +248,31 @@ def register_handlers(bot):
             if os.path.exists(local_path):
                 with open(local_path, 'rb') as photo:
                     bot.send_photo(call.message.chat.id, photo, caption=text, 
-                                 reply_markup=create_hours_keyboard(console_id), parse_mode='Markdown')
+                                 reply_markup=console_keyboards.hours_keyboard(console_id), parse_mode='Markdown')
                 bot.delete_message(call.message.chat.id, call.message.message_id)
                 return
 
         bot.edit_message_text(text, call.message.chat.id, call.message.message_id, 
-                            reply_markup=create_hours_keyboard(console_id), parse_mode='Markdown')
+                            reply_markup=console_keyboards.hours_keyboard(console_id), parse_mode='Markdown')
+
+    @bot.callback_query_handler(func=lambda call: call.data.startswith('consoles_page_'))
+    def console_page(call):
+        page = int(call.data.replace('consoles_page_', ''))
+        bot.answer_callback_query(call.id)
+        try:
+            bot.edit_message_reply_markup(call.message.chat.id, call.message.message_id,
+                                          reply_markup=console_keyboards.console_keyboard(page))
+        except Exception as e:
+            # "message is not modified" when the current page is tapped again
+            print(f"Console page {page}: {e}")
 
     @bot.callback_query_handler(func=lambda call: call.data.startswith('rent_'))
     def finalize_request(call):
         _, console_id, hours = call.data.split('_')
         user_id = str(call.from_user.id)
         
-        requests = db.load(RENTAL_REQUESTS_FILE)
         consoles = db.load(CONSOLES_FILE)
-        settings = db.load(SETTINGS_FILE)
+        settings = settings_service.all()
         
         request_id = str(uuid.uuid4())
         new_request = {
@@ -281,8 +284,8 @@ def register_handlers(bot):
             'created_at': datetime.now().isoformat()
         }
         
-        requests[request_id] = new_request
-        db.save(RENTAL_REQUESTS_FILE, requests)
+        db.put(RENTAL_REQUESTS_FILE, request_id, new_request)
+        event_hub.publish('rental_request.created', {'id': request_id, 'console_id': console_id, 'user_id': user_id})
         
         console_name = consoles.get(console_id, {}).get('name', 'Консоль')
         bot.edit_message_text(f"✅ Заявка на *{console_name}* ({hours}ч) отправлена!\nОжидайте подтверждения администратором.", 
@@ -291,10 +294,8 @@ def register_handlers(bot):
         # Notify Admin
         admin_id = settings.get('admin_chat_id')
         if admin_id:
-            try:
-                admin_msg = f"🔔 *Новая заявка на аренду!*\n\n👤 От: {call.from_user.first_name}\n🎮 Консоль: {console_name}\n⏱ Время: {hours}ч"
-                bot.send_message(admin_id, admin_msg, parse_mode='Markdown')
-            except: pass
+            admin_msg = f"🔔 *Новая заявка на аренду!*\n\n👤 От: {call.from_user.first_name}\n🎮 Консоль: {console_name}\n⏱ Время: {hours}ч"
+            notifier.send(admin_id, admin_msg, parse_mode='Markdown')
 
     @bot.callback_query_handler(func=lambda call: call.data == 'cancel_rental' or call.data == 'back_to_main')
     def cancel_rental(call):
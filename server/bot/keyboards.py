@@ -1,4 +1,13 @@
+import threading
 from telebot import types
+from core.database import db, CONSOLES_FILE
+
+# Markup is built once and cached as ready-to-send JSON (reply_markup accepts
+# the string as is). Reply keyboards depend only on (role, kyc_status,
+# help_button_text); console and hours keyboards are rebuilt when
+# consoles.json changes.
+
+CONSOLES_PER_PAGE = 10
 
 def create_user_keyboard(help_button_text='ℹ️ Помощь', kyc_status='none'):
     keyboard = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
@@ -35,12 +44,22 @@ def create_admin_keyboard(help_button_text='ℹ️ Помощь'):
     )
     return keyboard
 
+_main_keyboards = {}
+
 def get_main_keyboard(is_admin=False, help_button_text='ℹ️ Помощь', kyc_status='none'):
-    return create_admin_keyboard(help_button_text) if is_admin else create_user_keyboard(help_button_text, kyc_status)
+    # kyc_status doesn't change the admin keyboard
+    key = ('admin', None, help_button_text) if is_admin else ('user', kyc_status, help_button_text)
+    markup = _main_keyboards.get(key)
+    if markup is None:
+        keyboard = create_admin_keyboard(help_button_text) if is_admin else create_user_keyboard(help_button_text, kyc_status)
+        markup = _main_keyboards[key] = keyboard.to_json()
+    return markup
 
-def create_console_keyboard(consoles, category=None):
+def create_console_keyboard(consoles, page=0):
     keyboard = types.InlineKeyboardMarkup(row_width=1)
-    for cid, console in consoles.items():
+    items = list(consoles.items())
+    pages = max(1, -(-len(items) // CONSOLES_PER_PAGE))
+    for cid, console in items[page * CONSOLES_PER_PAGE:(page + 1) * CONSOLES_PER_PAGE]:
         status = console.get('status', 'available')
         if status == 'available':
             btn_text = f"🎮 {console['name']} - {console['rental_price']} MDL/ч"
@@ -48,6 +67,15 @@ def create_console_keyboard(consoles, category=None):
             btn_text = f"🔴 {console['name']} - Занята"
         
         keyboard.add(types.InlineKeyboardButton(btn_text, callback_data=f"select_console_{cid}"))
+
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(types.InlineKeyboardButton("◀️", callback_data=f"consoles_page_{page - 1}"))
+        nav.append(types.InlineKeyboardButton(f"{page + 1}/{pages}", callback_data=f"consoles_page_{page}"))
+        if page < pages - 1:
+            nav.append(types.InlineKeyboardButton("▶️", callback_data=f"consoles_page_{page + 1}"))
+        keyboard.row(*nav)
     
     keyboard.add(types.InlineKeyboardButton("⬅️ Назад", callback_data="back_to_main"))
     return keyboard
@@ -62,3 +90,56 @@ def create_hours_keyboard(console_id):
     keyboard.add(*btns)
     keyboard.add(types.InlineKeyboardButton("⬅️ Отмена", callback_data="cancel_rental"))
     return keyboard
+
+
+class ConsoleKeyboards:
+    """Console picker pages and hours keyboards, dropped whenever consoles change"""
+
+    def __init__(self, database):
+        self.db = database
+        self._lock = threading.Lock()
+        self._pages = None
+        self._version = 0
+        self._hours = {}
+        database.add_listener(CONSOLES_FILE, self._on_change)
+
+    def _on_change(self, data, rows):
+        with self._lock:
+            self._pages = None
+            self._version += 1
+            if rows is None:
+                self._hours = {}
+            else:
+                for key in rows:
+                    self._hours.pop(key, None)
+
+    def _build(self):
+        consoles = self.db.load(CONSOLES_FILE, copy_data=False)
+        pages = max(1, -(-len(consoles) // CONSOLES_PER_PAGE))
+        return [create_console_keyboard(consoles, page).to_json() for page in range(pages)]
+
+    def console_pages(self):
+        self.db.load(CONSOLES_FILE, copy_data=False)  # re-reads (and drops us) if changed on disk
+        with self._lock:
+            pages, version = self._pages, self._version
+        if pages is None:
+            pages = self._build()
+            with self._lock:
+                # Don't cache pages built from a table that changed meanwhile
+                if version == self._version:
+                    self._pages = pages
+        return pages
+
+    def console_keyboard(self, page=0):
+        pages = self.console_pages()
+        return pages[min(max(page, 0), len(pages) - 1)]
+
+    def hours_keyboard(self, console_id):
+        markup = self._hours.get(console_id)
+        if markup is None:
+            markup = create_hours_keyboard(console_id).to_json()
+            with self._lock:
+                self._hours[console_id] = markup
+        return markup
+
+console_keyboards = ConsoleKeyboards(db)
@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from telebot import apihelper
+from core.database import db, KYC_REQUESTS_FILE
+from core.events import event_hub
+
+# KYC photo ingestion.
+#
+# Photos are streamed from Telegram to disk in chunks on a small worker pool
+# (never on the bot's update thread), with a size limit and a check of the
+# file signature. A background worker then renders thumbnails with Pillow,
+# if it is installed, and stores their URLs on the KYC request
+# (thumb_url for lists, preview_url for the detail view).
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+KYC_DIR = os.path.join(STATIC_DIR, 'img', 'kyc')
+THUMBS_DIR = os.path.join(KYC_DIR, 'thumbs')
+MAX_BYTES = int(os.environ.get('KYC_MAX_BYTES', 10 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+THUMB_SIZES = {'thumb_url': 160, 'preview_url': 800}
+
+class MediaError(Exception):
+    """Rejected upload; the message is shown to the user"""
+
+
+def sniff(head):
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+def download(bot, file_id, dest_dir, name):
+    """Stream a Telegram file to dest_dir/name.<ext>, returns the path"""
+    file_info = bot.get_file(file_id)
+    if file_info.file_size and file_info.file_size > MAX_BYTES:
+        raise MediaError(f"Файл слишком большой (максимум {MAX_BYTES // (1024 * 1024)} МБ).")
+
+    file_url = apihelper.FILE_URL or 'https://api.telegram.org/file/bot{0}/{1}'
+    url = file_url.format(bot.token, file_info.file_path)
+    os.makedirs(dest_dir, exist_ok=True)
+    tmp_path = os.path.join(dest_dir, f'.{name}.part')
+    ext = None
+    size = 0
+    try:
+        with requests.get(url, stream=True, timeout=(5, 60)) as response:
+            response.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if ext is None:
+                        ext = sniff(chunk)
+                        if ext is None:
+                            raise MediaError("Поддерживаются только фото в формате JPEG, PNG или WebP.")
+                    size += len(chunk)
+                    if size > MAX_BYTES:
+                        raise MediaError(f"Файл слишком большой (максимум {MAX_BYTES // (1024 * 1024)} МБ).")
+                    f.write(chunk)
+        if ext is None:
+            raise MediaError("Файл пустой.")
+        path = os.path.join(dest_dir, f'{name}.{ext}')
+        os.replace(tmp_path, path)
+        return path
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def url_to_path(url):
+    return os.path.join(STATIC_DIR, url[len('/static/'):]) if url and url.startswith('/static/') else None
+
+
+class KycMedia:
+    def __init__(self, workers=2):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='kyc-media')
+        self._thumbs = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+        self.thumbnails = 0
+
+    def submit(self, fn, *args):
+        """Run an ingestion job off the caller's thread"""
+        return self._pool.submit(self._guard, fn, *args)
+
+    def _guard(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"❌ KYC media job failed: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        if Image is None:
+            print("⚠️ Pillow is not installed, KYC thumbnails are disabled")
+            return
+        threading.Thread(target=self._thumb_worker, daemon=True).start()
+        # Requests from before thumbnails existed (or from the last run)
+        for req_id, req in db.load(KYC_REQUESTS_FILE, copy_data=False).items():
+            if not req.get('thumb_url') and req.get('photo_url'):
+                self.queue_thumbnails(req_id)
+
+    def queue_thumbnails(self, req_id):
+        if Image is not None:
+            self._thumbs.put(req_id)
+
+    def _thumb_worker(self):
+        while True:
+            req_id = self._thumbs.get()
+            try:
+                self.make_thumbnails(req_id)
+            except Exception as e:
+                print(f"❌ Thumbnail for KYC request {req_id} failed: {e}")
+
+    def make_thumbnails(self, req_id):
+        req = db.get(KYC_REQUESTS_FILE, req_id)
+        path = url_to_path((req or {}).get('photo_url'))
+        if not path or not os.path.exists(path):
+            return
+        fmt, ext = ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+        stem = os.path.splitext(os.path.basename(path))[0]
+        os.makedirs(THUMBS_DIR, exist_ok=True)
+
+        urls = {}
+        with Image.open(path) as img:
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            for field, size in THUMB_SIZES.items():
+                thumb = img.copy()
+                thumb.thumbnail((size, size))
+                name = f"{stem}_{size}.{ext}"
+                thumb.save(os.path.join(THUMBS_DIR, name), fmt, quality=80)
+                urls[field] = f"/static/img/kyc/thumbs/{name}"
+
+        # Only the thumbnail fields: the request may have been approved/rejected meanwhile
+        current = db.update(KYC_REQUESTS_FILE, req_id, urls)
+        if current is not None:
+            self.thumbnails += 1
+            event_hub.publish('kyc.updated', {'id': req_id, 'user_id': current.get('user_id')})
+
+kyc_media = KycMedia(workers=int(os.environ.get('KYC_MEDIA_WORKERS', 2)))
@@ -0,0 +1,261 @@
+import os
+import time
+import heapq
+import uuid
+import threading
+from collections import deque
+from core.database import db, OUTBOX_FILE
+from bot.bot_core import get_bot
+
+# Durable outbound message queue.
+#
+# notifier.send() only stores the message in OUTBOX_FILE and returns, so API
+# handlers never wait for Telegram. The sender pool runs in the bot process
+# (started by bot/runner.py) and picks up messages queued by any process.
+# Telegram limits are respected: at most one message per chat every
+# PER_CHAT_INTERVAL seconds, GLOBAL_RATE messages per second overall.
+# Failed sends are retried with exponential backoff (or after retry_after on
+# 429); sent messages are removed, permanently failed ones stay with
+# status 'failed'.
+
+PER_CHAT_INTERVAL = 1.0
+GLOBAL_RATE = 25
+MAX_ATTEMPTS = 8
+MAX_BACKOFF = 300
+IDLE_POLL = 1.0     # how often an idle sender looks for messages from other processes
+
+
+class TokenBucket:
+    """rate tokens per second, bursts up to rate"""
+    def __init__(self, rate):
+        self.rate = rate
+        self._tokens = rate
+        self._at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_take(self):
+        """0 if a token was taken, otherwise seconds until one is available"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._at) * self.rate)
+            self._at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def take(self):
+        while True:
+            wait = self.try_take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+# Shared by everything that sends from this process (notifications, broadcasts)
+telegram_bucket = TokenBucket(GLOBAL_RATE)
+
+
+class Notifier:
+    def __init__(self, database, workers=4):
+        self.db = database
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._heap = []             # (due, seq, job id)
+        self._seq = 0
+        self._jobs = {}             # queued job id -> job, kept in sync by _on_change
+        self._known = set()         # job ids in the heap or being sent
+        self._chat_busy = set()
+        self._chat_next = {}        # chat id -> earliest time of the next send
+        self._threads = []
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self._latencies = deque(maxlen=500)
+
+    # --- producers ---
+
+    def _job(self, chat_id, text, parse_mode=None, reply_markup=None):
+        if reply_markup is not None and not isinstance(reply_markup, str):
+            reply_markup = reply_markup.to_json()
+        return {
+            'id': uuid.uuid4().hex,
+            'chat_id': str(chat_id),
+            'text': text,
+            'parse_mode': parse_mode,
+            'reply_markup': reply_markup,
+            'status': 'queued',
+            'attempts': 0,
+            'created_at': time.time(),
+            'next_attempt_at': time.time()
+        }
+
+    def _queue(self, jobs):
+        # A transaction re-reads the outbox first: the web and bot processes
+        # both write it, and neither may drop the other's messages
+        def add(tx):
+            for job in jobs:
+                tx.put(OUTBOX_FILE, job['id'], job)
+        self.db.run_transaction(add, OUTBOX_FILE)
+        return [job['id'] for job in jobs]
+
+    def send(self, chat_id, text, parse_mode=None, reply_markup=None):
+        """Queue a message; returns its id"""
+        return self._queue([self._job(chat_id, text, parse_mode, reply_markup)])[0]
+
+    def send_many(self, messages):
+        """Queue (chat_id, text) pairs with a single outbox write; returns their ids"""
+        return self._queue([self._job(chat_id, text) for chat_id, text in messages])
+
+    # --- sender pool ---
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self.db.add_listener(OUTBOX_FILE, self._on_change)
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'notifier-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        # Messages left over from the last run
+        self._on_change(self.db.load(OUTBOX_FILE, copy_data=False), None)
+        print(f"📨 Notification sender started with {self.workers} workers")
+
+    def _on_change(self, data, rows):
+        with self._cond:
+            if rows is None:
+                for job_id in [k for k in self._jobs if k not in data]:
+                    del self._jobs[job_id]
+                rows = data
+            for job_id, job in rows.items():
+                if not job or job.get('status') != 'queued':
+                    self._jobs.pop(job_id, None)
+                    continue
+                self._jobs[job_id] = job
+                if job_id not in self._known:
+                    self._push(job_id, job.get('next_attempt_at', 0))
+
+    def _push(self, job_id, due):
+        self._seq += 1
+        heapq.heappush(self._heap, (due, self._seq, job_id))
+        self._known.add(job_id)
+        self._cond.notify()
+
+    def _next(self):
+        # No db calls while holding _cond: db listeners take it under the table lock
+        while True:
+            # Notice messages queued by other processes
+            self.db.load(OUTBOX_FILE, copy_data=False)
+            with self._cond:
+                if not self._heap:
+                    self._cond.wait(IDLE_POLL)
+                    continue
+                now = time.time()
+                due, _, job_id = self._heap[0]
+                if due > now:
+                    self._cond.wait(min(due - now, IDLE_POLL))
+                    continue
+
+                job = self._jobs.get(job_id)
+                if job is None:
+                    heapq.heappop(self._heap)
+                    self._known.discard(job_id)
+                    continue
+                chat_id = job['chat_id']
+                chat_due = self._chat_next.get(chat_id, 0)
+                if chat_id in self._chat_busy or chat_due > now:
+                    # Keep the chat's order: try again once it's allowed to receive
+                    self._seq += 1
+                    heapq.heapreplace(self._heap, (max(chat_due, now + 0.05), self._seq, job_id))
+                    continue
+                wait = telegram_bucket.try_take()
+                if wait:
+                    self._cond.wait(wait)
+                    continue
+
+                heapq.heappop(self._heap)
+                if len(self._chat_next) > 10000:
+                    self._chat_next = {c: t for c, t in self._chat_next.items() if t > now}
+                self._chat_busy.add(chat_id)
+                self._chat_next[chat_id] = now + PER_CHAT_INTERVAL
+                return dict(job)
+
+    def _work(self):
+        while True:
+            job = self._next()
+            try:
+                self._deliver(job)
+            except Exception as e:
+                print(f"❌ Notifier error for {job['id']}: {e}")
+            finally:
+                with self._cond:
+                    self._chat_busy.discard(job['chat_id'])
+                    self._known.discard(job['id'])
+                    if job['status'] == 'queued' and job['id'] in self._jobs:
+                        self._push(job['id'], job['next_attempt_at'])
+                    self._cond.notify_all()
+
+    def _deliver(self, job):
+        job['attempts'] += 1
+        bot = get_bot()
+        try:
+            if not bot:
+                raise RuntimeError('Bot is not configured')
+            bot.send_message(job['chat_id'], job['text'], parse_mode=job.get('parse_mode'),
+                             reply_markup=job.get('reply_markup'))
+        except Exception as e:
+            code = getattr(e, 'error_code', None)
+            retry_after = ((getattr(e, 'result_json', None) or {}).get('parameters') or {}).get('retry_after')
+            if code in (400, 403) or job['attempts'] >= MAX_ATTEMPTS:
+                # Blocked bot, unknown chat, bad markup... retrying won't help
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                self.failed += 1
+                print(f"❌ Notification to {job['chat_id']} failed: {e}")
+            else:
+                delay = retry_after or min(2 ** job['attempts'], MAX_BACKOFF)
+                job['next_attempt_at'] = time.time() + delay
+                job['error'] = str(e)
+                self.retries += 1
+                if retry_after:
+                    with self._cond:
+                        self._chat_next[job['chat_id']] = time.time() + retry_after
+            self._store(job)
+            return
+
+        job['status'] = 'sent'
+        self.sent += 1
+        self._latencies.append(time.time() - job['created_at'])
+        self._store(job, remove=True)
+
+    def _store(self, job, remove=False):
+        """Write back a delivery outcome against the current outbox"""
+        def update(tx):
+            if tx.get(OUTBOX_FILE, job['id']) is None:
+                return
+            if remove:
+                tx.delete(OUTBOX_FILE, job['id'])
+            else:
+                tx.put(OUTBOX_FILE, job['id'], job)
+        self.db.run_transaction(update, OUTBOX_FILE)
+
+    # --- metrics ---
+
+    def stats(self):
+        outbox = self.db.load(OUTBOX_FILE, copy_data=False)
+        queued = [j for j in outbox.values() if j.get('status') == 'queued']
+        latencies = sorted(self._latencies)
+        return {
+            'queued': len(queued),
+            'failed': sum(1 for j in outbox.values() if j.get('status') == 'failed'),
+            'oldest_queued_seconds': round(time.time() - min(j['created_at'] for j in queued), 1) if queued else 0,
+            # The counters below belong to the process running the sender
+            'sender_running': bool(self._threads),
+            'sent': self.sent,
+            'send_failures': self.failed,
+            'retries': self.retries,
+            'latency_avg': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'latency_p95': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else None
+        }
+
+notifier = Notifier(db, workers=int(os.environ.get('NOTIFY_WORKERS', 4)))
@@ -0,0 +1,166 @@
+import os
+
+if __name__ == '__main__':
+    # Events published by the bot must reach the web workers' SSE clients
+    # (set before core.events is imported)
+    os.environ.setdefault('EVENTS_SHARED', '1')
+
+import sys
+import time
+import atexit
+import signal
+import threading
+import psutil
+from core.database import db
+from bot.bot_core import get_bot, BOT_MODE
+from bot.handlers import register_handlers
+from bot.notifier import notifier
+from bot.broadcasts import broadcasts
+from bot.media import kyc_media
+from bot.deadlines import rental_deadlines
+from core.archive import archive
+from core.rollups import revenue_rollups
+from core.activity import admin_activity
+
+# Telegram long-polling loop, or with BOT_MODE=webhook the webhook receiver,
+# plus the background workers: notifications, broadcasts, KYC thumbnails.
+#
+# Only one poller per token may talk to Telegram, so the loop holds
+# data/bot.pid while it runs. In development app.py starts it in a thread;
+# in production it runs as its own process next to the WSGI workers:
+#
+#   cd server && python -m bot.runner
+#
+# This process writes the same tables as the web workers (users, KYC and
+# rental requests, the outbox, rentals); core/database.py checks every
+# write against the file on disk so neither side overwrites the other.
+
+PID_FILE = os.path.join(db.data_dir, 'bot.pid')
+
+def bot_process_pid():
+    """PID of the process currently running the poller, or None"""
+    try:
+        with open(PID_FILE) as f:
+            pid = int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return None
+    return pid if pid and psutil.pid_exists(pid) else None
+
+def _release_lock():
+    if bot_process_pid() == os.getpid():
+        os.remove(PID_FILE)
+
+def acquire_lock():
+    while True:
+        try:
+            fd = os.open(PID_FILE, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            pid = bot_process_pid()
+            if pid == os.getpid():
+                return True
+            if pid:
+                return False
+            # Left behind by a process that is gone
+            try:
+                os.remove(PID_FILE)
+            except FileNotFoundError:
+                pass
+            continue
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(os.getpid()))
+        atexit.register(_release_lock)
+        return True
+
+def run_bot(delay=2):
+    if not acquire_lock():
+        print(f"❌ Bot poller already running (pid {bot_process_pid()}), not starting another one")
+        return
+    print("🤖 Bot thread waiting for server to stabilize...")
+    time.sleep(delay) # Give Flask a moment to start/restart
+    # Old per-admin stats move to the activity log once; the web workers
+    # pick the result up when the rollups table changes
+    admin_activity.migrate()
+    # Outgoing messages queued by the API and the handlers are sent from here
+    notifier.start()
+    broadcasts.start()
+    kyc_media.start()
+    rental_deadlines.start()
+    # Runs in the single bot process so archival never races itself
+    archive.start()
+    # Finance rollups are maintained here; the web workers only read them
+    revenue_rollups.start()
+    if BOT_MODE == 'webhook':
+        watch_webhook()
+        return
+    last_token = None
+    while True:
+        try:
+            bot = get_bot()
+            if bot:
+                if not last_token or bot.token != last_token:
+                    print(f"🤖 Telegram Bot initializing with token {bot.token[:10]}...")
+                    register_handlers(bot)
+                    bot.remove_webhook()  # polling is refused while a webhook is set
+                    last_token = bot.token
+                
+                print("🤖 Telegram Bot starting polling...")
+                bot.polling(none_stop=True, interval=0, timeout=20)
+            else:
+                time.sleep(10)
+        except Exception as e:
+            if "Conflict" in str(e):
+                print("❌ Conflict: Another bot instance is running. Retrying in 5s...")
+                time.sleep(5)
+            else:
+                print(f"❌ Bot error: {e}")
+                time.sleep(5)
+
+def watch_webhook():
+    """Keep Telegram's webhook pointed at us, re-registering on token change"""
+    from bot.webhook import set_webhook
+    last_token = None
+    while True:
+        try:
+            bot = get_bot()
+            if bot and bot.token != last_token and set_webhook(bot):
+                last_token = bot.token
+        except Exception as e:
+            print(f"❌ Webhook setup error: {e}")
+        time.sleep(10)
+
+def serve_webhook():
+    """Standalone webhook receiver (python -m bot.runner with BOT_MODE=webhook)"""
+    from flask import Flask
+    from bot.webhook import webhook_api, dispatcher
+    app = Flask(__name__)
+    app.register_blueprint(webhook_api)
+    dispatcher.start()
+    threading.Thread(target=run_bot, kwargs={'delay': 0}, daemon=True).start()
+
+    bind = os.environ.get('WEBHOOK_BIND', '0.0.0.0:8443')
+    try:
+        from waitress import serve
+    except ImportError:
+        host, port = bind.rsplit(':', 1)
+        app.run(host=host, port=int(port), threaded=True)
+    else:
+        serve(app, listen=bind, threads=int(os.environ.get('WEB_THREADS', 16)))
+
+def _shutdown(signum, frame):
+    print("🛑 Bot poller stopping...")
+    bot = get_bot()
+    if bot and BOT_MODE != 'webhook':
+        bot.stop_polling()
+    db.flush()
+    sys.exit(0)
+
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    if BOT_MODE == 'webhook':
+        if not acquire_lock():
+            print(f"❌ Bot already running (pid {bot_process_pid()})")
+            sys.exit(1)
+        serve_webhook()
+    else:
+        run_bot(delay=0)
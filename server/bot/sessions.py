@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from core.database import db, USERS_FILE
+from core.settings import settings_service
+
+# Per-user state for the bot's message path.
+#
+# A bounded LRU of small session records, so a message costs a dict lookup
+# instead of touching the users table. Changes made through the sessions
+# (kyc_status, last activity) are written through to USERS_FILE; changes made
+# elsewhere (kyc_action in the API, another process) reach us through the
+# users table listener, which get() triggers by letting the db re-check the
+# file. last_menu lives in memory only.
+
+ACTIVE_RESOLUTION = 3600  # seconds; last_active_at is only rewritten this often
+
+class UserSessions:
+    def __init__(self, database, capacity=10000):
+        self.db = database
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # user id -> session
+        self.hits = 0
+        self.misses = 0
+        database.add_listener(USERS_FILE, self._on_users_change)
+        settings_service.subscribe(self._on_settings_change)
+
+    def _session(self, user_id, user):
+        return {
+            'user_id': user_id,
+            'exists': user is not None,
+            'kyc_status': (user or {}).get('kyc_status', 'none'),
+            'last_active_at': (user or {}).get('last_active_at'),
+            'role': 'admin' if settings_service.is_admin(user_id) else 'user',
+            'last_menu': None
+        }
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        # A stat check at most every DB_STAT_INTERVAL; if another process
+        # (the web API) changed the users table, the listener refreshes us
+        self.db.load(USERS_FILE, copy_data=False)
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self._sessions.move_to_end(user_id)
+                self.hits += 1
+                return session
+        self.misses += 1
+        session = self._session(user_id, self.db.get(USERS_FILE, user_id))
+        with self._lock:
+            # Someone may have filled it in the meantime
+            session = self._sessions.setdefault(user_id, session)
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+        return session
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._sessions.clear()
+            else:
+                self._sessions.pop(str(user_id), None)
+
+    def _on_users_change(self, data, rows):
+        with self._lock:
+            if rows is None:
+                # Whole table replaced: refresh just the users we hold
+                for user_id, session in list(self._sessions.items()):
+                    self._refresh(session, data.get(user_id))
+            else:
+                for user_id, row in rows.items():
+                    session = self._sessions.get(user_id)
+                    if session is not None:
+                        self._refresh(session, row)
+
+    def _refresh(self, session, user):
+        session['exists'] = user is not None
+        session['kyc_status'] = (user or {}).get('kyc_status', 'none')
+        session['last_active_at'] = (user or {}).get('last_active_at')
+
+    def _on_settings_change(self, settings, changed):
+        if 'admin_chat_id' in changed:
+            with self._lock:
+                for user_id, session in self._sessions.items():
+                    session['role'] = 'admin' if settings_service.is_admin(user_id) else 'user'
+
+    # --- write-through ---
+
+    def _update_user(self, user_id, **fields):
+        # Fresh read inside a transaction: the web process writes users too
+        return self.db.update(USERS_FILE, user_id, fields) is not None  # the listener updates the session
+
+    def set_kyc_status(self, user_id, status):
+        return self._update_user(str(user_id), kyc_status=status)
+
+    def touch(self, user_id):
+        """Record when the user last talked to the bot (used by broadcast segments)"""
+        session = self.get(user_id)
+        if not session['exists']:
+            return
+        now = datetime.now()
+        last = session['last_active_at']
+        if last and (now - datetime.fromisoformat(last)).total_seconds() < ACTIVE_RESOLUTION:
+            return
+        session['last_active_at'] = now.isoformat()
+        self._update_user(session['user_id'], last_active_at=session['last_active_at'])
+
+    def set_menu(self, user_id, menu):
+        self.get(user_id)['last_menu'] = menu
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'sessions': len(self._sessions),
+            'capacity': self.capacity,
+            'hit_rate': round(self.hits / total, 3) if total else None
+        }
+
+sessions = UserSessions(db, capacity=int(os.environ.get('BOT_SESSION_CACHE', 10000)))
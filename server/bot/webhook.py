@@ -0,0 +1,170 @@
+import os
+import hashlib
+import threading
+from collections import deque
+from flask import Blueprint, jsonify, request
+from telebot import types
+from bot.bot_core import get_bot
+from bot.handlers import register_handlers
+
+# Webhook ingestion (BOT_MODE=webhook).
+#
+# Telegram POSTs updates to /telegram/webhook. The route only queues them;
+# a pool of BOT_WORKERS threads runs the handlers. Updates of one chat are
+# handled strictly one after another (register_next_step_handler flows like
+# the KYC photo depend on it), different chats run in parallel.
+#
+# Next-step handlers live in memory, so all updates must reach one process:
+# serve this from bot/runner.py (or the dev server), not from gunicorn workers.
+
+def _chat_key(update):
+    for field in ('message', 'edited_message', 'channel_post'):
+        if field in update:
+            return update[field].get('chat', {}).get('id')
+    call = update.get('callback_query')
+    if call:
+        return (call.get('message') or {}).get('chat', {}).get('id') or call.get('from', {}).get('id')
+    for field in ('inline_query', 'chosen_inline_result', 'pre_checkout_query', 'shipping_query'):
+        if field in update:
+            return update[field].get('from', {}).get('id')
+    return f"update:{update.get('update_id')}"
+
+
+class UpdateDispatcher:
+    def __init__(self, workers=8, max_queue=1000):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._lock = threading.Condition()
+        self._pending = {}      # chat key -> deque of updates
+        self._ready = deque()   # chat keys with pending updates and no worker on them
+        self._busy = set()      # chat keys a worker is handling right now
+        self._queued = 0
+        self._threads = []
+        self._bot_token = None
+        self.processed = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'bot-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        print(f"🤖 Webhook dispatcher started with {self.workers} workers")
+
+    def submit(self, update):
+        """Queue an update; False if the queue is full"""
+        self.start()
+        key = _chat_key(update)
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self.rejected += 1
+                return False
+            self._pending.setdefault(key, deque()).append(update)
+            self._queued += 1
+            if key not in self._busy and len(self._pending[key]) == 1:
+                self._ready.append(key)
+                self._lock.notify()
+        return True
+
+    def _next(self):
+        with self._lock:
+            while not self._ready:
+                self._lock.wait()
+            key = self._ready.popleft()
+            self._busy.add(key)
+            return key, self._pending[key].popleft()
+
+    def _done(self, key):
+        with self._lock:
+            self._busy.discard(key)
+            self._queued -= 1
+            if self._pending[key]:
+                # One update per turn so a chatty chat can't starve the others
+                self._ready.append(key)
+                self._lock.notify()
+            else:
+                del self._pending[key]
+
+    def _work(self):
+        while True:
+            key, update = self._next()
+            try:
+                bot = self._current_bot()
+                if bot:
+                    bot.process_new_updates([types.Update.de_json(update)])
+                self.processed += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Bot update {update.get('update_id')} failed: {e}")
+            finally:
+                self._done(key)
+
+    def _current_bot(self):
+        bot = get_bot()
+        if bot and bot.token != self._bot_token:
+            with self._lock:
+                if bot.token != self._bot_token:
+                    print(f"🤖 Telegram Bot initializing with token {bot.token[:10]}...")
+                    register_handlers(bot)
+                    self._bot_token = bot.token
+        return bot
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': len(self._threads),
+                'queued': self._queued,
+                'max_queue': self.max_queue,
+                'busy_chats': len(self._busy),
+                'processed': self.processed,
+                'rejected': self.rejected,
+                'errors': self.errors
+            }
+
+
+dispatcher = UpdateDispatcher(
+    workers=int(os.environ.get('BOT_WORKERS', 8)),
+    max_queue=int(os.environ.get('BOT_QUEUE_SIZE', 1000))
+)
+
+def webhook_secret(token):
+    """Value Telegram sends back in X-Telegram-Bot-Api-Secret-Token"""
+    return os.environ.get('WEBHOOK_SECRET') or hashlib.sha256(f"webhook:{token}".encode()).hexdigest()[:32]
+
+def set_webhook(bot):
+    url = os.environ.get('WEBHOOK_URL')
+    if not url:
+        print("❌ WEBHOOK_URL is not set, Telegram doesn't know where to send updates")
+        return False
+    bot.remove_webhook()
+    bot.set_webhook(url=url.rstrip('/') + '/telegram/webhook', secret_token=webhook_secret(bot.token),
+                    max_connections=dispatcher.workers)
+    print(f"🤖 Webhook set to {url.rstrip('/')}/telegram/webhook")
+    return True
+
+
+webhook_api = Blueprint('webhook_api', __name__)
+
+@webhook_api.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    bot = get_bot()
+    if not bot:
+        return jsonify({'error': 'Bot is not configured'}), 503
+    if request.headers.get('X-Telegram-Bot-Api-Secret-Token') != webhook_secret(bot.token):
+        return jsonify({'error': 'Forbidden'}), 403
+
+    update = request.get_json(silent=True)
+    if not isinstance(update, dict):
+        return jsonify({'error': 'Invalid update'}), 400
+    if not dispatcher.submit(update):
+        # Telegram retries later
+        return jsonify({'error': 'Queue is full'}), 503
+    return jsonify({'ok': True})
+
+@webhook_api.route('/telegram/webhook/stats')
+def webhook_stats():
+    return jsonify(dispatcher.stats())
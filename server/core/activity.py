@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from core.database import db, ADMIN_USERS_FILE, ADMIN_ACTIVITY_FILE
+
+# Admin activity (request and KYC decisions) for the staff reports.
+#
+# Every action is one compact JSON line appended to <log_dir>/<YYYY-MM-DD>.log
+# (O_APPEND, so several processes can write at once). Once a day is over its
+# file is compacted into ADMIN_ACTIVITY_FILE as one row per admin,
+# "<day>|<admin_id>" -> {actions, requests, kyc}, and deleted. Counters from
+# before this log existed (the old stats dicts on admin records) live in
+# "base|<admin_id>" rows; MIGRATED_KEY marks that they have been moved
+# (done once by migrate(): the bot runner calls it on start, or run
+# python -m core.activity).
+#
+# The aggregator keeps per-day and per-admin counts in memory and reads only
+# the bytes appended since the last look, so reports never rescan anything.
+
+KINDS = ('requests', 'kyc')
+COMPACT_AFTER = 60  # seconds a finished day's file must stay untouched before compaction
+MIGRATED_KEY = 'meta|legacy_stats'
+
+def _counts():
+    return {'actions': 0, 'requests': 0, 'kyc': 0}
+
+def _add(target, counts):
+    for key, value in counts.items():
+        target[key] = target.get(key, 0) + value
+
+
+class AdminActivity:
+    def __init__(self, database, log_dir):
+        self.db = database
+        self.log_dir = log_dir
+        self._lock = threading.RLock()
+        self._rolled = {}       # day -> admin_id -> counts (compacted days)
+        self._base = {}         # admin_id -> counts (pre-log totals)
+        self._logged = {}       # day -> admin_id -> counts (days still in log files)
+        self._offsets = {}      # day -> bytes of its log file already counted
+        self._totals = None     # admin_id -> counts, rebuilt when the rollups change
+        self._ready = False
+        self._compacted = None  # last day for which compaction ran
+        database.add_listener(ADMIN_ACTIVITY_FILE, self._on_change)
+
+    # --- writing ---
+
+    def record(self, admin_id, kind, ref=None, action=None, when=None):
+        """Append one action by admin_id; kind is 'requests' or 'kyc'"""
+        when = when or datetime.now()
+        entry = {'t': when.isoformat(timespec='seconds'), 'admin': admin_id, 'kind': kind}
+        if ref:
+            entry['ref'] = ref
+        if action:
+            entry['action'] = action
+        self._append(when.strftime('%Y-%m-%d'), entry)
+
+    def _append(self, day, entry):
+        os.makedirs(self.log_dir, exist_ok=True)
+        line = (json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        fd = os.open(self._path(day), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _path(self, day):
+        return os.path.join(self.log_dir, f"{day}.log")
+
+    # --- aggregation ---
+
+    def _on_change(self, data, rows):
+        rolled, base = {}, {}
+        for key, row in data.items():
+            day, admin_id = key.split('|', 1)
+            if day == 'meta':
+                continue
+            if day == 'base':
+                base[admin_id] = dict(row)
+            else:
+                rolled.setdefault(day, {})[admin_id] = dict(row)
+        # No lock here: this runs under the db's file lock, and _compact
+        # writes the table while holding ours
+        self._rolled, self._base, self._totals = rolled, base, None
+
+    def _ensure_ready(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            self._on_change(self.db.load(ADMIN_ACTIVITY_FILE, copy_data=False), None)
+            self._ready = True
+
+    def _read(self, day):
+        """Count the lines appended to day's file since the last read"""
+        try:
+            with open(self._path(day), 'rb') as f:
+                f.seek(self._offsets.get(day, 0))
+                chunk = f.read()
+        except FileNotFoundError:
+            # Compacted (by us or by another process); the rollup row has it now
+            self._logged.pop(day, None)
+            self._offsets.pop(day, None)
+            self._totals = None
+            return
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return
+        counts = self._logged.setdefault(day, {})
+        for line in chunk[:end + 1].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            admin = counts.setdefault(entry.get('admin'), _counts())
+            n = entry.get('n', 1)
+            admin['actions'] += n
+            if entry.get('kind') in KINDS:
+                admin[entry['kind']] += n
+            if self._totals is not None and day not in self._rolled:
+                totals = self._totals.setdefault(entry.get('admin'), _counts())
+                totals['actions'] += n
+                if entry.get('kind') in KINDS:
+                    totals[entry['kind']] += n
+        self._offsets[day] = self._offsets.get(day, 0) + end + 1
+
+    def _catch_up(self):
+        self._ensure_ready()
+        # Picks up a changed rollup table (another process compacted a day)
+        self.db.load(ADMIN_ACTIVITY_FILE, copy_data=False)
+        try:
+            names = os.listdir(self.log_dir)
+        except FileNotFoundError:
+            names = []
+        days = {n[:-4] for n in names if n.endswith('.log')}
+        today = datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            for day in sorted(days | set(self._logged)):
+                self._read(day)
+            if self._compacted != today and any(day < today for day in days):
+                self._compact(today)
+
+    def _day(self, day):
+        # Once a day is compacted its rollup row is authoritative
+        return self._rolled.get(day) if day in self._rolled else self._logged.get(day, {})
+
+    def _build_totals(self):
+        totals = {}
+        for admin_id, counts in self._base.items():
+            _add(totals.setdefault(admin_id, _counts()), counts)
+        for day in set(self._rolled) | set(self._logged):
+            for admin_id, counts in self._day(day).items():
+                _add(totals.setdefault(admin_id, _counts()), counts)
+        self._totals = totals
+
+    # --- compaction ---
+
+    def _compact(self, today):
+        """Fold finished days into ADMIN_ACTIVITY_FILE and delete their files"""
+        pending = False
+        for day in sorted(self._logged):
+            if day >= today:
+                continue
+            path = self._path(day)
+            try:
+                if time.time() - os.path.getmtime(path) < COMPACT_AFTER:
+                    pending = True  # a late write may still be landing
+                    continue
+            except FileNotFoundError:
+                continue
+            self._read(day)
+            counts = self._logged.get(day, {})
+            # Rows first, then the file: a crash in between only means the
+            # day is compacted again (same rows) on the next run
+            with self.db.batch():
+                for admin_id, row in counts.items():
+                    self.db.put(ADMIN_ACTIVITY_FILE, f"{day}|{admin_id}", row)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # another process compacted it at the same time
+            self._logged.pop(day, None)
+            self._offsets.pop(day, None)
+            print(f"🗜️ Admin activity for {day} compacted ({sum(c['actions'] for c in counts.values())} actions)")
+        if not pending:
+            self._compacted = today
+
+    def migrate(self):
+        """Move the old per-admin stats dicts out of admin_users.json (once).
+
+        Called by the bot runner on start (not by the web workers). The
+        transaction makes the marker row, the base rows and the stripped
+        admins one write, so a second run (or a concurrent one-off
+        python -m core.activity) finds the marker and does nothing.
+        """
+        def migrate(tx):
+            if tx.get(ADMIN_ACTIVITY_FILE, MIGRATED_KEY):
+                return None
+            admins = tx.table(ADMIN_USERS_FILE)
+            legacy = {aid: a['stats'] for aid, a in admins.items() if isinstance(a, dict) and 'stats' in a}
+            for admin_id, stats in legacy.items():
+                tx.put(ADMIN_ACTIVITY_FILE, f"base|{admin_id}", {
+                    'actions': 0,
+                    'requests': stats.get('total_processed_requests', 0),
+                    'kyc': stats.get('total_processed_kyc', 0)
+                })
+                tx.put(ADMIN_USERS_FILE, admin_id, {k: v for k, v in admins[admin_id].items() if k != 'stats'})
+            tx.put(ADMIN_ACTIVITY_FILE, MIGRATED_KEY, {'at': datetime.now().isoformat(), 'admins': len(legacy)})
+            return legacy
+
+        with self._lock:
+            legacy = self.db.run_transaction(migrate, ADMIN_USERS_FILE, ADMIN_ACTIVITY_FILE)
+            if not legacy:
+                return
+            # Only after the commit, so a retried transaction can't append twice.
+            # Per-day counts didn't say what kind of action they were.
+            for admin_id, stats in legacy.items():
+                for day, n in (stats.get('daily_actions') or {}).items():
+                    self._append(day, {'t': day, 'admin': admin_id, 'n': n})
+        print(f"🗜️ Moved activity stats of {len(legacy)} admin(s) to the activity log")
+
+    # --- queries ---
+
+    def daily(self, day=None):
+        """admin_id -> counts for one day (default today)"""
+        self._catch_up()
+        day = day or datetime.now().strftime('%Y-%m-%d')
+        with self._lock:
+            return {aid: dict(c) for aid, c in self._day(day).items()}
+
+    def totals(self):
+        """admin_id -> all-time counts"""
+        self._catch_up()
+        with self._lock:
+            if self._totals is None:
+                self._build_totals()
+            return {aid: dict(c) for aid, c in self._totals.items()}
+
+    def stats_for(self, admin_id):
+        """The stats block shown on admin profiles"""
+        total = self.totals().get(admin_id, _counts())
+        today = self.daily().get(admin_id, _counts())
+        return {
+            'total_processed_requests': total['requests'],
+            'total_processed_kyc': total['kyc'],
+            'today_actions': today['actions']
+        }
+
+admin_activity = AdminActivity(db, os.environ.get('ADMIN_ACTIVITY_DIR', os.path.join(db.data_dir, 'admin_activity')))
+
+if __name__ == '__main__':
+    # One-off run: python -m core.activity
+    admin_activity.migrate()
+    db.flush()
@@ -0,0 +1,281 @@
+import os
+import sys
+import gzip
+import json
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from core.database import db, RENTALS_FILE, RENTAL_REQUESTS_FILE, KYC_REQUESTS_FILE, ARCHIVE_INDEX_FILE
+
+# Cold storage for finished records.
+#
+# Completed rentals and processed rental/KYC requests older than
+# ARCHIVE_AFTER_DAYS are moved out of the hot tables into gzip'd JSON-lines
+# segments under data/archive/<table>/<YYYY-MM>/, partitioned by the month of
+# partition_field. Segments are never rewritten: every run adds new ones.
+# ARCHIVE_INDEX_FILE lists them per "<table>|<month>" and keeps running totals
+# ("<table>|totals") so counts and revenue don't need the segments at all.
+#
+# Readers open cold partitions only when a query reaches them
+# (merged_index() for history pages, iter_rows() for backfills); a few
+# recently read partitions stay parsed in memory.
+
+TABLES = {
+    RENTALS_FILE: {'statuses': ('completed',), 'age_field': 'end_time', 'partition_field': 'start_time'},
+    RENTAL_REQUESTS_FILE: {'statuses': ('approved', 'rejected'), 'age_field': 'updated_at', 'partition_field': 'created_at'},
+    KYC_REQUESTS_FILE: {'statuses': ('approved', 'rejected'), 'age_field': 'processed_at', 'partition_field': 'timestamp'}
+}
+
+UNDATED = '0000-00'  # partition of records without a date; sorts last
+
+def _month(value):
+    return (value or '')[:7] or UNDATED
+
+class Archive:
+    def __init__(self, database, root, max_age_days=90, interval=24 * 3600, cached_partitions=8):
+        self.db = database
+        self.root = root
+        self.max_age_days = max_age_days
+        self.interval = interval
+        self.cached_partitions = cached_partitions
+        self._lock = threading.Lock()
+        self._partitions = OrderedDict()    # (table, month, segments) -> [(key, row)]
+        self._thread = None
+        self.partitions_read = 0
+
+    # --- moving records out ---
+
+    def run(self, now=None):
+        """Archive everything old enough; returns {table: records moved}"""
+        cutoff = ((now or datetime.now()) - timedelta(days=self.max_age_days)).isoformat()
+        moved = {}
+        for table, spec in TABLES.items():
+            moved[table] = self._archive_table(table, spec, cutoff)
+            if moved[table]:
+                print(f"🧊 Archived {moved[table]} record(s) from {table}")
+        return moved
+
+    def _archive_table(self, table, spec, cutoff):
+        with self.db.locked(table, ARCHIVE_INDEX_FILE):
+            data = self.db.load(table, copy_data=False)
+            old = {}
+            for key, row in data.items():
+                if not isinstance(row, dict) or row.get('status') not in spec['statuses']:
+                    continue
+                finished = row.get(spec['age_field']) or row.get(spec['partition_field'])
+                if finished and finished < cutoff:
+                    old[key] = row
+            if not old:
+                return 0
+
+            by_month = {}
+            for key, row in old.items():
+                by_month.setdefault(_month(row.get(spec['partition_field'])), {})[key] = row
+
+            # Segments first, then the index that points at them, then the
+            # hot rows: an interrupted run leaves at worst an unlisted segment
+            stamp = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+            index = self.db.load(ARCHIVE_INDEX_FILE, copy_data=False)
+            with self.db.batch():
+                for month, rows in by_month.items():
+                    name = self._write_segment(table, month, stamp, rows, spec['partition_field'])
+                    entry = dict(index.get(f"{table}|{month}") or {'segments': [], 'count': 0})
+                    entry['segments'] = entry['segments'] + [name]
+                    entry['count'] += len(rows)
+                    self.db.put(ARCHIVE_INDEX_FILE, f"{table}|{month}", entry)
+                self.db.put(ARCHIVE_INDEX_FILE, f"{table}|totals",
+                            self._add_totals(table, index.get(f"{table}|totals"), old.values()))
+            with self.db.batch():
+                for key in old:
+                    self.db.delete(table, key)
+            return len(old)
+
+    def _dir(self, table, month):
+        return os.path.join(self.root, table.rsplit('.', 1)[0], month)
+
+    def _write_segment(self, table, month, stamp, rows, field):
+        directory = self._dir(table, month)
+        os.makedirs(directory, exist_ok=True)
+        name = f"{stamp}.jsonl.gz"
+        path = os.path.join(directory, name)
+        # Newest first, like the readers want them
+        ordered = sorted(rows.items(), key=lambda kv: (str(kv[1].get(field) or ''), kv[0]), reverse=True)
+        try:
+            with open(path + '.tmp', 'wb') as raw:
+                with gzip.open(raw, 'wt', encoding='utf-8') as f:
+                    for key, row in ordered:
+                        f.write(json.dumps([key, row], ensure_ascii=False, separators=(',', ':')) + '\n')
+                raw.flush()
+                os.fsync(raw.fileno())
+            os.replace(path + '.tmp', path)
+        except BaseException:
+            if os.path.exists(path + '.tmp'):
+                os.remove(path + '.tmp')
+            raise
+        # The segment must be on disk before the index points at it and the
+        # hot rows are deleted; makedirs may have created the parents too
+        self._fsync_dir(directory)
+        self._fsync_dir(os.path.dirname(directory))
+        self._fsync_dir(self.root)
+        return name
+
+    @staticmethod
+    def _fsync_dir(directory):
+        # Makes renames and new entries durable (not supported on Windows)
+        if os.name == 'nt':
+            return
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _add_totals(self, table, totals, rows):
+        totals = json.loads(json.dumps(totals)) if totals else {'count': 0}
+        for row in rows:
+            totals['count'] += 1
+            if table == RENTALS_FILE:
+                cost = row.get('total_cost', 0) or 0
+                totals['total_cost'] = round(totals.get('total_cost', 0) + cost, 2)
+                console = totals.setdefault('by_console', {}).setdefault(row.get('console_id') or '', [0, 0])
+                console[0] += 1
+                console[1] = round(console[1] + cost, 2)
+                users = totals.setdefault('by_user', {})
+                users[str(row.get('user_id'))] = users.get(str(row.get('user_id')), 0) + 1
+        return totals
+
+    # --- reading ---
+
+    def totals(self, table):
+        """Running totals of everything archived from table"""
+        return self.db.load(ARCHIVE_INDEX_FILE, copy_data=False).get(f"{table}|totals") or {'count': 0}
+
+    def months(self, table):
+        """Archived partitions of table, newest first"""
+        prefix = f"{table}|"
+        index = self.db.load(ARCHIVE_INDEX_FILE, copy_data=False)
+        return sorted((k[len(prefix):] for k in index if k.startswith(prefix) and k != f"{table}|totals"), reverse=True)
+
+    def read_partition(self, table, month):
+        """[(key, row)] of one partition, newest first"""
+        entry = self.db.load(ARCHIVE_INDEX_FILE, copy_data=False).get(f"{table}|{month}")
+        if not entry:
+            return []
+        cache_key = (table, month, tuple(entry['segments']))
+        with self._lock:
+            rows = self._partitions.get(cache_key)
+            if rows is not None:
+                self._partitions.move_to_end(cache_key)
+                return rows
+
+        field = TABLES[table]['partition_field']
+        rows = []
+        for name in entry['segments']:
+            with gzip.open(os.path.join(self._dir(table, month), name), 'rt', encoding='utf-8') as f:
+                rows.extend(tuple(json.loads(line)) for line in f)
+        if len(entry['segments']) > 1:
+            rows.sort(key=lambda kv: (str(kv[1].get(field) or ''), kv[0]), reverse=True)
+        self.partitions_read += 1
+
+        with self._lock:
+            self._partitions[cache_key] = rows
+            while len(self._partitions) > self.cached_partitions:
+                self._partitions.popitem(last=False)
+        return rows
+
+    def iter_rows(self, table):
+        """Every archived (key, row) of table, one partition at a time"""
+        for month in self.months(table):
+            yield from self.read_partition(table, month)
+
+    def merged_index(self, hot_index, table, rows):
+        """hot_index extended with the cold rows of table, for core.pagination.paginate"""
+        return MergedIndex(self, hot_index, table, rows)
+
+    # --- background runs ---
+
+    def start(self):
+        if self.max_age_days <= 0 or self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run()
+            except Exception as e:
+                print(f"❌ Archive run failed: {e}")
+            time.sleep(self.interval)
+
+
+class MergedRows:
+    """Hot table plus the cold rows a MergedIndex has handed out"""
+
+    def __init__(self, hot):
+        self.hot = hot
+        self.cold = {}
+
+    def get(self, key, default=None):
+        row = self.hot.get(key)
+        return row if row is not None else self.cold.get(key, default)
+
+    def __getitem__(self, key):
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+
+class MergedIndex:
+    """OrderedIndex look-alike that walks hot and cold rows together, newest first"""
+
+    def __init__(self, archive, hot_index, table, rows):
+        self.archive = archive
+        self.hot_index = hot_index
+        self.table = table
+        self.field = TABLES[table]['partition_field']
+        self.rows = rows
+
+    def ensure(self):
+        return self.hot_index.ensure()
+
+    def value(self, key):
+        row = self.rows.cold.get(key)
+        return str(row.get(self.field) or '') if row is not None else self.hot_index.value(key)
+
+    def _cold(self, start, stop):
+        for month in self.archive.months(self.table):
+            if start is not None and month > (start[0][:7] or UNDATED):
+                continue
+            if stop is not None and month < stop[0][:7]:
+                break
+            for key, row in self.archive.read_partition(self.table, month):
+                if key in self.rows.hot:
+                    continue  # still (or again) in the hot table
+                item = (str(row.get(self.field) or ''), key)
+                if start is not None and item >= start:
+                    continue
+                if stop is not None and item < stop:
+                    return
+                self.rows.cold[key] = row
+                yield item
+
+    def iter_desc(self, start=None, stop=None):
+        return heapq.merge(self.hot_index.iter_desc(start, stop), self._cold(start, stop), reverse=True)
+
+
+archive = Archive(
+    db, os.path.join(db.data_dir, 'archive'),
+    max_age_days=int(os.environ.get('ARCHIVE_AFTER_DAYS', 90)),
+    interval=float(os.environ.get('ARCHIVE_INTERVAL_HOURS', 24)) * 3600
+)
+
+if __name__ == '__main__':
+    # One-off run: python -m core.archive [days]
+    if len(sys.argv) > 1:
+        archive.max_age_days = int(sys.argv[1])
+    print(archive.run())
+    db.flush()
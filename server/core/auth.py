@@ -0,0 +1,214 @@
+import os
+import hmac
+import time
+import base64
+import hashlib
+import secrets
+import threading
+from datetime import datetime
+from flask import request
+from core.database import db, ADMIN_USERS_FILE, SESSIONS_FILE
+
+# Admin passwords and login sessions.
+#
+# Passwords are stored as "pbkdf2_sha256$<iterations>$<salt>$<hash>". The
+# cost is AUTH_PBKDF2_ITERATIONS; hashes made with another cost, and the old
+# unsalted SHA-256 hex digests, are rehashed on the next successful login.
+#
+# A login returns a random token. Only its SHA-256 goes to SESSIONS_FILE, so
+# the file can be shared between web workers without leaking live tokens.
+# Both tables are mirrored in memory through db listeners: checking a token
+# is a dict lookup, never a KDF run or a scan of the admin table.
+
+PBKDF2_ITERATIONS = int(os.environ.get('AUTH_PBKDF2_ITERATIONS', 390000))
+SESSION_TTL = int(os.environ.get('AUTH_SESSION_TTL', 7 * 24 * 3600))  # seconds
+PURGE_INTERVAL = 600
+ALGORITHM = 'pbkdf2_sha256'
+
+def _pbkdf2(password, salt, iterations):
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt.encode(), iterations)
+    return base64.b64encode(digest).decode()
+
+def hash_password(password, iterations=None):
+    iterations = iterations or PBKDF2_ITERATIONS
+    salt = secrets.token_hex(16)
+    return f"{ALGORITHM}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+def verify_password(password, stored):
+    """Returns (matches, needs_rehash)"""
+    if not stored:
+        return False, False
+    if stored.startswith(ALGORITHM + '$'):
+        try:
+            _, iterations, salt, expected = stored.split('$', 3)
+            iterations = int(iterations)
+        except ValueError:
+            return False, False
+        ok = hmac.compare_digest(_pbkdf2(password, salt, iterations), expected)
+        return ok, ok and iterations != PBKDF2_ITERATIONS
+    # Legacy unsalted SHA-256
+    ok = hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    return ok, ok
+
+def public_admin(admin):
+    res = dict(admin)
+    res.pop('password', None)
+    return res
+
+
+class AdminDirectory:
+    """username -> id index and password-free views of the admin table"""
+
+    def __init__(self, database):
+        self.db = database
+        self._lock = threading.Lock()
+        self._by_username = {}
+        self._public = {}
+        self._ready = False
+        database.add_listener(ADMIN_USERS_FILE, self._on_change)
+
+    def _on_change(self, data, rows):
+        # A handful of admins: rebuilding is cheaper than tracking renames
+        by_username = {a.get('username'): aid for aid, a in data.items() if isinstance(a, dict)}
+        public = {aid: public_admin(a) for aid, a in data.items() if isinstance(a, dict)}
+        with self._lock:
+            self._by_username, self._public = by_username, public
+            self._ready = True
+
+    def _sync(self):
+        # load() re-reads the table if another process changed it, which calls _on_change
+        data = self.db.load(ADMIN_USERS_FILE, copy_data=False)
+        if not self._ready:
+            self._on_change(data, None)
+
+    def find(self, username):
+        """Full admin record (with the password hash) by username"""
+        self._sync()
+        admin_id = self._by_username.get(username)
+        return self.db.get(ADMIN_USERS_FILE, admin_id) if admin_id else None
+
+    def username_taken(self, username, exclude_id=None):
+        self._sync()
+        admin_id = self._by_username.get(username)
+        return admin_id is not None and admin_id != exclude_id
+
+    def count(self):
+        self._sync()
+        return len(self._public)
+
+    def get(self, admin_id):
+        """Admin without the password (shared, don't modify)"""
+        self._sync()
+        return self._public.get(admin_id)
+
+
+class SessionStore:
+    def __init__(self, database, ttl=SESSION_TTL):
+        self.db = database
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._sessions = {}     # token hash -> (admin_id, expires_at epoch)
+        self._ready = False
+        self._purged = 0
+        database.add_listener(SESSIONS_FILE, self._on_change)
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @staticmethod
+    def _entry(row):
+        return row['admin_id'], datetime.fromisoformat(row['expires_at']).timestamp()
+
+    def _on_change(self, data, rows):
+        with self._lock:
+            if rows is None:
+                self._sessions = {k: self._entry(r) for k, r in data.items()}
+                self._ready = True
+            elif self._ready:
+                for key, row in rows.items():
+                    if row is None:
+                        self._sessions.pop(key, None)
+                    else:
+                        self._sessions[key] = self._entry(row)
+
+    def _sync(self):
+        data = self.db.load(SESSIONS_FILE, copy_data=False)
+        if not self._ready:
+            self._on_change(data, None)
+
+    def create(self, admin_id):
+        """New session for admin_id, returns (token, expires_at)"""
+        self._purge()
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        expires_at = datetime.fromtimestamp(now + self.ttl).isoformat()
+        self.db.put(SESSIONS_FILE, self._key(token), {
+            'admin_id': admin_id,
+            'created_at': datetime.fromtimestamp(now).isoformat(),
+            'expires_at': expires_at
+        })
+        return token, expires_at
+
+    def resolve(self, token):
+        """admin_id of a live session, or None"""
+        if not token:
+            return None
+        key = self._key(token)
+        entry = self._sessions.get(key)
+        if entry is None:
+            # Maybe created by another worker since we last looked
+            self._sync()
+            entry = self._sessions.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            self.db.delete(SESSIONS_FILE, key)
+            return None
+        return entry[0]
+
+    def revoke(self, token):
+        if token:
+            self.db.delete(SESSIONS_FILE, self._key(token))
+
+    def revoke_admin(self, admin_id, keep=None):
+        """End every session of admin_id, except the one with token keep"""
+        self._sync()
+        keep_key = self._key(keep) if keep else None
+        with self._lock:
+            keys = [k for k, (aid, _) in self._sessions.items() if aid == admin_id and k != keep_key]
+        with self.db.batch():
+            for key in keys:
+                self.db.delete(SESSIONS_FILE, key)
+
+    def _purge(self):
+        now = time.time()
+        if now - self._purged < PURGE_INTERVAL:
+            return
+        self._purged = now
+        self._sync()
+        with self._lock:
+            expired = [k for k, (_, expires) in self._sessions.items() if expires < now]
+        if expired:
+            with self.db.batch():
+                for key in expired:
+                    self.db.delete(SESSIONS_FILE, key)
+
+    def stats(self):
+        return {'sessions': len(self._sessions), 'ttl': self.ttl}
+
+
+admin_directory = AdminDirectory(db)
+session_store = SessionStore(db)
+
+def request_token():
+    """Session token from "Authorization: Bearer <token>" (or ?token= for EventSource)"""
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[7:].strip()
+    return request.args.get('token')
+
+def current_admin():
+    """Admin (without password) behind the request's session token, or None"""
+    admin_id = session_store.resolve(request_token())
+    return admin_directory.get(admin_id) if admin_id else None
@@ -0,0 +1,46 @@
+from datetime import datetime
+from core.database import CONSOLES_FILE, RENTALS_FILE
+
+# What a finished rental costs. Shared by /api/rentals/terminate and the
+# deadline scheduler (bot/deadlines.py) so both charge the same way.
+
+def rental_cost(rental, console, end):
+    """(total_cost, hours) of rental if it ends at end"""
+    duration = end - datetime.fromisoformat(rental['start_time'])
+    hours = max(1, round(duration.total_seconds() / 3600, 2)) # Min 1 hour charge or exact
+
+    hourly_price = (console or {}).get('rental_price', 0)
+    total_cost = hours * hourly_price
+
+    # Apply discount if recorded in rental
+    discount_pct = rental.get('discount_percent', 0)
+    if discount_pct > 0:
+        total_cost = total_cost * (1 - discount_pct / 100)
+
+    return round(total_cost, 2), hours
+
+def complete_rental(tx, rental_key, end=None, **fields):
+    """Stage the end of an active rental and free its console.
+
+    tx is a db.transaction() over CONSOLES_FILE and RENTALS_FILE; extra
+    fields are stored on the rental. Returns (total_cost, hours), or None if
+    the rental isn't active (any more).
+    """
+    rental = tx.get(RENTALS_FILE, rental_key)
+    if not rental or rental.get('status') != 'active':
+        return None
+    end = end or datetime.now()
+    console_id = rental.get('console_id')
+    console = tx.get(CONSOLES_FILE, console_id)
+    total_cost, hours = rental_cost(rental, console, end)
+
+    tx.put(RENTALS_FILE, rental_key, {
+        **rental,
+        'status': 'completed',
+        'end_time': end.isoformat(),
+        'total_cost': total_cost,
+        **fields
+    })
+    if console is not None:
+        tx.put(CONSOLES_FILE, console_id, {**console, 'status': 'available'})
+    return total_cost, hours
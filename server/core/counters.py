@@ -0,0 +1,79 @@
+import json
+import hashlib
+import threading
+from core.database import db, RENTAL_REQUESTS_FILE, KYC_REQUESTS_FILE, RENTALS_FILE
+
+# Badge counts for the dashboard sidebar (pending requests, pending KYC,
+# active rentals), kept up to date through db listeners instead of counting
+# whole tables per request.
+#
+# The ETag is a hash of the counts, so every worker process hands out the
+# same one for the same numbers. The dashboard gets them on its /api/events
+# stream, which sends a snapshot() whenever the ETag changes. wait() lets
+# /api/counters long-poll (briefly, see api/counters.py): it
+# wakes up right away for changes made in this process and re-checks the
+# files every check_interval seconds for changes made by others (the bot).
+
+COUNTED = {
+    'requests': (RENTAL_REQUESTS_FILE, 'pending'),
+    'kyc': (KYC_REQUESTS_FILE, 'pending'),
+    'active_rentals': (RENTALS_FILE, 'active')
+}
+
+class Counters:
+    def __init__(self, database, check_interval=1.0):
+        self.db = database
+        self.check_interval = check_interval
+        self._cond = threading.Condition()
+        self._counted = {name: set() for name in COUNTED}   # name -> keys in the counted status
+        self._ready = set()
+        for name, (filename, status) in COUNTED.items():
+            database.add_listener(filename, self._listener(name, status))
+
+    def _listener(self, name, status):
+        def on_change(data, rows):
+            with self._cond:
+                counted = self._counted[name]
+                before = len(counted)
+                if rows is None:
+                    self._counted[name] = counted = {k for k, r in data.items()
+                                                     if isinstance(r, dict) and r.get('status') == status}
+                    self._ready.add(name)
+                else:
+                    for key, row in rows.items():
+                        if row is not None and row.get('status') == status:
+                            counted.add(key)
+                        else:
+                            counted.discard(key)
+                if len(counted) != before:
+                    self._cond.notify_all()
+        return on_change
+
+    def _sync(self):
+        # load() re-reads tables changed on disk, which runs the listeners
+        for name, (filename, _) in COUNTED.items():
+            data = self.db.load(filename, copy_data=False)
+            if name not in self._ready:
+                self._listener(name, COUNTED[name][1])(data, None)
+
+    def snapshot(self):
+        """(counts, etag)"""
+        self._sync()
+        with self._cond:
+            counts = {name: len(keys) for name, keys in self._counted.items()}
+        raw = json.dumps(counts, sort_keys=True).encode()
+        return counts, hashlib.md5(raw).hexdigest()[:16]
+
+    def wait(self, etag, timeout):
+        """Block until the counts no longer match etag (or timeout); returns snapshot()"""
+        counts, current = self.snapshot()
+        remaining = timeout
+        while current == etag and remaining > 0:
+            step = min(self.check_interval, remaining)
+            with self._cond:
+                self._cond.wait(step)
+            remaining -= step
+            counts, current = self.snapshot()
+        return counts, current
+
+counters = Counters(db)
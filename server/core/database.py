@@ -1,7 +1,68 @@
 import os
-import json
+import copy
+import time
+import atexit
+from contextlib import contextmanager, ExitStack
 from datetime import datetime
 import threading
+from core.storage import create_backend, TransactionConflict
+
+WRITE_RETRIES = 5
+_MISSING = object()
+
+
+def _merge_row(current, base, row):
+    """Our change of one record (base -> row) redone on the record another
+    process left behind (current): only the fields we changed are taken."""
+    if base is None:
+        return row          # we created it
+    if current is None or row is None:
+        return None         # deleted meanwhile (not brought back), or by us
+    if not isinstance(current, dict) or not isinstance(base, dict) or not isinstance(row, dict):
+        return row
+    merged = dict(current)
+    for field, value in row.items():
+        if base.get(field, _MISSING) != value:
+            merged[field] = value
+    for field in base:
+        if field not in row:
+            merged.pop(field, None)
+    return merged
+
+
+class Transaction:
+    """Reads and staged writes of one db.transaction() block"""
+
+    def __init__(self, database, signatures):
+        self.db = database
+        self.signatures = signatures    # filename -> storage signature the reads are based on
+        self.filenames = set(signatures)
+        self.rows = {}                  # filename -> {key: record or None}
+
+    def _check(self, filename):
+        if filename not in self.filenames:
+            raise ValueError(f"{filename} is not part of this transaction")
+
+    def get(self, filename, key, default=None):
+        """Record as this transaction sees it (its own staged writes included)"""
+        self._check(filename)
+        staged = self.rows.get(filename, {})
+        if key in staged:
+            return default if staged[key] is None else staged[key]
+        return self.db.get(filename, key, default)
+
+    def table(self, filename):
+        """Committed table (shared, don't modify); staged writes aren't in it"""
+        self._check(filename)
+        return self.db.load(filename, copy_data=False)
+
+    def put(self, filename, key, row):
+        self._check(filename)
+        self.rows.setdefault(filename, {})[key] = row
+
+    def delete(self, filename, key):
+        self.put(filename, key, None)
+
 
 class Database:
     _instance = None
@@ -19,22 +80,406 @@ class Database:
         self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
+
+        # JSON files by default, SQLite with DB_BACKEND=sqlite (see core/storage.py)
+        json_indent = None if os.environ.get('DB_COMPACT_JSON', '0') == '1' else 2
+        self.backend = create_backend(self.data_dir, json_indent)
+
+        # Parsed tables are kept in memory and served again until the file
+        # changes on disk (mtime/size) or this process writes it.
+        # filename -> [data, signature, last_checked]
+        self._cache = {}
+        self._file_locks = {}
+        # Hand out deep copies so handlers can't mutate the shared state
+        self.copy_on_read = os.environ.get('DB_COPY_ON_READ', '0') == '1'
+        # How often (seconds) a cached table re-checks its file on disk
+        self.stat_interval = float(os.environ.get('DB_STAT_INTERVAL', '0.5'))
+        self.hits = 0
+        self.misses = 0
+
+        # Saves are written to a temp file and renamed over the table.
+        # With DB_WRITE_DELAY > 0 (or inside db.batch()) repeated saves of the
+        # same table are coalesced into one write; the cache is updated
+        # immediately so readers in this process never see stale data.
+        # Every write first checks that the table is still as this process
+        # last read it: put()/delete() redo the fields they changed on top of
+        # another process's changes, a whole-table save() raises
+        # TransactionConflict. Read-modify-writes of a record that others
+        # write too belong in update() or run_transaction().
+        self.write_delay = float(os.environ.get('DB_WRITE_DELAY', '0'))
+        # filename -> [data, rows, bases]; rows is None for a whole-table
+        # write, otherwise {key: record or None} changed through put()/delete(),
+        # and bases {key: record before the first of those changes}
+        self._pending = {}
+        self._flush_timer = None
+        self._local = threading.local()
+        self.writes = 0
+        # filename -> [callback(data, rows)]; rows is None when the whole
+        # table was replaced (save() or a reload from disk)
+        self._listeners = {}
+        # filename -> counter bumped on every change (see version())
+        self._versions = {}
+        atexit.register(self.flush)
         self._initialized = True
 
     def _get_path(self, filename):
         return os.path.join(self.data_dir, filename)
 
-    def load(self, filename):
-        path = self._get_path(filename)
-        if os.path.exists(path):
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+    def _file_lock(self, filename):
+        lock = self._file_locks.get(filename)
+        if lock is None:
+            with self._lock:
+                lock = self._file_locks.setdefault(filename, threading.RLock())
+        return lock
+
+    def _refresh(self, filename, now):
+        with self._file_lock(filename):
+            entry = self._cache.get(filename)
+            if entry is not None and filename in self._pending:
+                # Our own unflushed write is newer than whatever is on disk
+                entry[2] = now
+                self.hits += 1
+                return entry[0]
+
+            signature = self.backend.signature(filename)
+            if entry is not None and entry[1] == signature:
+                entry[2] = now
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            data = self.backend.read_table(filename) if signature is not None else {}
+            self._cache[filename] = [data, signature, now]
+            self._notify(filename, data)
+            return data
+
+    def load(self, filename, copy_data=None):
+        now = time.monotonic()
+        entry = self._cache.get(filename)
+        if entry is not None and now - entry[2] < self.stat_interval:
+            self.hits += 1
+            data = entry[0]
+        else:
+            data = self._refresh(filename, now)
+
+        if copy_data or (copy_data is None and self.copy_on_read):
+            return copy.deepcopy(data)
+        return data
+
+    def refresh(self, filename):
+        """Check filename on disk now, not only after stat_interval; re-reads
+        it (and tells the listeners) if another process changed it"""
+        self._refresh(filename, time.monotonic())
+
+    def _deferred(self):
+        return getattr(self._local, 'batch', None) is not None or self.write_delay > 0
+
+    def _defer(self, filename):
+        batch = getattr(self._local, 'batch', None)
+        if batch is not None:
+            batch.add(filename)
+        else:
+            self._schedule_flush()
+
+    def _write(self, filename, data, rows=None, bases=None):
+        """Write data (or just rows) -> (data, signature, reloaded).
+
+        The table must still be as we last read it: another process may have
+        written it in the meantime (our cache is up to stat_interval old).
+        Row writes then re-read the table and redo, on each record as it is
+        now, only the fields they changed from bases (reloaded is True and
+        data is the merged table); a whole-table write raises
+        TransactionConflict instead of overwriting.
+        """
+        reloaded = False
+        bases = bases or {}
+        for _ in range(WRITE_RETRIES):
+            entry = self._cache.get(filename)
+            expected = {filename: entry[1]} if entry is not None else {}
+            try:
+                signature = self.backend.write_tables({filename: (data, rows)}, expected)[filename]
+                self.writes += 1
+                return data, signature, reloaded
+            except TransactionConflict:
+                if rows is None:
+                    self._cache.pop(filename, None)
+                    print(f"❌ {filename} was changed by another process, not overwriting it")
+                    raise
+            # Take the other process's version and redo our changes on top of it
+            signature = self.backend.signature(filename)
+            data = self.backend.read_table(filename) if signature is not None else {}
+            rows = {key: _merge_row(data.get(key), bases.get(key, data.get(key)), row)
+                    for key, row in rows.items()}
+            # The merged rows are now based on what is stored
+            bases = {key: data.get(key) for key in rows}
+            for key, row in rows.items():
+                if row is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = copy.deepcopy(row) if self.copy_on_read else row
+            self._cache[filename] = [data, signature, time.monotonic()]
+            reloaded = True
+        raise TransactionConflict(filename)
 
     def save(self, filename, data):
-        path = self._get_path(filename)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with self._file_lock(filename):
+            if self.copy_on_read:
+                data = copy.deepcopy(data)
+
+            if self._deferred():
+                entry = self._cache.get(filename)
+                signature = entry[1] if entry else None
+                self._cache[filename] = [data, signature, time.monotonic()]
+                self._pending[filename] = [data, None, None]
+                self._defer(filename)
+            else:
+                self._pending.pop(filename, None)
+                _, signature, _ = self._write(filename, data)
+                self._cache[filename] = [data, signature, time.monotonic()]
+            self._notify(filename, data)
+
+    def get(self, filename, key, default=None):
+        """Single record by key"""
+        row = self.load(filename, copy_data=False).get(key, default)
+        if row is not default and self.copy_on_read:
+            return copy.deepcopy(row)
+        return row
+
+    def put(self, filename, key, row):
+        """Insert or replace one record. Backends with row support write only that row."""
+        self._put_rows(filename, {key: row})
+
+    def delete(self, filename, key):
+        self._put_rows(filename, {key: None})
+
+    def update(self, filename, key, fields):
+        """Set fields on the record as it is stored right now -> the new record,
+        or None if there is none. Other fields, even if another process just
+        changed them, are left alone."""
+        def update(tx):
+            row = tx.get(filename, key)
+            if row is None:
+                return None
+            row = {**row, **fields}
+            tx.put(filename, key, row)
+            return row
+        return self.run_transaction(update, filename)
+
+    def _put_rows(self, filename, rows):
+        with self._file_lock(filename):
+            # Copy on write: readers may still be iterating the dict load() gave them
+            current = self.load(filename, copy_data=False)
+            bases = {key: current.get(key) for key in rows}
+            data = dict(current)
+            for key, row in rows.items():
+                if row is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = copy.deepcopy(row) if self.copy_on_read else row
+
+            if self._deferred():
+                entry = self._cache.get(filename)
+                self._cache[filename] = [data, entry[1] if entry else None, time.monotonic()]
+                pending = self._pending.get(filename)
+                if pending is None:
+                    self._pending[filename] = [data, dict(rows), bases]
+                else:
+                    pending[0] = data
+                    if pending[1] is not None:
+                        pending[1].update(rows)
+                        for key, base in bases.items():
+                            pending[2].setdefault(key, base)
+                self._defer(filename)
+            else:
+                write_rows = rows
+                pending = self._pending.pop(filename, None)
+                if pending is not None:
+                    # Fold in whatever was still waiting for a flush
+                    write_rows = None if pending[1] is None else {**pending[1], **rows}
+                    bases = None if pending[1] is None else {**bases, **pending[2]}
+                data, signature, reloaded = self._write(filename, data, write_rows, bases)
+                self._cache[filename] = [data, signature, time.monotonic()]
+                if reloaded:
+                    rows = None     # listeners must pick up the other process's changes too
+            self._notify(filename, data, rows)
+
+    def add_listener(self, filename, callback):
+        """Call callback(data, rows) after every change to filename"""
+        with self._lock:
+            self._listeners.setdefault(filename, []).append(callback)
+
+    def _notify(self, filename, data, rows=None):
+        self._versions[filename] = self._versions.get(filename, 0) + 1
+        for callback in self._listeners.get(filename, ()):
+            try:
+                callback(data, rows)
+            except Exception as e:
+                print(f"❌ DB listener error for {filename}: {e}")
+
+    def version(self, filename):
+        """Counter that goes up whenever filename changes (here or on disk).
+
+        Only meaningful within this process.
+        """
+        self.load(filename, copy_data=False)
+        return self._versions.get(filename, 0)
+
+    def iter_rows(self, filename):
+        """Stream (key, record) pairs straight from storage, bypassing the cache"""
+        self.flush([filename])
+        return self.backend.iter_rows(filename)
+
+    def query(self, filename, **filters):
+        """Records whose fields equal all of the given filters"""
+        if self.backend.supports_rows and filename not in self._cache:
+            self.flush([filename])
+            rows = self.backend.query(filename, filters)
+            if rows is not None:
+                return rows
+
+        data = self.load(filename, copy_data=False)
+        rows = [r for r in data.values()
+                if isinstance(r, dict) and all(r.get(k) == v for k, v in filters.items())]
+        return copy.deepcopy(rows) if self.copy_on_read else rows
+
+    def _schedule_flush(self):
+        with self._lock:
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.write_delay, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def flush(self, filenames=None):
+        """Write out pending (coalesced) saves"""
+        with self._lock:
+            if filenames is None:
+                self._flush_timer = None
+                filenames = list(self._pending)
+
+        conflict = None
+        for filename in filenames:
+            with self._file_lock(filename):
+                if filename not in self._pending:
+                    continue
+                data, rows, bases = self._pending.pop(filename)
+                try:
+                    written, signature, reloaded = self._write(filename, data, rows, bases)
+                except TransactionConflict as e:
+                    conflict = e
+                    continue
+                entry = self._cache.get(filename)
+                if reloaded:
+                    self._cache[filename] = [written, signature, time.monotonic()]
+                    self._notify(filename, written)
+                elif entry is not None and entry[0] is data:
+                    entry[1] = signature
+        if conflict is not None:
+            raise conflict
+
+    @contextmanager
+    def batch(self):
+        """Collapse every save() made inside the block into one write per table"""
+        if getattr(self._local, 'batch', None) is not None:
+            yield
+            return
+
+        self._local.batch = set()
+        try:
+            yield
+        finally:
+            filenames = self._local.batch
+            self._local.batch = None
+            self.flush(filenames)
+
+    @contextmanager
+    def locked(self, *filenames):
+        """Hold the write locks of several tables for a read-modify-write.
+
+        Locks are taken in name order, so two callers can't deadlock.
+        """
+        with ExitStack() as stack:
+            for filename in sorted(set(filenames)):
+                stack.enter_context(self._file_lock(filename))
+            yield
+
+    @contextmanager
+    def transaction(self, *filenames):
+        """Read-check-write over several tables, committed all together or not at all.
+
+            with db.transaction(CONSOLES_FILE, RENTALS_FILE) as tx:
+                console = tx.get(CONSOLES_FILE, console_id)
+                tx.put(CONSOLES_FILE, console_id, {**console, 'status': 'rented'})
+
+        Other threads of this process wait on the table locks. If another
+        process wrote one of the tables meanwhile, nothing is written and
+        TransactionConflict is raised; run_transaction() retries for you.
+        """
+        with self.locked(*filenames):
+            # Start from what is in storage right now
+            self.flush(filenames)
+            now = time.monotonic()
+            for filename in filenames:
+                self._refresh(filename, now)
+            tx = Transaction(self, {f: self._cache[f][1] for f in filenames})
+            yield tx
+            self._commit(tx)
+
+    def _commit(self, tx):
+        if not tx.rows:
+            return
+        writes = {}
+        for filename, rows in tx.rows.items():
+            data = dict(self.load(filename, copy_data=False))
+            for key, row in rows.items():
+                if row is None:
+                    data.pop(key, None)
+                else:
+                    data[key] = copy.deepcopy(row) if self.copy_on_read else row
+            writes[filename] = (data, rows)
+        try:
+            signatures = self.backend.write_tables(writes, tx.signatures)
+        except TransactionConflict:
+            for filename in tx.filenames:
+                self._cache.pop(filename, None)
+            raise
+        self.writes += len(writes)
+        now = time.monotonic()
+        for filename, (data, rows) in writes.items():
+            self._cache[filename] = [data, signatures[filename], now]
+            self._notify(filename, data, rows)
+
+    def run_transaction(self, fn, *filenames, retries=3):
+        """fn(tx) inside transaction(*filenames), retried on TransactionConflict"""
+        for attempt in range(retries + 1):
+            try:
+                with self.transaction(*filenames) as tx:
+                    return fn(tx)
+            except TransactionConflict as e:
+                if attempt == retries:
+                    raise
+                print(f"🔁 Transaction conflict on {e}, retrying...")
+                time.sleep(0.05 * (attempt + 1))
+
+    def invalidate(self, filename=None):
+        """Drop cached tables so the next load re-reads them from disk"""
+        self.flush(None if filename is None else [filename])
+        with self._lock:
+            if filename is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(filename, None)
+
+    def cache_stats(self):
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0,
+            'cached_tables': len(self._cache),
+            'writes': self.writes,
+            'pending_writes': len(self._pending)
+        }
 
 db = Database()
 
@@ -48,3 +493,9 @@ SETTINGS_FILE = 'admin_settings.json'
 RATINGS_FILE = 'ratings.json'
 ADMIN_USERS_FILE = 'admin_users.json'
 KYC_REQUESTS_FILE = 'kyc_requests.json'
+ROLLUPS_FILE = 'revenue_rollups.json'
+OUTBOX_FILE = 'notification_outbox.json'
+BROADCASTS_FILE = 'broadcasts.json'
+SESSIONS_FILE = 'admin_sessions.json'
+ADMIN_ACTIVITY_FILE = 'admin_activity_rollups.json'
+ARCHIVE_INDEX_FILE = 'archive_index.json'
@@ -0,0 +1,263 @@
+import os
+import json
+import queue
+import secrets
+import threading
+import time
+from collections import deque
+from core.database import db
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# In-process pub/sub for dashboard change events (served by /api/events).
+#
+# Handlers call event_hub.publish() after their writes are committed. Each
+# SSE client gets its own bounded queue; a client that falls too far behind
+# is told to resync instead of slowing everyone else down. A ring buffer of
+# recent events lets reconnecting clients resume from Last-Event-ID.
+#
+# With several processes (WSGI workers plus the separate bot process, see
+# wsgi.py and bot/runner.py) EVENTS_SHARED=1 makes publish() append to
+# data/events.log instead; every process tails that file and dispatches to its
+# own clients.
+#
+# Event ids are "<epoch>-<n>". In one process the epoch is picked at start and
+# n counts up; with the shared log the epoch is written in the log's first
+# line and n is the byte offset, the same in every process. A full log is
+# replaced by a new one with a new epoch, never truncated, so an id from an
+# older log (or an older process) can't match a newer event; a client whose
+# Last-Event-ID isn't in the recent history gets a resync.
+#
+# Every stream holds a server thread, so at most max_clients subscribe per
+# process (EVENTS_MAX_CLIENTS); subscribe() returns None beyond that.
+
+class Subscription:
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class EventHub:
+    def __init__(self, history_size=500, queue_size=100, log_path=None, poll_interval=0.25, max_log_size=5 * 1024 * 1024,
+                 max_clients=None):
+        self._lock = threading.Lock()
+        self.epoch = secrets.token_hex(4)
+        self._seq = 0
+        self._last_id = None
+        self._history = deque(maxlen=history_size)
+        self._subscribers = set()
+        self._listeners = []
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.published = 0
+        self.dropped_clients = 0
+        self.rejected_clients = 0
+        self.log_path = log_path
+        self.poll_interval = poll_interval
+        self.max_log_size = max_log_size
+        self._tail_thread = None
+
+    def publish(self, event_type, data=None):
+        event = {'type': event_type, 'data': data or {}, 'time': time.time()}
+        if self.log_path:
+            self._append(event)
+            return event
+        with self._lock:
+            self._seq += 1
+            event['id'] = f"{self.epoch}-{self._seq}"
+        self._deliver(event)
+        return event
+
+    def _deliver(self, event):
+        with self._lock:
+            self._last_id = event['id']
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+            self.published += 1
+
+        for sub in subscribers:
+            if sub.overflowed:
+                continue
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                sub.overflowed = True
+                self.dropped_clients += 1
+
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"❌ Event listener error for {event['type']}: {e}")
+
+    def add_listener(self, callback):
+        """Call callback(event) for every event, from any process with the
+        shared log (on the tail thread, so keep it short)"""
+        self._listeners.append(callback)
+        self._ensure_tail()
+
+    # --- shared log (multi-process) ---
+
+    def _append(self, event):
+        line = (json.dumps(event, ensure_ascii=False, separators=(',', ':')) + '\n').encode('utf-8')
+        try:
+            st = os.stat(self.log_path)
+            if st.st_size > self.max_log_size:
+                self._new_log(st.st_ino)
+        except FileNotFoundError:
+            self._new_log(None)
+        # O_APPEND keeps concurrent single-line writes from different processes intact
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def _new_log(self, inode):
+        """Replace the log (inode, or None if there is none) by an empty one
+        with a new epoch, unless another process already did"""
+        with open(self.log_path + '.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                current = os.stat(self.log_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != inode:
+                return
+            tmp_path = f"{self.log_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write((json.dumps({'epoch': secrets.token_hex(4)}) + '\n').encode())
+            os.replace(tmp_path, self.log_path)
+
+    def _open_log(self):
+        """(file, epoch) of the current log, positioned after its epoch line"""
+        while True:
+            try:
+                f = open(self.log_path, 'rb')
+            except FileNotFoundError:
+                self._new_log(None)
+                continue
+            try:
+                epoch = json.loads(f.readline())['epoch']
+            except (ValueError, KeyError, TypeError):
+                # Written before logs had an epoch line
+                inode = os.fstat(f.fileno()).st_ino
+                f.close()
+                self._new_log(inode)
+                continue
+            return f, epoch
+
+    def _ensure_tail(self):
+        if not self.log_path or self._tail_thread:
+            return
+        with self._lock:
+            if self._tail_thread:
+                return
+            f, epoch = self._open_log()
+            f.seek(0, os.SEEK_END)
+            self._last_id = f"{epoch}-{f.tell()}"
+            self._tail_thread = threading.Thread(target=self._tail, args=(f, epoch), daemon=True)
+            self._tail_thread.start()
+
+    def _tail(self, f, epoch):
+        offset, pending = f.tell(), b''
+        while True:
+            time.sleep(self.poll_interval)
+            chunk = f.read()
+            if not chunk:
+                try:
+                    replaced = os.stat(self.log_path).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    replaced = True
+                if replaced:
+                    # Lines that made it into the old log before the switch
+                    chunk = f.read()
+                    self._dispatch(pending + chunk, offset, epoch)
+                    f.close()
+                    f, epoch = self._open_log()
+                    offset, pending = f.tell(), b''
+                continue
+            pending += chunk
+            end = pending.rfind(b'\n')
+            if end < 0:
+                continue  # a line is still being written
+            offset = self._dispatch(pending[:end + 1], offset, epoch)
+            pending = pending[end + 1:]
+
+    def _dispatch(self, data, offset, epoch):
+        for line in data.splitlines(keepends=True):
+            offset += len(line)
+            if not line.endswith(b'\n'):
+                break
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            event['id'] = f"{epoch}-{offset}"
+            self._deliver(event)
+        return offset
+
+    def subscribe(self, last_event_id=None):
+        """New subscription, or None if max_clients are connected already.
+
+        Replays missed events when last_event_id is given; if it isn't in the
+        history (another epoch, or too long ago) the subscription starts
+        overflowed, so the client resyncs.
+        """
+        self._ensure_tail()
+        sub = Subscription(self.queue_size)
+        with self._lock:
+            if self.max_clients and len(self._subscribers) >= self.max_clients:
+                self.rejected_clients += 1
+                return None
+            if last_event_id and last_event_id != self._last_id:
+                ids = [e['id'] for e in self._history]
+                if last_event_id not in ids:
+                    sub.overflowed = True
+                else:
+                    missed = list(self._history)[ids.index(last_event_id) + 1:]
+                    if len(missed) > self.queue_size:
+                        sub.overflowed = True
+                    else:
+                        for event in missed:
+                            sub.queue.put_nowait(event)
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._subscribers),
+                'max_clients': self.max_clients,
+                'last_event_id': self._last_id,
+                'published': self.published,
+                'dropped_clients': self.dropped_clients,
+                'rejected_clients': self.rejected_clients,
+                'shared': bool(self.log_path)
+            }
+
+
+def format_sse(event):
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+
+def _shared_log_path():
+    if os.environ.get('EVENTS_SHARED') != '1':
+        return None
+    return os.environ.get('EVENTS_LOG', os.path.join(db.data_dir, 'events.log'))
+
+# Each stream holds a server thread: keep this well below WEB_THREADS
+event_hub = EventHub(log_path=_shared_log_path(), max_clients=int(os.environ.get('EVENTS_MAX_CLIENTS', 8)))
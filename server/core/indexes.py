@@ -0,0 +1,197 @@
+import copy
+import threading
+from bisect import bisect_left, insort
+from core.database import db, RENTALS_FILE, USERS_FILE
+
+class RentalIndex:
+    """Secondary indexes over rentals, kept in sync through db listeners.
+
+    Single-row writes (db.put) update the index in O(1); whole-table saves
+    only touch the rentals whose console/user/status actually changed.
+    """
+
+    def __init__(self, database):
+        self.db = database
+        self._lock = threading.RLock()
+        self._ready = False
+        self._entries = {}            # rental id -> (console_id, user_id, status)
+        self.by_console = {}          # console_id -> {rental ids}
+        self.by_user = {}             # user_id -> {rental ids}
+        self.by_status = {}           # status -> {rental ids}
+        self.active_by_console = {}   # console_id -> rental id
+        database.add_listener(RENTALS_FILE, self._on_change)
+
+    def _on_change(self, data, rows):
+        with self._lock:
+            if rows is None:
+                self._sync(data)
+            elif self._ready:
+                for key, row in rows.items():
+                    self._update(key, row)
+
+    def _sync(self, data):
+        for key in [k for k in self._entries if k not in data]:
+            self._update(key, None)
+        for key, row in data.items():
+            self._update(key, row)
+        self._ready = True
+
+    def _update(self, key, row):
+        old = self._entries.get(key)
+        new = None
+        if row is not None:
+            new = (row.get('console_id'), str(row.get('user_id')), row.get('status'))
+        if old == new:
+            return
+
+        if old is not None:
+            console_id, user_id, status = old
+            self.by_console[console_id].discard(key)
+            self.by_user[user_id].discard(key)
+            self.by_status[status].discard(key)
+            if status == 'active' and self.active_by_console.get(console_id) == key:
+                del self.active_by_console[console_id]
+            del self._entries[key]
+
+        if new is not None:
+            console_id, user_id, status = new
+            self.by_console.setdefault(console_id, set()).add(key)
+            self.by_user.setdefault(user_id, set()).add(key)
+            self.by_status.setdefault(status, set()).add(key)
+            if status == 'active':
+                if console_id in self.active_by_console:
+                    print(f"⚠️ Console {console_id} has more than one active rental ({key})")
+                self.active_by_console[console_id] = key
+            self._entries[key] = new
+
+    def _rentals(self):
+        # load() re-reads the table if it changed on disk, which re-syncs us
+        rentals = self.db.load(RENTALS_FILE, copy_data=False)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._sync(rentals)
+        return rentals
+
+    def _rows(self, index, value):
+        rentals = self._rentals()
+        with self._lock:
+            rows = [rentals[k] for k in index.get(value, ()) if k in rentals]
+        return copy.deepcopy(rows) if self.db.copy_on_read else rows
+
+    def for_console(self, console_id):
+        return self._rows(self.by_console, console_id)
+
+    def for_user(self, user_id):
+        return self._rows(self.by_user, str(user_id))
+
+    def with_status(self, status):
+        return self._rows(self.by_status, status)
+
+    def candidate_keys(self, filters):
+        """Smallest indexed key set covering the console_id/user_id/status filters"""
+        self._rentals()
+        indexes = {'console_id': self.by_console, 'user_id': self.by_user, 'status': self.by_status}
+        best = None
+        with self._lock:
+            for field, value in filters.items():
+                if field in indexes:
+                    keys = indexes[field].get(value, set())
+                    if best is None or len(keys) < len(best):
+                        best = keys
+            return None if best is None else set(best)
+
+    def count_status(self, status):
+        self._rentals()
+        return len(self.by_status.get(status, ()))
+
+    def active_key(self, console_id):
+        """Id of the active rental on console_id, or None"""
+        self._rentals()
+        return self.active_by_console.get(console_id)
+
+    def active_for_console(self, console_id):
+        key = self.active_key(console_id)
+        if key is None:
+            return None
+        return self.db.get(RENTALS_FILE, key)
+
+
+class OrderedIndex:
+    """Keys of a table kept sorted by (field, key), used for cursor pagination"""
+
+    CHUNK = 256
+
+    def __init__(self, database, filename, field):
+        self.db = database
+        self.filename = filename
+        self.field = field
+        self._lock = threading.RLock()
+        self._ready = False
+        self._values = {}   # key -> field value
+        self._sorted = []   # [(value, key)] ascending
+        database.add_listener(filename, self._on_change)
+
+    def _on_change(self, data, rows):
+        with self._lock:
+            if rows is None:
+                self._sync(data)
+            elif self._ready:
+                for key, row in rows.items():
+                    self._update(key, row)
+
+    def _sync(self, data):
+        for key in [k for k in self._values if k not in data]:
+            self._update(key, None)
+        for key, row in data.items():
+            self._update(key, row)
+        self._ready = True
+
+    def _update(self, key, row):
+        old = self._values.get(key)
+        new = None
+        if isinstance(row, dict):
+            new = str(row.get(self.field) or '')
+        if old == new:
+            return
+
+        if old is not None:
+            i = bisect_left(self._sorted, (old, key))
+            if i < len(self._sorted) and self._sorted[i] == (old, key):
+                del self._sorted[i]
+            del self._values[key]
+        if new is not None:
+            insort(self._sorted, (new, key))
+            self._values[key] = new
+
+    def ensure(self):
+        data = self.db.load(self.filename, copy_data=False)
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._sync(data)
+        return data
+
+    def value(self, key):
+        return self._values.get(key, '')
+
+    def iter_desc(self, start=None, stop=None):
+        """(value, key) pairs newest first, strictly below start and not below stop"""
+        self.ensure()
+        cursor = start
+        while True:
+            # Copy a chunk at a time so writers aren't blocked while we page
+            with self._lock:
+                hi = len(self._sorted) if cursor is None else bisect_left(self._sorted, cursor)
+                chunk = self._sorted[max(0, hi - self.CHUNK):hi]
+            if not chunk:
+                return
+            for item in reversed(chunk):
+                if stop is not None and item < stop:
+                    return
+                yield item
+            cursor = chunk[0]
+
+rental_index = RentalIndex(db)
+rentals_by_start = OrderedIndex(db, RENTALS_FILE, 'start_time')
+users_by_joined = OrderedIndex(db, USERS_FILE, 'joined_at')
@@ -0,0 +1,76 @@
+import json
+import base64
+
+# Cursor pagination over core.indexes.OrderedIndex.
+#
+# A cursor is the (sort value, key) of the last item on the previous page,
+# so pages stay stable while new records are being added.
+
+MAX_LIMIT = 500
+
+def encode_cursor(item):
+    raw = json.dumps(list(item), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value, key = json.loads(raw)
+        return (str(value), str(key))
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def parse_limit(value):
+    """None (no pagination) when the client didn't ask for a page"""
+    if value in (None, ''):
+        return None
+    limit = int(value)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return min(limit, MAX_LIMIT)
+
+def parse_fields(value):
+    if not value:
+        return None
+    return [f.strip() for f in value.split(',') if f.strip()]
+
+def project(item, fields):
+    if not fields:
+        return item
+    return {f: item[f] for f in fields if f in item}
+
+def paginate(index, data, limit=None, cursor=None, date_from=None, date_to=None, filters=None, candidates=None):
+    """Newest-first keys from index matching filters -> (keys, next_cursor).
+
+    date_from/date_to are ISO prefixes compared against the sort field
+    (both inclusive). If candidates (a set of keys from a secondary index) is
+    given, only those are sorted instead of walking the whole ordered index.
+    """
+    filters = filters or {}
+    start = decode_cursor(cursor)
+    if date_to:
+        upper = (date_to + '\uffff', '')
+        start = upper if start is None else min(start, upper)
+    stop = (date_from, '') if date_from else None
+
+    if candidates is not None:
+        index.ensure()
+        items = sorted(((index.value(k), k) for k in candidates), reverse=True)
+        items = (i for i in items
+                 if (start is None or i < start) and (stop is None or i >= stop))
+    else:
+        items = index.iter_desc(start, stop)
+
+    keys = []
+    last = None
+    for item in items:
+        row = data.get(item[1])
+        if row is None or any(str(row.get(f)) != v for f, v in filters.items()):
+            continue
+        if limit is not None and len(keys) == limit:
+            return keys, encode_cursor(last)
+        keys.append(item[1])
+        last = item
+    return keys, None
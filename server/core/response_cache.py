@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import Response, make_response, request
+from core.database import db
+
+# Cached JSON responses for read endpoints.
+#
+# @response_cache.cached(TABLE, ...) stores the body of a GET response per
+# path + query string, together with the db.version() of every table it was
+# built from. As long as none of those tables changed, the stored body is
+# served again without running the view. The ETag is a hash of the body, so
+# it is the same in every worker process and a matching If-None-Match gets a
+# 304. Large bodies are compressed (gzip, or brotli if installed) once per
+# cached entry.
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+
+def _encoders():
+    encoders = []
+    if brotli is not None:
+        encoders.append(('br', lambda body: brotli.compress(body, quality=5)))
+    encoders.append(('gzip', lambda body: gzip.compress(body, compresslevel=6)))
+    return encoders
+
+class CachedBody:
+    def __init__(self, versions, body, mimetype):
+        self.versions = versions
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.encoded = {}   # encoding -> compressed body
+
+
+class ResponseCache:
+    def __init__(self, database, max_entries=256):
+        self.db = database
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # (view, path?query) -> CachedBody
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def cached(self, *tables):
+        """Decorator for views whose GET response depends only on tables"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                key = (view.__name__, request.full_path)
+                versions = tuple(self.db.version(t) for t in tables)
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if entry is not None and entry.versions == versions:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                    else:
+                        entry = None
+
+                if entry is None:
+                    self.misses += 1
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200 or response.direct_passthrough:
+                        return response
+                    # versions were read before the view ran, so a write
+                    # landing meanwhile makes the next request rebuild
+                    entry = CachedBody(versions, response.get_data(), response.mimetype)
+                    with self._lock:
+                        self._entries[key] = entry
+                        while len(self._entries) > self.max_entries:
+                            self._entries.popitem(last=False)
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+    def _respond(self, entry):
+        body, encoding = entry.body, None
+        if len(body) >= MIN_COMPRESS_SIZE:
+            accepted = request.headers.get('Accept-Encoding', '')
+            for name, encode in _encoders():
+                if name in accepted:
+                    if name not in entry.encoded:
+                        entry.encoded[name] = encode(entry.body)
+                    body, encoding = entry.encoded[name], name
+                    break
+
+        etag = f"{entry.etag}-{encoding}" if encoding else entry.etag
+        headers = {
+            'ETag': f'"{etag}"',
+            'Cache-Control': 'no-cache',
+            'Vary': 'Accept-Encoding',
+            'Access-Control-Expose-Headers': 'ETag'
+        }
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            return Response(status=304, headers=headers)
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return Response(body, mimetype=entry.mimetype, headers=headers)
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hit_rate': round(self.hits / total, 3) if total else None,
+            'not_modified': self.not_modified
+        }
+
+response_cache = ResponseCache(db)
@@ -0,0 +1,268 @@
+import time
+import threading
+from datetime import datetime
+from core.database import db, RENTALS_FILE, ROLLUPS_FILE
+from core.archive import archive
+
+# Pre-aggregated revenue buckets for the finance page.
+#
+# Revenue is booked when a rental completes, into hour/day/month buckets for
+# the whole club ('all'), per console ('console:<id>') and per discount
+# applied from discounts.json ('discount:<percent>' or 'discount:none').
+# Buckets are persisted in ROLLUPS_FILE as "granularity|period|dimension".
+# Rentals leave the hot table only when core.archive moves them to cold
+# storage, so a removed row keeps its revenue in the buckets.
+#
+# The buckets are maintained by one process only, the bot runner (start()):
+# it backfills on start and books every rental change. All other processes
+# (the web workers) only read ROLLUPS_FILE, re-reading it when it changes.
+# The owner checks the RENTALS_FILE signature itself every CHECK_INTERVAL,
+# so rentals written by the web workers reach its listener even when nothing
+# else in the bot process reads the table. A backfill asked for through the
+# API is a request row that the owner picks up on the same tick.
+
+GRANULARITIES = {'hour': 13, 'day': 10, 'month': 7}  # ISO prefix length
+BACKFILL_DONE_KEY = 'meta|backfill|done'
+BACKFILL_REQUEST_KEY = 'meta|backfill|requested'
+CHECK_INTERVAL = 5.0    # how often the owner looks for rental changes and backfill requests
+
+class RevenueRollups:
+    def __init__(self, database):
+        self.db = database
+        self._lock = threading.RLock()
+        # granularity -> dimension -> period -> [revenue, rentals, hours]
+        self._buckets = {g: {} for g in GRANULARITIES}
+        self._contrib = {}      # rental id -> (end_time, console_id, discount, cost, hours)
+        self._version = None    # ROLLUPS_FILE version the buckets were read from
+        self.ready = False      # buckets are backfilled and no backfill is pending
+        self.owner = False      # this process maintains the buckets (see start())
+        self._thread = None
+        self._backfilled_at = None
+        self._backfilling = False
+        self._backlog = {}      # rental changes seen while a backfill is streaming
+        self._dirty = set()
+        database.add_listener(RENTALS_FILE, self._on_change)
+
+    def _contribution(self, row):
+        if not isinstance(row, dict) or row.get('status') != 'completed' or not row.get('end_time'):
+            return None
+        hours = 0
+        try:
+            duration = datetime.fromisoformat(row['end_time']) - datetime.fromisoformat(row['start_time'])
+            hours = round(duration.total_seconds() / 3600, 2)
+        except (KeyError, TypeError, ValueError):
+            pass
+        discount = row.get('discount_percent') or 0
+        return (
+            row['end_time'],
+            row.get('console_id'),
+            f"discount:{discount}" if discount else 'discount:none',
+            row.get('total_cost', 0) or 0,
+            hours
+        )
+
+    def _apply(self, buckets, contrib, sign):
+        end_time, console_id, discount, cost, hours = contrib
+        for granularity, size in GRANULARITIES.items():
+            period = end_time[:size]
+            for dimension in ('all', f"console:{console_id}", discount):
+                bucket = buckets[granularity].setdefault(dimension, {}).setdefault(period, [0, 0, 0])
+                bucket[0] += sign * cost
+                bucket[1] += sign
+                bucket[2] += sign * hours
+                self._dirty.add((granularity, period, dimension))
+
+    def _update(self, key, row, buckets=None, contribs=None):
+        buckets = self._buckets if buckets is None else buckets
+        contribs = self._contrib if contribs is None else contribs
+        old = contribs.get(key)
+        if row is None:
+            contribs.pop(key, None)     # archived, still booked
+            return
+        new = self._contribution(row)
+        if old == new:
+            return
+        if old is not None:
+            self._apply(buckets, old, -1)
+            del contribs[key]
+        if new is not None:
+            self._apply(buckets, new, 1)
+            contribs[key] = new
+
+    def _on_change(self, data, rows):
+        if not self.owner:
+            return
+        with self._lock:
+            if self._backfilling:
+                if rows is None:
+                    self._backlog = dict(data)
+                else:
+                    self._backlog.update(rows)
+                return
+            if not self._backfilled_at:
+                return
+            if rows is None:
+                for key in [k for k in self._contrib if k not in data]:
+                    self._update(key, None)
+                for key, row in data.items():
+                    self._update(key, row)
+            else:
+                for key, row in rows.items():
+                    self._update(key, row)
+            self._persist()
+
+    def _persist(self, full=False, done=None):
+        if full:
+            table = {}
+            for granularity, dims in self._buckets.items():
+                for dimension, periods in dims.items():
+                    for period, bucket in periods.items():
+                        table[f"{granularity}|{period}|{dimension}"] = self._row(bucket)
+            table[BACKFILL_DONE_KEY] = done
+
+            def replace(tx):
+                # Row by row, so a backfill request put meanwhile survives
+                current = tx.table(ROLLUPS_FILE)
+                for key in current:
+                    if key not in table and not key.startswith('meta|'):
+                        tx.delete(ROLLUPS_FILE, key)
+                for key, row in table.items():
+                    if current.get(key) != row:
+                        tx.put(ROLLUPS_FILE, key, row)
+            self.db.run_transaction(replace, ROLLUPS_FILE)
+        else:
+            with self.db.batch():
+                for granularity, period, dimension in self._dirty:
+                    bucket = self._buckets[granularity].get(dimension, {}).get(period)
+                    self.db.put(ROLLUPS_FILE, f"{granularity}|{period}|{dimension}", self._row(bucket) if bucket else None)
+        self._dirty.clear()
+
+    def _row(self, bucket):
+        return {'revenue': round(bucket[0], 2), 'rentals': bucket[1], 'hours': round(bucket[2], 2)}
+
+    def _load_persisted(self):
+        """Read the buckets from ROLLUPS_FILE if it changed (non-owners, and
+        the owner until its first backfill is done)"""
+        if self.owner and self._backfilled_at:
+            return
+        version = self.db.version(ROLLUPS_FILE)
+        if version == self._version:
+            return
+        table = self.db.load(ROLLUPS_FILE, copy_data=False)
+        buckets = {g: {} for g in GRANULARITIES}
+        for key, row in table.items():
+            granularity, period, dimension = key.split('|', 2)
+            if granularity in buckets:
+                buckets[granularity].setdefault(dimension, {})[period] = [
+                    row.get('revenue', 0), row.get('rentals', 0), row.get('hours', 0)
+                ]
+        done = table.get(BACKFILL_DONE_KEY)
+        requested = table.get(BACKFILL_REQUEST_KEY)
+        with self._lock:
+            if self.owner and self._backfilled_at:
+                return
+            self._buckets = buckets
+            self._version = version
+            self.ready = bool(done) and (not requested or requested['at'] <= done['started'])
+
+    def request_backfill(self):
+        """Ask the owner process to rebuild the buckets"""
+        self.db.put(ROLLUPS_FILE, BACKFILL_REQUEST_KEY, {'at': datetime.now().isoformat()})
+        self.ready = False
+
+    def backfill(self):
+        """Rebuild every bucket by streaming the archived and hot rentals row by row"""
+        with self._lock:
+            if self._backfilling:
+                return False
+            self._backfilling = True
+            self._backlog = {}
+        started = datetime.now().isoformat()
+
+        # Build into fresh structures so queries keep seeing the old buckets
+        buckets = {g: {} for g in GRANULARITIES}
+        contribs = {}
+        print("📊 Revenue rollups backfill started...")
+        count = 0
+        try:
+            for key, row in archive.iter_rows(RENTALS_FILE):
+                self._update(key, row, buckets, contribs)
+                count += 1
+            # Cold contributions stay in the buckets but aren't tracked per row
+            contribs.clear()
+            for key, row in self.db.iter_rows(RENTALS_FILE):
+                self._update(key, row, buckets, contribs)
+                count += 1
+        finally:
+            with self._lock:
+                # Apply whatever changed while we were streaming
+                for key, row in self._backlog.items():
+                    self._update(key, row, buckets, contribs)
+                self._buckets = buckets
+                self._contrib = contribs
+                self._backlog = {}
+                self._backfilling = False
+                self._backfilled_at = started
+                self.ready = True
+                self._persist(full=True, done={'started': started, 'rentals': count})
+        print(f"📊 Revenue rollups backfill done ({count} rentals)")
+        return True
+
+    # --- owner ---
+
+    def start(self):
+        """Maintain the buckets in this process (the bot runner)"""
+        with self._lock:
+            if self._thread:
+                return
+            self.owner = True
+            self._thread = threading.Thread(target=self._work, name='revenue-rollups', daemon=True)
+            self._thread.start()
+
+    def _work(self):
+        while True:
+            try:
+                requested = self.db.get(ROLLUPS_FILE, BACKFILL_REQUEST_KEY)
+                if not self._backfilled_at or (requested and requested['at'] > self._backfilled_at):
+                    self.backfill()
+                else:
+                    # A stat; re-reads (and runs _on_change) only if another process wrote it
+                    self.db.refresh(RENTALS_FILE)
+            except Exception as e:
+                print(f"❌ Revenue rollups error: {e}")
+            time.sleep(CHECK_INTERVAL)
+
+    def query(self, granularity='day', group='all', date_from=None, date_to=None):
+        """[{period, key, revenue, rentals, hours}] sorted by period.
+
+        group: 'all', 'console' or 'discount'. date_from/date_to are inclusive
+        ISO prefixes (e.g. 2025-12 or 2025-12-19).
+        """
+        self._load_persisted()
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+        if group not in ('all', 'console', 'discount'):
+            raise ValueError("group must be all, console or discount")
+
+        size = GRANULARITIES[granularity]
+        lo = date_from[:size] if date_from else None
+        hi = date_to[:size] if date_to else None
+
+        result = []
+        with self._lock:
+            for dimension, periods in self._buckets[granularity].items():
+                if group == 'all' and dimension != 'all':
+                    continue
+                if group != 'all' and not dimension.startswith(group + ':'):
+                    continue
+                for period, bucket in periods.items():
+                    if (lo and period < lo) or (hi and period > hi) or not bucket[1]:
+                        continue
+                    item = self._row(bucket)
+                    item['period'] = period
+                    item['key'] = dimension.split(':', 1)[1] if ':' in dimension else 'all'
+                    result.append(item)
+        result.sort(key=lambda x: (x['period'], x['key']))
+        return result
+
+revenue_rollups = RevenueRollups(db)
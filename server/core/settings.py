@@ -0,0 +1,90 @@
+import time
+import threading
+from core.database import db, SETTINGS_FILE
+
+DEFAULTS = {
+    'bot_token': None,
+    'admin_chat_id': '',
+    'require_approval': True,
+    'notifications_enabled': True,
+    'help_text': 'Текст помощи еще не настроен администратором.',
+    'help_button_text': 'ℹ️ Помощь'
+}
+
+class SettingsService:
+    """admin_settings.json parsed once and kept in memory.
+
+    Refreshed right away when this process saves it and, at most every
+    check_interval seconds, when another process changed the file.
+    subscribe(callback) gets callback(settings, changed_keys) on every change.
+    """
+
+    def __init__(self, database, check_interval=2.0):
+        self.db = database
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._settings = None
+        self._checked = 0
+        self._subscribers = []
+        database.add_listener(SETTINGS_FILE, self._on_change)
+
+    def _parse(self, data):
+        settings = dict(DEFAULTS)
+        settings.update({k: v for k, v in data.items() if v is not None})
+        settings['bot_token'] = (settings['bot_token'] or '').strip() or None
+        settings['admin_chat_id'] = str(settings['admin_chat_id'] or '')
+        settings['help_button_text'] = settings['help_button_text'] or DEFAULTS['help_button_text']
+        return settings
+
+    def _on_change(self, data, rows):
+        new = self._parse(data)
+        with self._lock:
+            old, self._settings = self._settings, new
+        if old is None:
+            return
+        changed = {k for k in set(old) | set(new) if old.get(k) != new.get(k)}
+        if not changed:
+            return
+        print(f"⚙️ Settings changed: {', '.join(sorted(changed))}")
+        for callback in list(self._subscribers):
+            try:
+                callback(new, changed)
+            except Exception as e:
+                print(f"❌ Settings subscriber error: {e}")
+
+    def all(self):
+        """Current settings (shared, don't modify)"""
+        now = time.monotonic()
+        if self._settings is None or now - self._checked > self.check_interval:
+            self._checked = now
+            # Re-reads only if the file changed, which calls _on_change
+            data = self.db.load(SETTINGS_FILE, copy_data=False)
+            if self._settings is None:
+                self._on_change(data, None)
+        return self._settings
+
+    def get(self, key, default=None):
+        value = self.all().get(key)
+        return default if value is None else value
+
+    def is_admin(self, user_id):
+        admin_id = self.all()['admin_chat_id']
+        return bool(admin_id) and str(user_id) == admin_id
+
+    def update(self, fields):
+        # One row per setting, so keys changed by another process are kept
+        # (a None value removes the key, which means the default)
+        def update(tx):
+            for key, value in fields.items():
+                tx.put(SETTINGS_FILE, key, value)
+        self.db.run_transaction(update, SETTINGS_FILE)
+        return dict(self.db.load(SETTINGS_FILE, copy_data=False))
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def invalidate(self):
+        """Check the file again on the next read"""
+        self._checked = 0
+
+settings_service = SettingsService(db)
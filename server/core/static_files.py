@@ -0,0 +1,107 @@
+import os
+import re
+import hashlib
+import tempfile
+import threading
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+# Static media (/static/...) with caching headers.
+#
+# Every response carries a strong ETag derived from the file content, so
+# conditional GETs get a 304. Files whose name is their content hash (what
+# save_upload() produces) never change and are served as immutable for a
+# year; everything else must be revalidated. Range requests are handled by
+# send_file. If a precompressed sibling (file.br / file.gz) exists and the
+# client accepts that encoding, it is served instead.
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'gif'}
+HASHED_NAME = re.compile(r'^[0-9a-f]{16,64}$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_etags = {}         # path -> (mtime_ns, size, etag)
+_etags_lock = threading.Lock()
+MAX_ETAGS = 4096
+
+def file_hash(path, chunk_size=65536):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def content_etag(path):
+    """Content hash of path, recomputed only when the file changes"""
+    st = os.stat(path)
+    cached = _etags.get(path)
+    if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+    etag = file_hash(path)[:32]
+    with _etags_lock:
+        if len(_etags) >= MAX_ETAGS:
+            _etags.clear()
+        _etags[path] = (st.st_mtime_ns, st.st_size, etag)
+    return etag
+
+def is_immutable(path):
+    name = os.path.basename(path).split('.', 1)[0]
+    return bool(HASHED_NAME.match(name))
+
+def serve_static(path):
+    full_path = safe_join(STATIC_DIR, path)
+    if full_path is None or not os.path.isfile(full_path):
+        abort(404)
+
+    etag = content_etag(full_path)
+    serve_path, encoding = full_path, None
+    accepted = request.headers.get('Accept-Encoding', '')
+    for name, suffix in ENCODINGS:
+        if name in accepted and os.path.isfile(full_path + suffix):
+            serve_path, encoding = full_path + suffix, name
+            etag = f"{etag}-{suffix[1:]}"
+            break
+
+    # The mimetype comes from the original name, not the .gz/.br variant
+    response = send_file(serve_path, download_name=os.path.basename(full_path),
+                         etag=etag, conditional=True, max_age=None)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+
+    # KYC documents must not end up in shared caches
+    scope = 'private' if path.startswith('img/kyc/') else 'public'
+    if is_immutable(full_path):
+        response.headers['Cache-Control'] = f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response.headers['Cache-Control'] = f"{scope}, no-cache"
+    return response
+
+def save_upload(file, subdir, extensions=IMAGE_EXTENSIONS):
+    """Store an uploaded file under static/<subdir> named by its content hash.
+
+    Returns the /static/... URL, or None if the extension isn't allowed.
+    """
+    ext = file.filename.rsplit('.', 1)[-1].lower() if file.filename and '.' in file.filename else ''
+    if ext not in extensions:
+        return None
+    if ext == 'jpeg':
+        ext = 'jpg'
+
+    save_dir = os.path.join(STATIC_DIR, subdir)
+    os.makedirs(save_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.upload.', dir=save_dir)
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: file.stream.read(65536), b''):
+                digest.update(chunk)
+                f.write(chunk)
+        filename = f"{digest.hexdigest()[:32]}.{ext}"
+        os.replace(tmp_path, os.path.join(save_dir, filename))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return f"/static/{subdir.replace(os.sep, '/')}/{filename}"
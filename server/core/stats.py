@@ -0,0 +1,158 @@
+import threading
+from collections import deque
+from core.database import db, CONSOLES_FILE, RENTALS_FILE
+from core.indexes import rentals_by_start
+
+class StatsModel:
+    """Dashboard aggregates maintained as rentals and consoles change.
+
+    Reading them is O(1); a write only adjusts the totals by the difference
+    between the old and new version of the rental/console it touched.
+    """
+
+    ACTIVITY_SIZE = 10
+
+    def __init__(self, database):
+        self.db = database
+        self._lock = threading.RLock()
+        self._ready = {RENTALS_FILE: False, CONSOLES_FILE: False}
+
+        self._rentals = {}          # rental id -> (cost, status, console_id)
+        self.total_revenue = 0.0
+        self.active_count = 0
+        self._active_on = {}        # console_id -> number of active rentals
+
+        self._consoles = {}         # console_id -> (rental_price, status)
+        self.available_consoles = 0
+        self.price_per_hour = 0.0   # sum of hourly prices of consoles being rented
+
+        self.activity = deque(maxlen=self.ACTIVITY_SIZE)  # newest rental ids first
+
+        database.add_listener(RENTALS_FILE, self._on_rentals)
+        database.add_listener(CONSOLES_FILE, self._on_consoles)
+
+    # --- rentals ---
+
+    def _on_rentals(self, data, rows):
+        with self._lock:
+            if rows is None:
+                for key in [k for k in self._rentals if k not in data]:
+                    self._update_rental(key, None)
+                for key, row in data.items():
+                    self._update_rental(key, row)
+                self._ready[RENTALS_FILE] = True
+                self._rebuild_activity()
+            elif self._ready[RENTALS_FILE]:
+                for key, row in rows.items():
+                    is_new = key not in self._rentals
+                    self._update_rental(key, row)
+                    if row is None:
+                        self._rebuild_activity()
+                    elif is_new:
+                        self._push_activity(key, row)
+
+    def _update_rental(self, key, row):
+        old = self._rentals.get(key)
+        new = None
+        if row is not None:
+            new = (row.get('total_cost', 0) or 0, row.get('status'), row.get('console_id'))
+        if old == new:
+            return
+
+        if old is not None:
+            cost, status, console_id = old
+            self.total_revenue -= cost
+            if status == 'active':
+                self.active_count -= 1
+                self._active_on[console_id] -= 1
+                self.price_per_hour -= self._price(console_id)
+            del self._rentals[key]
+
+        if new is not None:
+            cost, status, console_id = new
+            self.total_revenue += cost
+            if status == 'active':
+                self.active_count += 1
+                self._active_on[console_id] = self._active_on.get(console_id, 0) + 1
+                self.price_per_hour += self._price(console_id)
+            self._rentals[key] = new
+
+    def _rebuild_activity(self):
+        self.activity.clear()
+        for _, key in rentals_by_start.iter_desc():
+            self.activity.append(key)
+            if len(self.activity) == self.ACTIVITY_SIZE:
+                break
+
+    def _push_activity(self, key, row):
+        newest = self.activity[0] if self.activity else None
+        if newest is None or rentals_by_start.value(newest) <= (row.get('start_time') or ''):
+            self.activity.appendleft(key)
+        else:
+            # Backdated rental, somewhere in the middle of the stream
+            self._rebuild_activity()
+
+    # --- consoles ---
+
+    def _price(self, console_id):
+        return self._consoles.get(console_id, (0, None))[0]
+
+    def _on_consoles(self, data, rows):
+        with self._lock:
+            if rows is None:
+                for key in [k for k in self._consoles if k not in data]:
+                    self._update_console(key, None)
+                for key, row in data.items():
+                    self._update_console(key, row)
+                self._ready[CONSOLES_FILE] = True
+            elif self._ready[CONSOLES_FILE]:
+                for key, row in rows.items():
+                    self._update_console(key, row)
+
+    def _update_console(self, key, row):
+        old = self._consoles.get(key)
+        new = None
+        if row is not None:
+            new = (row.get('rental_price', 0) or 0, row.get('status'))
+        if old == new:
+            return
+
+        active = self._active_on.get(key, 0)
+        if old is not None:
+            self.price_per_hour -= old[0] * active
+            if old[1] == 'available':
+                self.available_consoles -= 1
+            del self._consoles[key]
+        if new is not None:
+            self.price_per_hour += new[0] * active
+            if new[1] == 'available':
+                self.available_consoles += 1
+            self._consoles[key] = new
+
+    # --- reads ---
+
+    def _ensure(self):
+        # load() re-reads changed tables, which re-syncs us through the listeners.
+        # Listeners run under the table lock and then take ours (rebuilding the
+        # activity reads the table again), so take the locks in that same order.
+        with self.db.locked(CONSOLES_FILE, RENTALS_FILE):
+            consoles = self.db.load(CONSOLES_FILE, copy_data=False)
+            rentals = self.db.load(RENTALS_FILE, copy_data=False)
+            if not self._ready[CONSOLES_FILE]:
+                self._on_consoles(consoles, None)
+            if not self._ready[RENTALS_FILE]:
+                self._on_rentals(rentals, None)
+
+    def snapshot(self):
+        self._ensure()
+        with self._lock:
+            return {
+                'total_revenue': round(self.total_revenue, 2),
+                'revenue_per_minute': round(self.price_per_hour / 60, 2),
+                'active_rentals': self.active_count,
+                'total_consoles': len(self._consoles),
+                'available_consoles': self.available_consoles,
+                'activity': list(self.activity)
+            }
+
+stats_model = StatsModel(db)
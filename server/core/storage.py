@@ -0,0 +1,357 @@
+import os
+import re
+import json
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Storage backends used by core.database.Database.
+#
+# A backend only knows how to read and write whole tables (and, if
+# supports_rows is set, single rows). Caching, batching and locking stay in
+# Database so every backend gets them for free.
+#
+# write_tables() is how Database writes: it refuses with TransactionConflict
+# if any table no longer has the signature the caller read it with (another
+# process wrote it in between), so nobody overwrites what they haven't seen.
+
+class TransactionConflict(Exception):
+    """A table changed in storage while a transaction was working on it"""
+
+def _iter_json_object(f, chunk_size):
+    """Incrementally parse a top-level JSON object from f, yielding (key, value)"""
+    decoder = json.JSONDecoder()
+    state = {'buf': '', 'pos': 0, 'eof': False}
+
+    def more():
+        chunk = f.read(chunk_size)
+        if not chunk:
+            state['eof'] = True
+            return False
+        state['buf'] = state['buf'][state['pos']:] + chunk
+        state['pos'] = 0
+        return True
+
+    def peek():
+        while True:
+            buf, pos = state['buf'], state['pos']
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            state['pos'] = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not more():
+                raise ValueError('Unexpected end of JSON file')
+
+    def value():
+        while True:
+            try:
+                result, end = decoder.raw_decode(state['buf'], state['pos'])
+                # A value touching the end of the buffer may continue in the next chunk
+                if end < len(state['buf']) or state['eof']:
+                    state['pos'] = end
+                    return result
+            except json.JSONDecodeError:
+                if state['eof']:
+                    raise
+            more()
+
+    if peek() != '{':
+        raise ValueError('Expected a JSON object')
+    state['pos'] += 1
+    if peek() == '}':
+        return
+    while True:
+        peek()
+        key = value()
+        if peek() != ':':
+            raise ValueError('Expected ":" in JSON object')
+        state['pos'] += 1
+        peek()
+        yield key, value()
+        sep = peek()
+        state['pos'] += 1
+        if sep == '}':
+            return
+        if sep != ',':
+            raise ValueError('Expected "," in JSON object')
+
+
+class JsonBackend:
+    """One pretty-printed JSON file per table inside data_dir"""
+    name = 'json'
+    supports_rows = False
+
+    def __init__(self, data_dir, json_indent=2):
+        self.data_dir = data_dir
+        self.json_indent = json_indent
+
+    def _path(self, filename):
+        return os.path.join(self.data_dir, filename)
+
+    def signature(self, filename):
+        try:
+            st = os.stat(self._path(filename))
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def read_table(self, filename):
+        path = self._path(filename)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def iter_rows(self, filename, chunk_size=65536):
+        """Stream (key, record) pairs without parsing the whole file at once"""
+        path = self._path(filename)
+        if not os.path.exists(path):
+            return
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from _iter_json_object(f, chunk_size)
+
+    def write_table(self, filename, data):
+        path = self._path(filename)
+        fd, tmp_path = tempfile.mkstemp(prefix=f'.{filename}.', suffix='.tmp', dir=self.data_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                if self.json_indent is None:
+                    json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+                else:
+                    json.dump(data, f, ensure_ascii=False, indent=self.json_indent)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # Make the rename itself durable (not supported on Windows)
+        if os.name != 'nt':
+            dir_fd = os.open(self.data_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
+
+        return self.signature(filename)
+
+    @contextmanager
+    def _write_lock(self):
+        # Serializes check-and-write across processes (web workers, bot).
+        # Without fcntl (Windows) the check and the write can still race.
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.data_dir, '.write.lock'), 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write_tables(self, writes, expected):
+        """writes: {filename: (data, rows)}; expected: {filename: signature}.
+
+        Files can't be replaced together: they are all checked first, then
+        written one by one, under a lock shared with the other processes.
+        """
+        with self._write_lock():
+            for filename, signature in expected.items():
+                if self.signature(filename) != signature:
+                    raise TransactionConflict(filename)
+            return {filename: self.write_table(filename, data) for filename, (data, _) in writes.items()}
+
+
+class SqliteBackend:
+    """All tables in one SQLite file (WAL mode), one row per record.
+
+    Each table is named after its *_FILE constant ('rentals.json' -> rentals)
+    and stores the record as JSON next to a few extracted, indexed columns.
+    """
+    name = 'sqlite'
+    supports_rows = True
+    INDEXED_COLUMNS = ('console_id', 'user_id', 'status', 'start_time')
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._tables = set()
+        self._lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS _meta (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _table(self, filename):
+        name = re.sub(r'[^a-z0-9_]', '_', filename.lower().rsplit('.json', 1)[0])
+        if name not in self._tables:
+            with self._lock:
+                conn = self._conn()
+                columns = ', '.join(f"{c} TEXT" for c in self.INDEXED_COLUMNS)
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY, data TEXT NOT NULL, {columns})")
+                for c in self.INDEXED_COLUMNS:
+                    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{name}_{c} ON {name} ({c})")
+                self._tables.add(name)
+        return name
+
+    def _row_params(self, key, row):
+        values = [row.get(c) if isinstance(row, dict) else None for c in self.INDEXED_COLUMNS]
+        values = [None if v is None else str(v) for v in values]
+        return [str(key), json.dumps(row, ensure_ascii=False)] + values
+
+    def _bump(self, conn, filename):
+        conn.execute(
+            "INSERT INTO _meta (name, version) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET version = version + 1",
+            (filename,)
+        )
+
+    def signature(self, filename):
+        row = self._conn().execute("SELECT version FROM _meta WHERE name = ?", (filename,)).fetchone()
+        return row[0] if row else None
+
+    def read_table(self, filename):
+        table = self._table(filename)
+        cur = self._conn().execute(f"SELECT key, data FROM {table}")
+        return {key: json.loads(data) for key, data in cur}
+
+    def iter_rows(self, filename, chunk_size=500):
+        table = self._table(filename)
+        # Separate connection so writes on this thread don't disturb the cursor
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            cur = conn.execute(f"SELECT key, data FROM {table}")
+            while True:
+                batch = cur.fetchmany(chunk_size)
+                if not batch:
+                    return
+                for key, data in batch:
+                    yield key, json.loads(data)
+        finally:
+            conn.close()
+
+    def _replace_table(self, conn, filename, data):
+        table = self._table(filename)
+        placeholders = ', '.join('?' * (2 + len(self.INDEXED_COLUMNS)))
+        conn.execute(f"DELETE FROM {table}")
+        conn.executemany(
+            f"INSERT INTO {table} VALUES ({placeholders})",
+            (self._row_params(k, v) for k, v in data.items())
+        )
+        self._bump(conn, filename)
+
+    def write_table(self, filename, data):
+        self._table(filename)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._replace_table(conn, filename, data)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.signature(filename)
+
+    def _put_rows(self, conn, filename, rows):
+        table = self._table(filename)
+        placeholders = ', '.join('?' * (2 + len(self.INDEXED_COLUMNS)))
+        for key, row in rows.items():
+            if row is None:
+                conn.execute(f"DELETE FROM {table} WHERE key = ?", (str(key),))
+            else:
+                conn.execute(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", self._row_params(key, row))
+        self._bump(conn, filename)
+
+    def write_rows(self, filename, rows):
+        """rows: {key: record}, a None record deletes the key"""
+        self._table(filename)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._put_rows(conn, filename, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.signature(filename)
+
+    def write_tables(self, writes, expected):
+        """Check the versions and write several tables (rows, or whole tables if rows is None) in one SQLite transaction"""
+        for filename in writes:
+            self._table(filename)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for filename, signature in expected.items():
+                row = conn.execute("SELECT version FROM _meta WHERE name = ?", (filename,)).fetchone()
+                if (row[0] if row else None) != signature:
+                    raise TransactionConflict(filename)
+            for filename, (data, rows) in writes.items():
+                if rows is None:
+                    self._replace_table(conn, filename, data)
+                else:
+                    self._put_rows(conn, filename, rows)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return {filename: self.signature(filename) for filename in writes}
+
+    def query(self, filename, filters):
+        """Rows matching all filters, or None if a filter column isn't indexed"""
+        if any(c not in self.INDEXED_COLUMNS for c in filters):
+            return None
+        table = self._table(filename)
+        where = ' AND '.join(f"{c} = ?" for c in filters) or '1'
+        cur = self._conn().execute(
+            f"SELECT data FROM {table} WHERE {where}",
+            [None if v is None else str(v) for v in filters.values()]
+        )
+        return [json.loads(data) for (data,) in cur]
+
+
+def create_backend(data_dir, json_indent=2):
+    """Pick the backend from DB_BACKEND (json or sqlite)"""
+    kind = os.environ.get('DB_BACKEND', 'json')
+    if kind == 'sqlite':
+        return SqliteBackend(os.environ.get('DB_PATH', os.path.join(data_dir, 'ps_rental.db')))
+    return JsonBackend(data_dir, json_indent)
+
+
+def import_json_dir(data_dir, backend):
+    """One-shot import of every server/data/*.json table into backend"""
+    source = JsonBackend(data_dir)
+    imported = {}
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.json'):
+            continue
+        data = source.read_table(filename)
+        backend.write_table(filename, data)
+        imported[filename] = len(data)
+    return imported
+
+
+if __name__ == '__main__':
+    # python -m core.storage [sqlite_path]   (run from server/)
+    import sys
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    db_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(data_dir, 'ps_rental.db')
+    for filename, count in import_json_dir(data_dir, SqliteBackend(db_path)).items():
+        print(f"✅ {filename}: {count} records")
+    print(f"📦 Imported into {db_path}. Start the server with DB_BACKEND=sqlite DB_PATH={db_path}")
@@ -0,0 +1,44 @@
+import os
+import multiprocessing
+
+# gunicorn -c gunicorn.conf.py wsgi:app   (run from server/)
+#
+# Graceful reload after a deploy: kill -HUP <master pid> starts new workers
+# and lets the old ones finish their requests (up to graceful_timeout).
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+
+# Threads share the table caches, indexes and aggregates of their worker, and
+# every open /api/events stream holds one thread. EVENTS_MAX_CLIENTS (8)
+# streams per worker at most, so the rest stay free for the API.
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 16))
+
+# There are always at least two writers: the web worker(s) and the bot
+# process (python -m bot.runner). Every write checks that the table is
+# unchanged since this process read it (core/database.py): put()/delete()
+# merge with the other process's changes, a whole-table save() fails with
+# TransactionConflict instead of overwriting them. The JSON backend rewrites
+# whole files, so with several workers those conflicts get frequent; scale
+# out on DB_BACKEND=sqlite, which writes single rows.
+if os.environ.get('DB_BACKEND', 'json') == 'sqlite':
+    workers = int(os.environ.get('WEB_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+else:
+    workers = int(os.environ.get('WEB_WORKERS', 1))
+    if workers > 1:
+        print("⚠️ WEB_WORKERS > 1 with the JSON backend makes concurrent saves fail with conflicts, use DB_BACKEND=sqlite")
+
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+# Recycle workers now and then to keep memory in check
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+def worker_exit(server, worker):
+    # Write out anything still sitting in the write-behind buffer
+    from core.database import db
+    db.flush()
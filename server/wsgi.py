@@ -0,0 +1,24 @@
+import os
+
+# Production entry point: the Flask app without the bot poller.
+#
+#   gunicorn -c gunicorn.conf.py wsgi:app     (Linux)
+#   python wsgi.py                            (waitress, also works on Windows)
+#
+# Run the Telegram poller next to it as a single separate process:
+#   python -m bot.runner
+
+# Several processes serve SSE clients, so events go through data/events.log
+# (must be set before core.events is imported)
+os.environ.setdefault('EVENTS_SHARED', '1')
+
+from app import app
+
+os.makedirs(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'img', 'console'), exist_ok=True)
+
+if __name__ == '__main__':
+    from waitress import serve
+    threads = int(os.environ.get('WEB_THREADS', 16))
+    print(f"🚀 Serving on {os.environ.get('WEB_BIND', '0.0.0.0:5000')} with {threads} threads (waitress)")
+    serve(app, listen=os.environ.get('WEB_BIND', '0.0.0.0:5000'), threads=threads,
+          channel_timeout=int(os.environ.get('WEB_TIMEOUT', 120)))
@@ -85,7 +85,10 @@ export default function AdminsPage() {
         try {
             const res = await fetch('http://localhost:5000/api/admins', {
                 method,
-                headers: { 'Content-Type': 'application/json' },
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${localStorage.getItem('admin_token')}`
+                },
                 body: JSON.stringify(payload)
             })
             if (res.ok) {
@@ -103,7 +106,10 @@ export default function AdminsPage() {
     const handleDelete = async (id) => {
         if (!confirm('Вы уверены?')) return
         try {
-            const res = await fetch(`http://localhost:5000/api/admins?id=${id}`, { method: 'DELETE' })
+            const res = await fetch(`http://localhost:5000/api/admins?id=${id}`, {
+                method: 'DELETE',
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('admin_token')}` }
+            })
             if (res.ok) fetchAdmins()
             else {
                 const data = await res.json()
@@ -227,6 +227,9 @@ export default function ConsolesPage() {
                                     <div className="text-[10px] text-gray-500 flex flex-col gap-0.5">
                                         <span>С {new Date(console.active_rental.start_time).toLocaleTimeString('ru-RU')}</span>
                                         <span>До {new Date(console.active_rental.expected_end_time).toLocaleTimeString('ru-RU')}</span>
+                                        {console.active_rental.overdue && (
+                                            <span className="text-red-400 font-bold">Просрочена</span>
+                                        )}
                                     </div>
                                     <button
                                         onClick={async () => {
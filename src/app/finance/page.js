@@ -17,15 +17,19 @@ import { cn } from "@/lib/utils"
 export default function FinancePage() {
     const [stats, setStats] = useState(null)
     const [history, setHistory] = useState([])
+    const [monthly, setMonthly] = useState([])
     const [loading, setLoading] = useState(true)
 
     useEffect(() => {
         Promise.all([
             fetch('http://localhost:5000/api/stats').then(res => res.json()),
-            fetch('http://localhost:5000/api/history').then(res => res.json())
-        ]).then(([statsData, historyData]) => {
+            // Totals come from /api/stats; only the latest page of history is listed
+            fetch('http://localhost:5000/api/history?limit=50').then(res => res.json()),
+            fetch('http://localhost:5000/api/finance/rollups?granularity=month').then(res => res.json())
+        ]).then(([statsData, historyData, rollupsData]) => {
             setStats(statsData)
-            setHistory(historyData)
+            setHistory(historyData.items || [])
+            setMonthly(rollupsData.series || [])
             setLoading(false)
         }).catch(err => {
             console.error("Failed to fetch finance data:", err)
@@ -33,6 +37,17 @@ export default function FinancePage() {
         })
     }, [])
 
+    // Month-over-month revenue change from the pre-aggregated rollups
+    const thisMonth = new Date().toISOString().slice(0, 7)
+    const prevDate = new Date()
+    prevDate.setDate(1)
+    prevDate.setMonth(prevDate.getMonth() - 1)
+    const prevMonth = prevDate.toISOString().slice(0, 7)
+    const revenueFor = (period) => monthly.find(m => m.period === period)?.revenue || 0
+    const monthChange = revenueFor(prevMonth) > 0
+        ? Math.round((revenueFor(thisMonth) - revenueFor(prevMonth)) / revenueFor(prevMonth) * 100)
+        : 0
+
     if (loading) return (
         <div className="flex items-center justify-center min-h-[400px]">
             <div className="glass p-8 rounded-3xl animate-pulse">Загрузка финансов...</div>
@@ -59,8 +74,9 @@ export default function FinancePage() {
                     </div>
                     <h3 className="text-gray-400 text-sm font-medium mb-1">Общий доход</h3>
                     <p className="text-3xl font-bold text-white">{stats?.total_revenue || 0} MDL</p>
-                    <p className="text-xs text-green-500 mt-2 flex items-center gap-1 font-bold">
-                        <ArrowUpRight size={14} /> +0% <span className="text-gray-500 font-normal">к прошлому месяцу</span>
+                    <p className={cn("text-xs mt-2 flex items-center gap-1 font-bold", monthChange >= 0 ? "text-green-500" : "text-red-500")}>
+                        {monthChange >= 0 ? <ArrowUpRight size={14} /> : <ArrowDownRight size={14} />}
+                        {monthChange >= 0 ? '+' : ''}{monthChange}% <span className="text-gray-500 font-normal">к прошлому месяцу</span>
                     </p>
                 </div>
 
@@ -72,7 +88,7 @@ export default function FinancePage() {
                     </div>
                     <h3 className="text-gray-400 text-sm font-medium mb-1">Средний чек</h3>
                     <p className="text-3xl font-bold text-white">
-                        {history.length > 0 ? Math.round(stats?.total_revenue / history.length) : 0} MDL
+                        {stats?.total_rentals > 0 ? Math.round(stats.total_revenue / stats.total_rentals) : 0} MDL
                     </p>
                     <p className="text-xs text-blue-400 mt-2 flex items-center gap-1 font-bold">
                         <TrendingUp size={14} /> Стабильно
@@ -86,9 +102,9 @@ export default function FinancePage() {
                         </div>
                     </div>
                     <h3 className="text-gray-400 text-sm font-medium mb-1">Всего транзакций</h3>
-                    <p className="text-3xl font-bold text-white">{history.length}</p>
+                    <p className="text-3xl font-bold text-white">{stats?.total_rentals || 0}</p>
                     <p className="text-xs text-purple-400 mt-2 flex items-center gap-1 font-bold">
-                        <ArrowUpRight size={14} /> {history.filter(h => h.status === 'active').length} активно
+                        <ArrowUpRight size={14} /> {stats?.active_rentals || 0} активно
                     </p>
                 </div>
             </div>
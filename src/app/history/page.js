@@ -17,17 +17,22 @@ import { cn } from "@/lib/utils"
 
 export default function HistoryPage() {
     const [history, setHistory] = useState([])
+    const [nextCursor, setNextCursor] = useState(null)
     const [loading, setLoading] = useState(true)
+    const [loadingMore, setLoadingMore] = useState(false)
 
     useEffect(() => {
         fetchHistory()
     }, [])
 
-    const fetchHistory = async () => {
+    const fetchHistory = async (cursor = null) => {
         try {
-            const res = await fetch('http://localhost:5000/api/history')
+            const params = new URLSearchParams({ limit: '50' })
+            if (cursor) params.set('cursor', cursor)
+            const res = await fetch(`http://localhost:5000/api/history?${params}`)
             const data = await res.json()
-            setHistory(data)
+            setHistory(prev => cursor ? [...prev, ...data.items] : data.items)
+            setNextCursor(data.next_cursor)
         } catch (err) {
             console.error("Failed to fetch history:", err)
         } finally {
@@ -35,6 +40,12 @@ export default function HistoryPage() {
         }
     }
 
+    const loadMore = async () => {
+        setLoadingMore(true)
+        await fetchHistory(nextCursor)
+        setLoadingMore(false)
+    }
+
     if (loading) return (
         <div className="flex items-center justify-center min-h-[400px]">
             <div className="glass p-8 rounded-3xl animate-pulse">Загрузка истории...</div>
@@ -63,7 +74,7 @@ export default function HistoryPage() {
                                 key={item.id}
                                 initial={{ opacity: 0, scale: 0.95 }}
                                 animate={{ opacity: 1, scale: 1 }}
-                                transition={{ delay: idx * 0.05 }}
+                                transition={{ delay: (idx % 50) * 0.05 }}
                                 className="glass p-6 rounded-3xl border border-white/5 hover:bg-white/[0.02] transition-all group"
                             >
                                 <div className="grid grid-cols-1 md:grid-cols-4 items-center gap-6">
@@ -119,6 +130,18 @@ export default function HistoryPage() {
                     )}
                 </AnimatePresence>
             </div>
+
+            {nextCursor && (
+                <div className="flex justify-center">
+                    <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="px-6 py-2.5 bg-white/5 hover:bg-white/10 rounded-xl text-sm font-bold transition-all border border-white/5 disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Загрузка...' : 'Загрузить ещё'}
+                    </button>
+                </div>
+            )}
         </div>
     )
 }
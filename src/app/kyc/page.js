@@ -15,6 +15,7 @@ import {
     User
 } from "lucide-react"
 import { cn } from "@/lib/utils"
+import { subscribeEvents } from "@/lib/events"
 
 export default function KYCPage() {
     const [requests, setRequests] = useState([])
@@ -38,6 +39,7 @@ export default function KYCPage() {
 
     useEffect(() => {
         fetchRequests()
+        return subscribeEvents(['kyc.submitted', 'kyc.processed', 'kyc.updated'], () => fetchRequests())
     }, [])
 
     const handleSelectRequest = (req) => {
@@ -183,9 +185,18 @@ export default function KYCPage() {
                                         >
                                             <td className="px-8 py-6">
                                                 <div className="flex items-center gap-4">
-                                                    <div className="w-10 h-10 rounded-xl bg-gradient-to-br from-blue-600/20 to-indigo-600/20 flex items-center justify-center text-blue-400 font-bold border border-blue-500/10">
-                                                        {req.user_name?.[0] || '?'}
-                                                    </div>
+                                                    {req.thumb_url ? (
+                                                        <img
+                                                            src={`http://localhost:5000${req.thumb_url}`}
+                                                            alt=""
+                                                            loading="lazy"
+                                                            className="w-10 h-10 rounded-xl object-cover border border-blue-500/10"
+                                                        />
+                                                    ) : (
+                                                        <div className="w-10 h-10 rounded-xl bg-gradient-to-br from-blue-600/20 to-indigo-600/20 flex items-center justify-center text-blue-400 font-bold border border-blue-500/10">
+                                                            {req.user_name?.[0] || '?'}
+                                                        </div>
+                                                    )}
                                                     <div>
                                                         <p className="text-white font-bold">{req.user_name}</p>
                                                         <p className="text-gray-500 text-xs">@{req.username}</p>
@@ -271,7 +282,7 @@ export default function KYCPage() {
                                     </div>
                                     <div className="aspect-[4/3] rounded-[32px] overflow-hidden border border-white/10 relative group">
                                         <img
-                                            src={`http://localhost:5000${selectedRequest.photo_url}`}
+                                            src={`http://localhost:5000${selectedRequest.preview_url || selectedRequest.photo_url}`}
                                             alt="KYC Document"
                                             className="w-full h-full object-contain bg-black/40"
                                         />
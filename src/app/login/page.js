@@ -13,7 +13,7 @@ export default function LoginPage() {
 
     // Redirect if already logged in
     useEffect(() => {
-        if (localStorage.getItem('admin_user')) {
+        if (localStorage.getItem('admin_token')) {
             router.push('/')
         }
     }, [])
@@ -33,7 +33,10 @@ export default function LoginPage() {
             const data = await res.json()
 
             if (res.ok) {
-                localStorage.setItem('admin_user', JSON.stringify(data))
+                const { token, expires_at, ...user } = data
+                localStorage.setItem('admin_token', token)
+                localStorage.setItem('admin_user', JSON.stringify(user))
+                localStorage.setItem('admin_id', user.id)
                 router.push('/')
             } else {
                 setError(data.error || 'Ошибка входа')
@@ -14,6 +14,7 @@ import {
   XCircle
 } from "lucide-react"
 import { cn } from "@/lib/utils"
+import { subscribeEvents } from "@/lib/events"
 
 export default function Dashboard() {
   const [data, setData] = useState(null)
@@ -41,8 +42,16 @@ export default function Dashboard() {
     }
 
     fetchData()
-    const interval = setInterval(fetchData, 10000) // Poll every 10s
-    return () => clearInterval(interval)
+    // Stats refresh on pushed changes; the slow poll only keeps health/RPM fresh
+    const unsubscribe = subscribeEvents(
+      ['rental.started', 'rental.terminated', 'console.created', 'console.updated', 'console.deleted'],
+      () => fetchData()
+    )
+    const interval = setInterval(fetchData, 60000)
+    return () => {
+      unsubscribe()
+      clearInterval(interval)
+    }
   }, [])
 
   const openManualModal = async () => {
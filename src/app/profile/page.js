@@ -34,10 +34,11 @@ export default function ProfilePage() {
 
     const fetchProfile = async () => {
         try {
-            // Get current admin ID from localStorage if available, or simulate for demo
-            const currentId = localStorage.getItem('admin_id') || '31a58d38-ec27-4946-9fd0-371b6fa98ae3'
-            const res = await fetch(`http://localhost:5000/api/admins/current?id=${currentId}`)
+            const res = await fetch('http://localhost:5000/api/admins/current', {
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('admin_token')}` }
+            })
             const data = await res.json()
+            if (data.error) return
             setAdmin(data)
             setFormData({
                 full_name: data.full_name || '',
@@ -57,7 +58,10 @@ export default function ProfilePage() {
         try {
             const res = await fetch('http://localhost:5000/api/admins/profile', {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Authorization': `Bearer ${localStorage.getItem('admin_token')}`
+                },
                 body: JSON.stringify({ ...formData, id: admin.id })
             })
             if (res.ok) {
@@ -83,6 +87,7 @@ export default function ProfilePage() {
         try {
             const res = await fetch('http://localhost:5000/api/admins/avatar', {
                 method: 'POST',
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('admin_token')}` },
                 body: uploadData
             })
             if (res.ok) {
@@ -97,8 +102,7 @@ export default function ProfilePage() {
 
     if (loading) return null
 
-    const today = new Date().toISOString().split('T')[0]
-    const todayActions = admin.stats?.daily_actions?.[today] || 0
+    const todayActions = admin.stats?.today_actions || 0
 
     return (
         <div className="max-w-5xl mx-auto space-y-8">
@@ -12,6 +12,7 @@ import {
     Calendar,
     AlertCircle
 } from "lucide-react"
+import { subscribeEvents } from "@/lib/events"
 
 export default function RequestsPage() {
     const [requests, setRequests] = useState([])
@@ -20,6 +21,10 @@ export default function RequestsPage() {
 
     useEffect(() => {
         fetchRequests()
+        return subscribeEvents(
+            ['rental_request.created', 'rental_request.approved', 'rental_request.rejected'],
+            () => fetchRequests()
+        )
     }, [])
 
     const fetchRequests = async () => {
@@ -20,7 +20,9 @@ import { cn } from "@/lib/utils"
 
 export default function UsersPage() {
     const [users, setUsers] = useState([])
+    const [nextCursor, setNextCursor] = useState(null)
     const [loading, setLoading] = useState(true)
+    const [loadingMore, setLoadingMore] = useState(false)
     const [search, setSearch] = useState("")
     const [selectedUser, setSelectedUser] = useState(null)
 
@@ -28,11 +30,14 @@ export default function UsersPage() {
         fetchUsers()
     }, [])
 
-    const fetchUsers = async () => {
+    const fetchUsers = async (cursor = null) => {
         try {
-            const res = await fetch('http://localhost:5000/api/users')
+            const params = new URLSearchParams({ limit: '50' })
+            if (cursor) params.set('cursor', cursor)
+            const res = await fetch(`http://localhost:5000/api/users?${params}`)
             const data = await res.json()
-            setUsers(data)
+            setUsers(prev => cursor ? [...prev, ...data.items] : data.items)
+            setNextCursor(data.next_cursor)
         } catch (err) {
             console.error("Failed to fetch users:", err)
         } finally {
@@ -40,6 +45,12 @@ export default function UsersPage() {
         }
     }
 
+    const loadMore = async () => {
+        setLoadingMore(true)
+        await fetchUsers(nextCursor)
+        setLoadingMore(false)
+    }
+
     const filteredUsers = users.filter(u =>
         (u.first_name?.toLowerCase() || "").includes(search.toLowerCase()) ||
         (u.username?.toLowerCase() || "").includes(search.toLowerCase())
@@ -103,7 +114,7 @@ export default function UsersPage() {
                                         layout
                                         initial={{ opacity: 0 }}
                                         animate={{ opacity: 1 }}
-                                        transition={{ delay: idx * 0.03 }}
+                                        transition={{ delay: (idx % 50) * 0.03 }}
                                         className="group hover:bg-white/[0.02] transition-colors"
                                     >
                                         <td className="px-8 py-6">
@@ -153,6 +164,18 @@ export default function UsersPage() {
                 </table>
             </div>
 
+            {nextCursor && (
+                <div className="flex justify-center">
+                    <button
+                        onClick={loadMore}
+                        disabled={loadingMore}
+                        className="px-6 py-2.5 bg-white/5 hover:bg-white/10 rounded-xl text-sm font-bold transition-all border border-white/5 disabled:opacity-50"
+                    >
+                        {loadingMore ? 'Загрузка...' : 'Загрузить ещё'}
+                    </button>
+                </div>
+            )}
+
             {/* Individual User Rentals Modal */}
             <AnimatePresence>
                 {selectedUser && (
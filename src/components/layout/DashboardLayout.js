@@ -23,6 +23,7 @@ import {
     ShieldCheck
 } from "lucide-react"
 import { cn } from "@/lib/utils"
+import { subscribeEvents } from "@/lib/events"
 
 import Link from "next/link"
 import { usePathname, useRouter } from "next/navigation"
@@ -55,7 +56,8 @@ export default function DashboardLayout({ children }) {
 
     useEffect(() => {
         const storedUser = localStorage.getItem('admin_user')
-        if (storedUser) {
+        const token = localStorage.getItem('admin_token')
+        if (storedUser && token) {
             const user = JSON.parse(storedUser)
             setCurrentAdmin(user)
             setIsLoggedIn(true)
@@ -63,13 +65,21 @@ export default function DashboardLayout({ children }) {
             router.push('/login')
         }
 
-        // Fetch latest profile data to get avatar/etc
-        if (storedUser) {
-            const user = JSON.parse(storedUser)
-            fetch(`http://localhost:5000/api/admins/current?id=${user.id}`)
-                .then(res => res.json())
+        // Check the session and fetch latest profile data to get avatar/etc
+        if (token && !isLoginPage) {
+            fetch('http://localhost:5000/api/admins/current', {
+                headers: { 'Authorization': `Bearer ${token}` }
+            })
+                .then(res => {
+                    if (res.status === 401) {
+                        clearSession()
+                        router.push('/login')
+                        return null
+                    }
+                    return res.json()
+                })
                 .then(data => {
-                    if (!data.error) {
+                    if (data && !data.error) {
                         setCurrentAdmin(data)
                         localStorage.setItem('admin_user', JSON.stringify(data))
                         localStorage.setItem('admin_id', data.id)
@@ -81,38 +91,44 @@ export default function DashboardLayout({ children }) {
         audioRef.current = new Audio("/sound/z_uk-budte-vkontakte-s-no_ostyami.mp3")
 
         if (!isLoginPage) {
-            const fetchCounts = async () => {
-                try {
-                    // Fetch Rental Requests
-                    const resReq = await fetch('http://localhost:5000/api/requests')
-                    const dataReq = await resReq.json()
-                    const countReq = dataReq.filter(r => r.status === 'pending').length
-
-                    // Fetch KYC Requests
-                    const resKyc = await fetch('http://localhost:5000/api/kyc')
-                    const dataKyc = await resKyc.json()
-                    const countKyc = dataKyc.filter(r => r.status === 'pending').length
-
-                    const total = countReq + countKyc
-                    if (total > prevTotalRef.current) {
-                        audioRef.current.play().catch(e => console.log("Audio play blocked"))
-                    }
-
-                    setPendingCounts({ requests: countReq, kyc: countKyc })
-                    prevTotalRef.current = total
-                } catch (err) {
-                    console.error("Failed to fetch counts:", err)
+            // Badge counts are pushed on the shared event stream whenever they
+            // change; a resync or a busy server just fetches them once
+            const applyCounts = (data) => {
+                const total = data.requests + data.kyc
+                if (total > prevTotalRef.current) {
+                    audioRef.current.play().catch(e => console.log("Audio play blocked"))
                 }
+                setPendingCounts({ requests: data.requests, kyc: data.kyc })
+                prevTotalRef.current = total
             }
+            const fetchCounts = () => fetch('http://localhost:5000/api/counters')
+                .then(res => res.json())
+                .then(applyCounts)
+                .catch(err => console.error("Failed to fetch counts:", err))
 
             fetchCounts()
-            const interval = setInterval(fetchCounts, 30000)
-            return () => clearInterval(interval)
+            return subscribeEvents(['counters', 'busy'], (type, data) => {
+                if (type === 'counters') applyCounts(data)
+                else fetchCounts()
+            })
         }
     }, [pathname])
 
-    const handleLogout = () => {
+    const clearSession = () => {
         localStorage.removeItem('admin_user')
+        localStorage.removeItem('admin_id')
+        localStorage.removeItem('admin_token')
+    }
+
+    const handleLogout = () => {
+        const token = localStorage.getItem('admin_token')
+        if (token) {
+            fetch('http://localhost:5000/api/admins/logout', {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}` }
+            }).catch(err => console.error(err))
+        }
+        clearSession()
         router.push('/login')
     }
 
@@ -0,0 +1,33 @@
+// Live change events pushed by the backend (/api/events, Server-Sent Events).
+// Returns an unsubscribe function. "resync" means events were missed and
+// the caller should simply refetch its data.
+//
+// All subscribers of a tab share one connection: every open stream holds a
+// server thread. The sidebar badge counts arrive on it too ("counters").
+let source = null
+const handlers = new Map()  // event type -> Set of handlers
+
+function dispatch(e) {
+    const data = e.data ? JSON.parse(e.data) : {}
+    for (const handler of handlers.get(e.type) || []) handler(e.type, data)
+}
+
+export function subscribeEvents(types, onEvent) {
+    if (!source) source = new EventSource('http://localhost:5000/api/events')
+    const all = [...types, 'resync']
+    all.forEach(type => {
+        if (!handlers.has(type)) {
+            handlers.set(type, new Set())
+            source.addEventListener(type, dispatch)
+        }
+        handlers.get(type).add(onEvent)
+    })
+    return () => {
+        all.forEach(type => handlers.get(type)?.delete(onEvent))
+        if ([...handlers.values()].every(set => set.size === 0)) {
+            source.close()
+            source = null
+            handlers.clear()
+        }
+    }
+}